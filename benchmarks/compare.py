@@ -0,0 +1,76 @@
+"""
+Compares two benchmark result files and reports the measurements that got slower or less accurate.
+
+Usage: python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+Exits with status 1 if any measurement regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+from utils.enums import BenchmarkConfig
+
+
+def run_metrics(run):
+    """
+    Flattens the measurements of one corpus size into metric name to value, lower being better except
+    for recall.
+    """
+    metrics = {'build_seconds': run['build']['seconds'], 'load_seconds': run['load']['seconds']}
+    for stage, seconds in run['build']['stages'].items():
+        metrics[f'build/{stage}_seconds'] = seconds
+    if 'extraction' in run:  # Measured since the crawler extracts result pages with lxml
+        metrics['extraction/ms_per_page'] = run['extraction']['ms_per_page']
+    for name, summary in run['queries'].items():
+        metrics[f'{name}/p50_ms'] = summary['p50_ms']
+        metrics[f'{name}/p95_ms'] = summary['p95_ms']
+        if 'recall' in summary:
+            metrics[f'{name}/recall'] = summary['recall']
+    return metrics
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Compares the corpus sizes present in both result files.
+
+    Returns:
+    - list: (size, metric, baseline value, candidate value, relative change), for every shared metric;
+      the change is positive when the metric got worse.
+    """
+    baseline_runs = {run['size']: run for run in baseline['runs']}
+    rows = []
+    for run in candidate['runs']:
+        if run['size'] not in baseline_runs:
+            continue
+        old_metrics = run_metrics(baseline_runs[run['size']])
+        for metric, new in run_metrics(run).items():
+            old = old_metrics.get(metric)
+            if old:
+                change = (old - new) / old if metric.endswith('/recall') else (new - old) / old
+                rows.append((run['size'], metric, old, new, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=BenchmarkConfig.REGRESSION_THRESHOLD.value,
+                        help="Relative slowdown reported as a regression.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding='utf-8') as baseline_file, \
+            open(args.candidate, encoding='utf-8') as candidate_file:
+        rows = compare(json.load(baseline_file), json.load(candidate_file), args.threshold)
+
+    regressions = 0
+    for size, metric, old, new, change in rows:
+        regressed = change > args.threshold
+        regressions += regressed
+        print(f"{size:>8} {metric:<45} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regressions above {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+from datetime import date, timedelta
+from html import escape
+
+import numpy as np
+
+from utils.enums import BenchmarkConfig
+
+# Two letter syllables, so every syllable sequence spells a different word
+SYLLABLES = [consonant + vowel for consonant in 'bdfgklmnprstvz' for vowel in 'aeiou']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+FIRST_DATE = date(2000, 1, 1)
+LAST_DATE = date(2024, 12, 31)
+
+
+def make_word(number, min_syllables=2):
+    """
+    Spells a number as a pronounceable word, e.g. 0 -> 'baba', 1 -> 'babe'.
+    """
+    syllables = []
+    while number or len(syllables) < min_syllables:
+        number, digit = divmod(number, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+    return ''.join(reversed(syllables))
+
+
+def make_vocabulary(size):
+    """
+    Returns 'size' distinct lowercase words; the word of rank r is the r-th most frequent one.
+    """
+    return [make_word(number) for number in range(size)]
+
+
+def zipf_probabilities(size, exponent):
+    """
+    Returns the Zipf distribution over 'size' ranks: the frequency of rank r is proportional to 1 / r^exponent.
+    """
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def sample_texts(rng, words, probabilities, lengths):
+    """
+    Samples one text per length, drawing its words from the given distribution.
+
+    Returns:
+    - list: Lists of words, one per text.
+    """
+    draws = rng.choice(len(words), size=int(lengths.sum()), p=probabilities)
+    texts = []
+    start = 0
+    for length in lengths:
+        texts.append([words[rank] for rank in draws[start:start + length]])
+        start += length
+    return texts
+
+
+def generate_corpus(size, seed=BenchmarkConfig.SEED.value, vocabulary_size=BenchmarkConfig.VOCABULARY_SIZE.value,
+                    exponent=BenchmarkConfig.ZIPF_EXPONENT.value):
+    """
+    Generates a synthetic arXiv-like corpus with the schema of papers.json and papers_preprocessed.json.
+
+    Title and abstract words follow a Zipf distribution over the vocabulary, and so do the authors over
+    a pool of names, so a few authors write many papers. The preprocessed text is the raw text as the
+    crawler would preprocess it: lowercased words and author names written without spaces.
+
+    Parameters:
+    - size (int): Number of papers.
+    - seed (int): Seed of the random generator; equal seeds give equal corpora.
+    - vocabulary_size (int): Number of distinct title and abstract words.
+    - exponent (float): Exponent of the Zipf distributions.
+
+    Returns:
+    - tuple: (raw papers, preprocessed papers, vocabulary ordered by decreasing frequency).
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size)
+    word_probabilities = zipf_probabilities(vocabulary_size, exponent)
+
+    # Author names use a different word range than the vocabulary, so they never collide with it
+    author_count = max(100, size // 2)
+    names = [f"{make_word(vocabulary_size + 2 * number).title()} {make_word(vocabulary_size + 2 * number + 1).title()}"
+             for number in range(author_count)]
+    name_probabilities = zipf_probabilities(author_count, exponent)
+
+    titles = sample_texts(rng, vocabulary, word_probabilities, rng.integers(4, 16, size))
+    abstracts = sample_texts(rng, vocabulary, word_probabilities, rng.integers(80, 250, size))
+    authors = sample_texts(rng, names, name_probabilities, rng.integers(1, 9, size))
+    days = rng.integers(0, (LAST_DATE - FIRST_DATE).days + 1, size)
+
+    papers = []
+    papers_preprocessed = []
+    for number in range(size):
+        submitted = FIRST_DATE + timedelta(days=int(days[number]))
+        month = MONTHS[submitted.month - 1]
+        paper_authors = list(dict.fromkeys(authors[number]))
+        papers.append({
+            'ID': number + 1,
+            'ArxivID': f"{submitted:%y%m}.{number:05d}",
+            'Title': ' '.join(titles[number]).capitalize(),
+            'Authors': 'Authors:\n' + ', '.join(paper_authors),
+            'Abstract': 'Abstract:\n' + ' '.join(abstracts[number]).capitalize() + '.',
+            'Date': f"Submitted {submitted.day} {month}, {submitted.year}; "
+                    f"originally announced {month} {submitted.year}.",
+        })
+        papers_preprocessed.append({
+            'ID': number + 1,
+            'Title_processed': ' '.join(titles[number]),
+            'Authors_processed': ' '.join(name.replace(' ', '').lower() for name in paper_authors),
+            'Abstract_processed': ' '.join(abstracts[number]),
+            'Date_processed': f"{submitted.day}{month.lower()}{submitted.year}",
+        })
+    return papers, papers_preprocessed, vocabulary
+
+
+def generate_queries(vocabulary, count, seed=BenchmarkConfig.SEED.value):
+    """
+    Generates the benchmark queries of every algorithm from the corpus vocabulary.
+
+    Term ranks are drawn uniformly on a log scale, so frequent terms with long postings and rare terms
+    are both represented.
+
+    Parameters:
+    - vocabulary (list): Words ordered by decreasing frequency.
+    - count (int): Number of queries per algorithm.
+    - seed (int): Seed of the random generator.
+
+    Returns:
+    - dict: Algorithm name ('simple', 'boolean', 'vector_space', 'probabilistic', 'semantic') to its queries.
+    """
+    rng = np.random.default_rng(seed + 1)
+
+    def terms(number):
+        ranks = np.exp(rng.uniform(0, np.log(len(vocabulary)), number)).astype(int) - 1
+        return [vocabulary[rank] for rank in ranks]
+
+    operators = ['{} AND {}', '{} OR {}', '{} AND NOT {}', '({} OR {}) AND {}']
+    return {
+        'simple': [terms(1)[0] for _ in range(count)],
+        'boolean': [operators[number % len(operators)].format(*terms(3)) for number in range(count)],
+        'vector_space': [' '.join(terms(int(rng.integers(2, 5)))) for _ in range(count)],
+        'probabilistic': [' '.join(terms(int(rng.integers(2, 5)))) for _ in range(count)],
+        'semantic': [' '.join(terms(int(rng.integers(2, 5)))) for _ in range(count)],
+    }
+
+
+def generate_long_queries(vocabulary, count, seed=BenchmarkConfig.SEED.value):
+    """
+    Generates long ranked queries (8 to 16 terms) from the corpus vocabulary, mixing frequent and rare
+    terms like generate_queries.
+    """
+    rng = np.random.default_rng(seed + 2)
+    queries = []
+    for _ in range(count):
+        ranks = np.exp(rng.uniform(0, np.log(len(vocabulary)), int(rng.integers(8, 17)))).astype(int) - 1
+        queries.append(' '.join(vocabulary[rank] for rank in ranks))
+    return queries
+
+
+def result_page_item(paper, arxiv_id):
+    """
+    Renders a raw paper as an item of an arXiv result page, with the markup of the live listing.
+    """
+    title = paper['Title']
+    authors = paper['Authors'].removeprefix('Authors:\n').split(', ')
+    abstract = paper['Abstract'].removeprefix('Abstract:\n')
+    submitted, announced = paper['Date'].removeprefix('Submitted ').removesuffix('.').split('; originally announced ')
+    author_links = ',\n'.join(f'<a href="/search/?searchtype=author&amp;query={escape(author)}">{escape(author)}</a>'
+                               for author in authors)
+    return f"""<li class="arxiv-result">
+  <div class="is-marginless">
+    <p class="list-title is-inline-block"><a href="https://arxiv.org/abs/{arxiv_id}">arXiv:{arxiv_id}</a>
+      <span>&nbsp;[<a href="https://arxiv.org/pdf/{arxiv_id}">pdf</a>, <a href="https://arxiv.org/format/{arxiv_id}">other</a>]&nbsp;</span>
+    </p>
+    <div class="tags is-inline-block">
+      <span class="tag is-small is-link tooltip is-tooltip-top" data-tooltip="Machine Learning">cs.LG</span>
+    </div>
+  </div>
+  <p class="title is-5 mathjax">
+      {escape(title)}
+  </p>
+  <p class="authors">
+    <span class="search-hit">Authors:</span>
+    {author_links}
+  </p>
+  <p class="abstract mathjax">
+    <span class="has-text-black-bis has-text-weight-semibold">Abstract</span>:
+    <span class="abstract-short has-text-grey-dark mathjax" id="{arxiv_id}-abstract-short" style="display: inline;">
+      {escape(abstract[:200])}&hellip;
+      <a class="is-size-7" style="white-space: nowrap;" onclick="document.getElementById('{arxiv_id}-abstract-full').style.display = 'inline';">&#9661; More</a>
+    </span>
+    <span class="abstract-full has-text-grey-dark mathjax" id="{arxiv_id}-abstract-full" style="display: none;">
+      {escape(abstract)}
+      <a class="is-size-7" style="white-space: nowrap;" onclick="document.getElementById('{arxiv_id}-abstract-full').style.display = 'none';">&#9651; Less</a>
+    </span>
+  </p>
+  <p class="is-size-7"><span class="has-text-black-bis has-text-weight-semibold">Submitted</span> {submitted}; <span class="has-text-black-bis has-text-weight-semibold">originally announced</span> {announced}.
+  </p>
+  <p class="comments is-size-7">
+    <span class="has-text-black-bis has-text-weight-semibold">Comments:</span>
+    <span class="has-text-grey-dark mathjax">12 pages, 4 figures</span>
+  </p>
+</li>"""
+
+
+def generate_result_pages(papers, page_size):
+    """
+    Renders raw papers as arXiv result pages of page_size items, surrounded by the navigation, search
+    form and footer of the live listing, to benchmark and check the extraction of the crawler.
+
+    Returns:
+    - list: The HTML of every page.
+    """
+    pages = []
+    for start in range(0, len(papers), page_size):
+        items = '\n'.join(result_page_item(paper, f"{2400 + number // 100000}.{number % 100000:05d}")
+                           for number, paper in enumerate(papers[start:start + page_size], start))
+        pages.append(f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>Search | arXiv e-print repository</title>
+  <link rel="stylesheet" href="https://static.arxiv.org/static/base/1.0.0a5/css/arxivstyle.css">
+  <script src="https://static.arxiv.org/static/base/1.0.0a5/js/notification.js"></script>
+</head>
+<body>
+  <header><a href="#main-container" class="is-sr-only">Skip to main content</a>
+    <div class="level is-marginless">
+      <form class="level-item mini-search" method="GET" action="https://arxiv.org/search">
+        <input class="input is-small" type="text" name="query" placeholder="Search..." aria-label="Search term or terms" />
+        <select name="searchtype" aria-label="Field to search"><option value="all" selected="selected">All fields</option></select>
+      </form>
+    </div>
+  </header>
+  <main class="container" id="main-container">
+    <div class="level is-marginless">
+      <h1 class="title is-clearfix">Showing {start + 1}&ndash;{min(start + page_size, len(papers))} of {len(papers):,} results</h1>
+    </div>
+    <nav class="pagination is-small is-centered breathe-horizontal" role="navigation" aria-label="pagination">
+      <a href="" class="pagination-previous is-invisible">Previous</a>
+      <a href="/search/?start={start + page_size}" class="pagination-next">Next</a>
+    </nav>
+    <ol class="breathe-horizontal" start="{start + 1}">
+{items}
+    </ol>
+  </main>
+  <footer><div class="columns is-desktop" role="navigation" aria-label="Secondary">
+    <ul class="nav-spaced"><li><a href="https://info.arxiv.org/help/contact.html">Contact</a></li></ul>
+  </div></footer>
+</body>
+</html>""")
+    return pages
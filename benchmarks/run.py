@@ -0,0 +1,401 @@
+"""
+Benchmarks index build, startup load and query latency on synthetic corpora.
+
+Usage: python -m benchmarks.run [--sizes 1000 10000 100000] [--queries 200] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from enum import Enum
+from itertools import product
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import generate_corpus, generate_queries, generate_long_queries, generate_result_pages
+from crawler.bm25_index import create_and_save_bm25_index
+from crawler.inverted_index import create_and_save_inverted_index, create_and_save_term_indexes, FIELD_INDEX_PATHS, \
+    POSITIONAL_FIELDS
+from crawler.score_index import create_and_save_score_index
+from crawler.semantic_index import create_and_save_semantic_index
+from crawler.sort_columns import create_and_save_sort_columns
+from crawler.vector_index import create_and_save_vector_index
+from crawler.web_crawler import extract_papers
+from utils.algorithms import boolean_search, vector_space_search, probabilistic_search, semantic_search, \
+    simple_search
+from utils.enums import Paths, ArxivConfig, BenchmarkConfig, SearchConfig, SemanticConfig
+from utils.json_config import json_write, load_data, load_field_indexes
+from utils.snapshot import IndexSnapshot
+from utils.utils import date_range_filter
+
+
+def measure(function, *args, trace_memory=False):
+    """
+    Runs a function once and measures it.
+
+    Memory is traced in a separate run when asked, since tracing slows the run down.
+
+    Returns:
+    - tuple: (result of the function, seconds taken, peak traced bytes or None).
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def corpus_paths(directory):
+    """
+    Returns the data files of a corpus stored in 'directory', as an Enum like Paths so load_data can read them.
+    """
+    files = {member.name: os.path.join(directory, os.path.basename(member.value)) for member in Paths
+             if member.value.startswith('data/')}
+    return Enum('CorpusPaths', files)
+
+
+def build_indexes(papers, papers_preprocessed, paths):
+    """
+    Builds and saves every index of a corpus the way a full crawl does, timing each stage.
+
+    Returns:
+    - dict: Stage name to its seconds.
+    """
+    stages = {}
+    start = time.perf_counter()
+    json_write(papers, paths.PAPERS_PATH.value)
+    json_write(papers_preprocessed, paths.PAPERS_PREPROCESSED_PATH.value)
+    stages['write_papers'] = time.perf_counter() - start
+
+    inverted_indexes = {}
+    segments = {}
+    for field, base_path in FIELD_INDEX_PATHS.items():
+        path = os.path.join(os.path.dirname(paths.PAPERS_PATH.value), os.path.basename(base_path))
+        start = time.perf_counter()
+        inverted_indexes[field] = create_and_save_inverted_index(papers_preprocessed, f'{field}_processed', path,
+                                                                 positions=field in POSITIONAL_FIELDS)
+        stages[f'inverted_index_{field.lower()}'] = time.perf_counter() - start
+        segments[field] = [path]
+
+    start = time.perf_counter()
+    bm25_index = create_and_save_bm25_index(inverted_indexes, len(papers_preprocessed), paths.BM25_INDEX_PATH.value)
+    stages['bm25_index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_index = create_and_save_vector_index(papers_preprocessed, paths.VECTOR_INDEX_PATH.value)
+    stages['vector_index'] = time.perf_counter() - start
+
+    manifest = {'version': 1, 'doc_count': len(papers), 'next_segment': 1, 'segments': segments}
+    start = time.perf_counter()
+    create_and_save_score_index(manifest, bm25_index, vector_index, paths.SCORE_INDEX_PATH.value)
+    stages['score_index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_and_save_semantic_index(papers_preprocessed, paths.SEMANTIC_INDEX_PATH.value)
+    stages['semantic_index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_and_save_sort_columns(papers, paths.SORT_COLUMNS_PATH.value)
+    stages['sort_columns'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_and_save_term_indexes(manifest, paths.KGRAM_INDEX_PATH.value, paths.FUZZY_INDEX_PATH.value)
+    stages['term_indexes'] = time.perf_counter() - start
+    json_write(manifest, paths.MANIFEST_PATH.value)
+    return stages
+
+
+def load_indexes(paths):
+    """
+    Loads a corpus the way the server does at startup.
+
+    Returns:
+    - IndexSnapshot: The loaded papers and indexes.
+    """
+    data_sets = load_data({
+        'paper_data': paths.PAPERS_PATH,
+        'manifest': paths.MANIFEST_PATH,
+        'vector_index': paths.VECTOR_INDEX_PATH,
+        'bm25_index': paths.BM25_INDEX_PATH,
+        'sort_columns': paths.SORT_COLUMNS_PATH,
+        'semantic_index': paths.SEMANTIC_INDEX_PATH,
+        'score_index': paths.SCORE_INDEX_PATH,
+    })
+    return IndexSnapshot(data_sets, load_field_indexes(data_sets['manifest']))
+
+
+def query_runner(snapshot, algorithm, search_option, exact=False, doc_filter=None, pruning=True):
+    """
+    Returns a function running one query of an algorithm against a snapshot, as the /search route does.
+
+    'exact' makes the semantic search score every document instead of probing its IVF index,
+    'doc_filter' restricts the search to some documents, like a date range does, and 'pruning=False'
+    scores the BM25 and TF-IDF searches exhaustively instead of through the score index.
+    """
+    data_sets = snapshot.data_sets
+    field_indexes = snapshot.field_indexes
+    k = SearchConfig.TOP_K.value
+    score_index = data_sets['score_index'] if pruning else None
+    if algorithm == 'boolean':
+        return lambda query: boolean_search(query, search_option, field_indexes, snapshot.doc_count,
+                                            doc_filter=doc_filter)
+    if algorithm == 'vector_space':
+        return lambda query: vector_space_search(query, search_option, data_sets['vector_index'], k,
+                                                 doc_filter=doc_filter, score_index=score_index)[0]
+    if algorithm == 'probabilistic':
+        return lambda query: probabilistic_search(query, search_option, field_indexes, data_sets['bm25_index'],
+                                                  k, doc_filter=doc_filter, score_index=score_index)[0]
+    if algorithm == 'semantic':
+        return lambda query: semantic_search(query, search_option, data_sets['semantic_index'], k,
+                                             exact=exact, field_indexes=field_indexes, doc_filter=doc_filter)[0]
+    return lambda query: simple_search(query, search_option, field_indexes['Authors'], field_indexes['Date'],
+                                       field_indexes['Abstract'], field_indexes['Title'], doc_filter=doc_filter)
+
+
+def latency_summary(latencies, result_counts):
+    """
+    Summarizes query latencies in milliseconds.
+    """
+    latencies = np.array(latencies) * 1000
+    return {
+        'queries': len(latencies),
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'mean_results': float(np.mean(result_counts)),
+    }
+
+
+def recall(snapshot, queries, search_option):
+    """
+    Measures the recall of the approximate semantic search: the share of the exact top k it returns.
+    """
+    approximate = query_runner(snapshot, 'semantic', search_option)
+    exact = query_runner(snapshot, 'semantic', search_option, exact=True)
+    found = expected = 0
+    for query in queries:
+        relevant = set(exact(query))
+        found += len(relevant.intersection(approximate(query)))
+        expected += len(relevant)
+    return found / expected if expected else 1.0
+
+
+def benchmark_queries(snapshot, queries, search_options, warmup, trace_memory):
+    """
+    Times every query of every algorithm and search option, over the whole corpus and over the papers
+    of its last year, like a date range filtered search.
+
+    Returns:
+    - dict: '<algorithm>/<search_option>' (and '<algorithm>/<search_option>/last_year') to its latency
+      summary and peak traced bytes, and the recall of the semantic search.
+    """
+    sort_columns = snapshot.data_sets['sort_columns']
+    filters = {'': None, '/last_year': date_range_filter(sort_columns, int(sort_columns['sorted_dates'][-1]) - 365)}
+    results = {}
+    for (algorithm, algorithm_queries), (suffix, doc_filter) in product(queries.items(), filters.items()):
+        for search_option in search_options:
+            run = query_runner(snapshot, algorithm, search_option, doc_filter=doc_filter)
+            for query in algorithm_queries[:warmup]:
+                run(query)
+            latencies = []
+            result_counts = []
+            for query in algorithm_queries:
+                start = time.perf_counter()
+                ranking = run(query)
+                latencies.append(time.perf_counter() - start)
+                result_counts.append(len(ranking))
+            summary = latency_summary(latencies, result_counts)
+            if trace_memory:
+                _, _, summary['peak_bytes'] = measure(lambda: [run(query) for query in algorithm_queries],
+                                                      trace_memory=True)
+            if algorithm == 'semantic' and doc_filter is None:
+                summary['recall'] = recall(snapshot, algorithm_queries, search_option)
+            results[f'{algorithm}/{search_option}{suffix}'] = summary
+    return results
+
+
+def benchmark_pruning(snapshot, queries, search_options):
+    """
+    Times long BM25 and TF-IDF queries scored through the score index, with block-max pruning once
+    they read PruningConfig.MIN_POSTINGS postings, and without it, and checks that both return the
+    same documents.
+
+    Returns:
+    - dict: '<algorithm>/<search_option>/long' and '<algorithm>/<search_option>/long_exhaustive' to
+      their latency summaries; the pruned one also has its 'speedup' and 'agreement', the share of
+      queries whose top k is the same.
+    """
+    results = {}
+    for algorithm, search_option in product(('vector_space', 'probabilistic'), search_options):
+        runs = {}
+        for suffix, pruning in (('/long', True), ('/long_exhaustive', False)):
+            run = query_runner(snapshot, algorithm, search_option, pruning=pruning)
+            latencies = []
+            rankings = []
+            for query in queries:
+                start = time.perf_counter()
+                rankings.append(run(query))
+                latencies.append(time.perf_counter() - start)
+            runs[suffix] = rankings
+            results[f'{algorithm}/{search_option}{suffix}'] = latency_summary(latencies, list(map(len, rankings)))
+        summary = results[f'{algorithm}/{search_option}/long']
+        summary['speedup'] = results[f'{algorithm}/{search_option}/long_exhaustive']['mean_ms'] / summary['mean_ms']
+        summary['agreement'] = float(np.mean([set(pruned) == set(exhaustive)
+                                              for pruned, exhaustive in zip(runs['/long'], runs['/long_exhaustive'])]))
+    return results
+
+
+def extract_papers_full_tree(html):
+    """
+    Extracts the papers of a result page from a BeautifulSoup tree of the whole page, as the crawler did
+    before it read the result items with lxml; the baseline of benchmark_extraction. Malformed items are
+    handled like extract_papers does.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    papers = []
+    for paper in soup.find_all("li", class_="arxiv-result"):
+        fields = [paper.find("p", class_="title is-5 mathjax"), paper.find("p", class_="authors"),
+                  paper.find("p", class_="abstract"), paper.find("p", class_="is-size-7")]
+        if None in fields:
+            continue
+        id_paragraph = paper.find("p", class_="list-title")
+        id_link = id_paragraph.a if id_paragraph is not None else None
+        papers.append({
+            "ArxivID": id_link.text.strip().removeprefix("arXiv:") if id_link is not None else '',
+            **{name: field.text.strip() for name, field in zip(("Title", "Authors", "Abstract", "Date"), fields)},
+        })
+    return papers
+
+
+def benchmark_extraction(papers, page_size=ArxivConfig.PAGE_SIZE.value,
+                         page_count=BenchmarkConfig.EXTRACTION_PAGES.value):
+    """
+    Times the extraction of the papers of arXiv result pages rendered from the corpus, against a
+    BeautifulSoup tree of the whole page, and checks that both extract the same papers.
+
+    Returns:
+    - dict: 'ms_per_page' and 'full_tree_ms_per_page', the throughput of the extraction in pages and
+      megabytes per second, its 'speedup', and 'agreement', the share of pages extracted the same way.
+    """
+    pages = generate_result_pages(papers[:page_size * page_count], page_size)
+    extracted = {}
+    seconds = {}
+    for name, extract in (('lxml', extract_papers), ('full_tree', extract_papers_full_tree)):
+        start = time.perf_counter()
+        extracted[name] = [extract(page) for page in pages]
+        seconds[name] = time.perf_counter() - start
+    megabytes = sum(len(page.encode('utf-8')) for page in pages) / 1e6
+    return {
+        'pages': len(pages),
+        'page_size': page_size,
+        'ms_per_page': 1000 * seconds['lxml'] / len(pages),
+        'full_tree_ms_per_page': 1000 * seconds['full_tree'] / len(pages),
+        'pages_per_second': len(pages) / seconds['lxml'],
+        'megabytes_per_second': megabytes / seconds['lxml'],
+        'speedup': seconds['full_tree'] / seconds['lxml'],
+        'agreement': float(np.mean([lxml_papers == full_tree_papers for lxml_papers, full_tree_papers
+                                    in zip(extracted['lxml'], extracted['full_tree'])])),
+    }
+
+
+def benchmark_size(size, args, directory):
+    """
+    Runs the whole benchmark on a synthetic corpus of 'size' papers stored in 'directory'.
+
+    Returns:
+    - dict: The measurements of this corpus size.
+    """
+    logging.warning(f"Benchmarking a corpus of {size} papers...")
+    (papers, papers_preprocessed, vocabulary), generate_seconds, _ = measure(generate_corpus, size, args.seed)
+    paths = corpus_paths(directory)
+
+    build_stages, build_seconds, build_peak = measure(build_indexes, papers, papers_preprocessed, paths,
+                                                      trace_memory=args.memory)
+    index_bytes = {name: os.path.getsize(os.path.join(directory, name)) for name in sorted(os.listdir(directory))}
+    extraction = benchmark_extraction(papers)
+    del papers, papers_preprocessed
+
+    snapshot, load_seconds, load_peak = measure(load_indexes, paths, trace_memory=args.memory)
+    queries = generate_queries(vocabulary, args.queries, args.seed)
+    query_results = benchmark_queries(snapshot, queries, args.search_options, args.warmup, args.memory)
+    query_results.update(benchmark_pruning(snapshot, generate_long_queries(vocabulary, args.queries, args.seed),
+                                           args.search_options))
+    for index in snapshot.field_indexes.values():
+        index.close()
+
+    return {
+        'size': size,
+        'generate_seconds': generate_seconds,
+        'build': {'seconds': build_seconds, 'peak_bytes': build_peak, 'stages': build_stages},
+        'extraction': extraction,
+        'index_bytes': index_bytes,
+        'load': {'seconds': load_seconds, 'peak_bytes': load_peak},
+        'queries': query_results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark index build, load and search on synthetic corpora.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(BenchmarkConfig.SIZES.value))
+    parser.add_argument('--queries', type=int, default=BenchmarkConfig.QUERIES.value,
+                        help="Queries timed per algorithm and search option.")
+    parser.add_argument('--warmup', type=int, default=BenchmarkConfig.WARMUP_QUERIES.value)
+    parser.add_argument('--search-options', nargs='+', default=['all_fields', 'Title'])
+    parser.add_argument('--seed', type=int, default=BenchmarkConfig.SEED.value)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the traced runs measuring peak memory.")
+    parser.add_argument('--output', help="Results file, by default a new file in benchmarks/results.")
+    args = parser.parse_args(argv)
+
+    # The search functions log every query
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {'queries': args.queries, 'warmup': args.warmup, 'search_options': args.search_options,
+                   'seed': args.seed, 'top_k': SearchConfig.TOP_K.value, 'nprobe': SemanticConfig.NPROBE.value,
+                   'vocabulary_size': BenchmarkConfig.VOCABULARY_SIZE.value,
+                   'zipf_exponent': BenchmarkConfig.ZIPF_EXPONENT.value},
+        'runs': [],
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix='search-engine-benchmark-') as directory:
+            results['runs'].append(benchmark_size(size, args, directory))
+
+    output = args.output or os.path.join(Paths.BENCHMARK_RESULTS_PATH.value,
+                                         f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,73 @@
+import json
 import logging
+import time
+from datetime import date
 
-from flask import Flask, render_template, request
+from flask import Flask, Response, g, redirect, render_template, request, jsonify, stream_with_context, url_for
 
 from crawler.web_crawler import arxiv_crawler
-from exceptions.no_paper_exception import NoPapersFoundException
-from utils.algorithms import boolean_search, vector_space_search, probabilistic_search, simple_search
-from utils.json_config import load_data
-from utils.enums import Paths, ArxivConfig
+from crawler.vector_index import SEARCH_OPTIONS
+from exceptions.crawl_queue_full_exception import CrawlQueueFullException
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.algorithms import boolean_search, vector_space_search, vector_space_batch_search, probabilistic_search, \
+    semantic_search, simple_search, suggest_query
+from utils.snapshot import SnapshotManager
+from utils.crawl_jobs import CrawlJobManager
+from utils.cache import QueryCache, normalize_query
+from utils.enums import Paths, ArxivConfig, SearchConfig, MetricsConfig, SemanticConfig, CrawlJobConfig
 from utils.logging_config import configure_main_logging
-from utils.utils import read_last_n_lines
+from utils.metrics import MetricsRegistry, measure_search, stage, record_search, start_profiler, dump_profile
+from utils.utils import read_last_n_lines, sort_ranking, paginate, date_range_filter
 
 app = Flask(__name__, template_folder='../templates')
 configure_main_logging(Paths.LOGS_APP_PATH.value)
 
 
 data_paths = {
-    'author_data': Paths.INVERTED_INDEX_AUTHORS_PATH,
-    'date_data': Paths.INVERTED_INDEX_DATE_PATH,
-    'abstract_data': Paths.INVERTED_INDEX_ABSTRACT_PATH,
-    'title_data': Paths.INVERTED_INDEX_TITLE_PATH,
     'paper_data': Paths.PAPERS_PATH,
-    'paper_processed_data': Paths.PAPERS_PREPROCESSED_PATH,
+    'vector_index': Paths.VECTOR_INDEX_PATH,
+    'bm25_index': Paths.BM25_INDEX_PATH,
+    'sort_columns': Paths.SORT_COLUMNS_PATH,
+    'semantic_index': Paths.SEMANTIC_INDEX_PATH,
+    'score_index': Paths.SCORE_INDEX_PATH,
+    'manifest': Paths.MANIFEST_PATH,
 }
-data_sets = load_data(data_paths)
+snapshots = SnapshotManager(data_paths)
+query_cache = QueryCache()
+
+search_metrics = MetricsRegistry()
+search_metrics.declare('search_requests_total', 'counter', "Searches served, by algorithm, search option and status.")
+search_metrics.declare('search_latency_seconds', 'histogram', "Time to serve a search, rendering included.")
+search_metrics.declare('search_stage_seconds', 'histogram',
+                       "Time spent in each stage of a search: filter, parse, retrieval, scoring, shards, merge, "
+                       "sort, suggest and render.")
+search_metrics.declare('query_cache_hits_total', 'counter', "Searches answered from the result cache.")
+search_metrics.declare('query_cache_misses_total', 'counter', "Searches missing the result cache.")
+search_metrics.declare('query_cache_entries', 'gauge', "Rankings held by the result cache.")
+search_metrics.declare('index_version', 'gauge', "Version of the index snapshot being served.")
+search_metrics.declare('index_documents', 'gauge', "Papers in the index snapshot being served.")
+search_metrics.declare('crawl_jobs', 'gauge', "Crawl jobs known to the server, by status.")
+
+
+@app.before_request
+def refresh_snapshot():
+    snapshots.refresh()
+
+
+@app.before_request
+def start_request_profile():
+    # Opt-in, since profiling slows the request down and writes a file per request
+    if MetricsConfig.PROFILING.value and request.args.get('profile') == '1':
+        g.profiler = start_profiler()
+
+
+@app.after_request
+def dump_request_profile(response):
+    # A streamed response is produced after this hook, so only its setup is profiled
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        dump_profile(profiler, request.endpoint)
+    return response
 
 
 @app.route('/')
@@ -31,46 +76,446 @@ def index():
     return render_template('index.html')
 
 
+def run_crawl(query, max_results, merge, progress):
+    arxiv_crawler(query=query, max_results=max_results, merge=merge, progress=progress)
+    snapshots.reload()
+
+
+crawl_jobs = CrawlJobManager(run_crawl)
+
+
+def crawl_parameters(values):
+    """
+    Reads the crawl parameters of a request (form fields or a JSON body).
+
+    Returns:
+    - tuple: (query, max_results, merge).
+    """
+    query = values.get('crawl_query') or values.get('query')
+    max_results = int(values.get('max_results', ArxivConfig.DEFAULT_VALUE.value))
+    merge = values.get('mode', 'merge') == 'merge'
+    return query, max_results, merge
+
+
 @app.route('/crawl', methods=['POST'])
 def crawl():
-    query = request.form.get('crawl_query')
-    max_results = int(request.form.get('max_results', ArxivConfig.DEFAULT_VALUE.value))
+    # The crawl runs as a background job, and the browser is sent to its status page
+    query, max_results, merge = crawl_parameters(request.form)
+    logging.info(f"Received crawl request: {query}, max_results: {max_results}, merge: {merge}")
     try:
-        logging.info(f"Received crawl request: {query}, max_results: {max_results}")
-        arxiv_crawler(query=query, max_results=max_results)
+        job, _ = crawl_jobs.submit(query, max_results, merge)
+    except CrawlQueueFullException as e:
+        return render_template('crawl_error.html', error_message=e.message), 503
+    return redirect(url_for('crawl_status', job_id=job.id), code=303)
+
+
+@app.route('/crawl/<job_id>', methods=['GET'])
+def crawl_status(job_id):
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        return render_template('crawl_error.html', error_message="Unknown crawl job."), 404
+    if job.status == 'succeeded':
         log_lines = read_last_n_lines(Paths.LOGS_APP_PATH.value, 15)
         return render_template('crawl_success.html', log_statements=log_lines)
-    except NoPapersFoundException:
-        error_message = "No papers found for the given query."
-        return render_template('crawl_error.html', error_message=error_message)
-    except Exception as e:
-        logging.error(f"Crawling failed: {str(e)}")
-        error_message = "An error occurred during crawling. Please try again later."
-        return render_template('crawl_error.html', error_message=error_message)
+    if job.status == 'failed':
+        return render_template('crawl_error.html', error_message=job.error)
+    return render_template('crawl_status.html', job=job, refresh=CrawlJobConfig.STATUS_REFRESH.value)
 
 
-@app.route('/search', methods=['GET'])
-def search():
-    logging.info("Accessed the /search route")
-    query = request.args.get('query')
-    search_option = request.args.get('search_option')
-    sort_by = request.args.get('sort_by')
-    algorithm = request.args.get('algorithm')
+@app.route('/api/crawl', methods=['POST'])
+def api_crawl():
+    """
+    Submits a crawl job and answers at once with its status; GET /api/crawl/<id> follows its progress.
 
-    logging.debug(f"Received search query: {query}")
-    logging.debug(f"Search option: {search_option}")
-    logging.debug(f"Sort by: {sort_by}")
-    logging.debug(f"Algorithm: {algorithm}")
+    A crawl identical to one still queued or running returns that job, with "created" false.
+    """
+    try:
+        query, max_results, merge = crawl_parameters(request.get_json(silent=True) or request.form)
+    except ValueError:
+        return jsonify({'error': "Expected an integer 'max_results'."}), 400
+    if not query:
+        return jsonify({'error': "Expected a crawl 'query'."}), 400
+    try:
+        job, created = crawl_jobs.submit(query, max_results, merge)
+    except CrawlQueueFullException as e:
+        return jsonify({'error': e.message}), 503
+    return jsonify({**job.to_dict(), 'created': created,
+                    'status_url': url_for('api_crawl_status', job_id=job.id)}), 202
+
+
+@app.route('/api/crawl/<job_id>', methods=['GET'])
+def api_crawl_status(job_id):
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': "Unknown crawl job."}), 404
+    return jsonify(job.to_dict())
+
+
+def run_algorithm(snapshot, query, search_option, algorithm, k, postings_cache=None, fuzzy=False,
+                  nprobe=SemanticConfig.NPROBE.value, exact=False, doc_filter=None):
+    """
+    Runs the selected retrieval algorithm.
 
+    Parameters:
+    - snapshot (IndexSnapshot): The papers and indexes to search.
+    - query (str): User's search query.
+    - search_option (str): 'all_fields' or a specific field like 'Authors', 'Date', 'Abstract', 'Title'.
+    - algorithm (str): 'boolean', 'vector_space', 'probabilistic', 'semantic' or anything else for simple search.
+    - k (int): Maximum number of documents returned by the ranked algorithms.
+    - postings_cache (dict): Decoded BM25 postings shared by the queries of a batch.
+    - fuzzy (bool): Whether query terms missing from the indexes match their closest indexed terms.
+    - nprobe (int): Inverted lists scanned by the semantic search.
+    - exact (bool): Whether the semantic search scores every document instead of probing lists.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, e.g. from a date range.
+
+    Returns:
+    - tuple: (IDs of the matching documents, best first for the ranked algorithms, and their scores,
+      or None for the unranked algorithms).
+    """
+    data_sets = snapshot.data_sets
+    field_indexes = snapshot.field_indexes
     if algorithm == 'boolean':
-        return boolean_search(query, search_option, algorithm, data_sets['paper_processed_data'],
-                              data_sets['paper_data'], sort_by)
+        return boolean_search(query, search_option, field_indexes, snapshot.doc_count, fuzzy,
+                              doc_filter), None
     elif algorithm == 'vector_space':
-        return vector_space_search(query, search_option, algorithm, data_sets['paper_processed_data'],
-                                   data_sets['paper_data'], sort_by)
+        return vector_space_search(query, search_option, data_sets['vector_index'], k,
+                                   field_indexes if fuzzy else None, snapshot.shards, doc_filter,
+                                   data_sets['score_index'])
     elif algorithm == 'probabilistic':
-        return probabilistic_search(query, search_option, algorithm, data_sets['paper_processed_data'],
-                                    data_sets['paper_data'], sort_by)
+        return probabilistic_search(query, search_option, field_indexes, data_sets['bm25_index'], k,
+                                    postings_cache, fuzzy, snapshot.shards, doc_filter, data_sets['score_index'])
+    elif algorithm == 'semantic':
+        return semantic_search(query, search_option, data_sets['semantic_index'], k, nprobe, exact,
+                               field_indexes, doc_filter, fuzzy)
     else:
-        return simple_search(query, search_option, algorithm, data_sets['author_data'], data_sets['date_data'],
-                             data_sets['abstract_data'], data_sets['title_data'], data_sets['paper_data'], sort_by)
+        return simple_search(query, search_option, field_indexes['Authors'], field_indexes['Date'],
+                             field_indexes['Abstract'], field_indexes['Title'], fuzzy, doc_filter), None
+
+
+def cache_key(params):
+    return normalize_query(params['query'], params['algorithm']), params['search_option'], params['algorithm'], \
+        params['k'], params['fuzzy'], params['nprobe'], params['exact'], params['date_from'], params['date_to']
+
+
+def search_filter(snapshot, params):
+    """
+    Returns the mask of the documents within the requested date range, or None if no range was given.
+    """
+    with stage('filter'):
+        return date_range_filter(snapshot.data_sets['sort_columns'],
+                                 params['date_from'].toordinal() if params['date_from'] else None,
+                                 params['date_to'].toordinal() if params['date_to'] else None)
+
+
+def cached_search(snapshot, params, postings_cache=None):
+    """
+    Returns the ranking of a query from the result cache, running the algorithm on a miss.
+
+    Sorting and pagination happen on the returned ranking, so they share the cache entry of the query.
+
+    Parameters:
+    - snapshot (IndexSnapshot): The papers and indexes to search.
+    - params (dict): Search parameters from search_parameters.
+    - postings_cache (dict): Decoded BM25 postings shared by the queries of a batch.
+
+    Returns:
+    - tuple: (IDs of the matching documents, their scores or None), as returned by run_algorithm.
+    """
+    key = cache_key(params)
+    ranking = query_cache.get(snapshot.version, key)
+    if ranking is None:
+        ranking = run_algorithm(snapshot, params['query'], params['search_option'], params['algorithm'],
+                                params['k'], postings_cache, params['fuzzy'], params['nprobe'], params['exact'],
+                                search_filter(snapshot, params))
+        query_cache.put(snapshot.version, key, ranking)
+    return ranking
+
+
+def search_parameters(values):
+    """
+    Reads the search parameters from the request arguments or a JSON object.
+
+    Parameters:
+    - values: Mapping with 'query', 'search_option', 'algorithm', 'sort_by', 'k', 'page', 'page_size',
+      'fuzzy', 'nprobe', 'exact', 'date_from', 'date_to' (YYYY-MM-DD) and, for the JSON API, 'fields'.
+
+    Returns:
+    - dict: The parameters, with integers and dates parsed, integers clamped and defaults filled in.
+    """
+    def read_int(name, default):
+        try:
+            return int(values.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    def read_bool(name):
+        return str(values.get(name, '')).lower() in ('1', 'true', 'on')
+
+    def read_date(name):
+        try:
+            return date.fromisoformat(str(values.get(name) or ''))
+        except ValueError:
+            return None
+
+    fields = values.get('fields') or SearchConfig.API_FIELDS.value
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return {
+        'query': values.get('query'),
+        'search_option': values.get('search_option') or 'all_fields',
+        'algorithm': values.get('algorithm'),
+        'sort_by': values.get('sort_by'),
+        'k': max(1, read_int('k', SearchConfig.TOP_K.value)),
+        'page': read_int('page', 1),
+        'page_size': min(max(1, read_int('page_size', SearchConfig.PAGE_SIZE.value)),
+                         SearchConfig.MAX_PAGE_SIZE.value),
+        'fuzzy': read_bool('fuzzy'),
+        'nprobe': min(max(1, read_int('nprobe', SemanticConfig.NPROBE.value)), SemanticConfig.MAX_NPROBE.value),
+        'exact': read_bool('exact'),
+        'date_from': read_date('date_from'),
+        'date_to': read_date('date_to'),
+        'fields': [field.strip() for field in fields],
+    }
+
+
+def validate_parameters(params):
+    """
+    Checks that a search has a query and a known search option.
+
+    Raises:
+    - InvalidQueryException: If it does not, with the reason.
+    """
+    if params['search_option'] not in SEARCH_OPTIONS:
+        raise InvalidQueryException(f"Unknown search option {params['search_option']}.")
+    if not (params['query'] or '').strip():
+        raise InvalidQueryException("Expected a search 'query'.")
+
+
+def result_page(snapshot, ranking, params):
+    """
+    Sorts a ranking up to the requested page and returns that page.
+
+    Returns:
+    - tuple: (document IDs of the page, the clamped page number, number of pages).
+    """
+    page, page_count, start, end = paginate(len(ranking), params['page'], params['page_size'])
+    with stage('sort'):
+        ranking = sort_ranking(ranking, params['sort_by'], snapshot.data_sets['sort_columns'], end)
+    return ranking[start:end], page, page_count
+
+
+def query_suggestion(snapshot, params):
+    """
+    Returns a respelling of the query if some of its terms are missing from the searched fields, otherwise None.
+
+    The suggestion is only a hint, so a failure to compute it is logged and the search is served without it.
+    """
+    if not params['query'] or params['search_option'] not in SEARCH_OPTIONS:
+        return None
+    with stage('suggest'):
+        try:
+            return suggest_query(params['query'], params['search_option'], params['algorithm'],
+                                 snapshot.field_indexes)
+        except InvalidQueryException:
+            return None
+        except Exception as e:
+            logging.error(f"Query suggestion failed: {str(e)}")
+            return None
+
+
+def api_result(snapshot, params, ranking, scores):
+    """
+    Builds the JSON result of a query: one page of ranked IDs, scores and the requested paper fields,
+    and a suggested spelling of the query.
+    """
+    page_ids, page, page_count = result_page(snapshot, ranking, params)
+    doc_scores = dict(zip(ranking, scores)) if scores is not None else {}
+    return {
+        'query': params['query'],
+        'search_option': params['search_option'],
+        'algorithm': params['algorithm'],
+        'fuzzy': params['fuzzy'],
+        'date_from': params['date_from'].isoformat() if params['date_from'] else None,
+        'date_to': params['date_to'].isoformat() if params['date_to'] else None,
+        'suggestion': query_suggestion(snapshot, params),
+        'total': len(ranking),
+        'page': page,
+        'page_count': page_count,
+        'results': [{
+            'doc_id': idx,
+            'score': doc_scores.get(idx),
+            **{field: paper[field] for field in params['fields'] if field in paper},
+        } for idx, paper in zip(page_ids, snapshot.papers(page_ids))],
+    }
+
+
+def metric_labels(params):
+    """
+    Returns the algorithm and search option labels of a search, mapping unknown values to a single label
+    so that arbitrary request arguments cannot create new metric series.
+    """
+    algorithm = params['algorithm'] if params['algorithm'] in ('boolean', 'vector_space', 'probabilistic', 'semantic') \
+        else 'simple'
+    search_option = params['search_option'] if params['search_option'] in SEARCH_OPTIONS else 'other'
+    return algorithm, search_option
+
+
+@app.route('/search', methods=['GET'])
+def search():
+    logging.info("Accessed the /search route")
+    params = search_parameters(request.args)
+    query = params['query']
+
+    logging.debug("Received search query: %s", query)
+    logging.debug("Search option: %s", params['search_option'])
+    logging.debug("Sort by: %s", params['sort_by'])
+    logging.debug("Algorithm: %s", params['algorithm'])
+    logging.debug("Top k: %s, page: %s, page size: %s", params['k'], params['page'], params['page_size'])
+
+    # The whole request is served from the snapshot current when it started
+    snapshot = snapshots.current
+    start = time.perf_counter()
+    with measure_search() as timer:
+        error_message = None
+        try:
+            validate_parameters(params)
+            ranking, _ = cached_search(snapshot, params)
+        except InvalidQueryException as e:
+            logging.warning("Invalid query %s: %s", query, e.message)
+            ranking = []
+            error_message = e.message
+
+        # Sort the matching papers up to the requested page and render only that page
+        page_ids, page, page_count = result_page(snapshot, ranking, params)
+        results = snapshot.papers(page_ids)
+        suggestion = query_suggestion(snapshot, params) if error_message is None else None
+
+        with stage('render'):
+            html = render_template('results.html', query=query, search_option=params['search_option'],
+                                   algorithm=params['algorithm'], sort_by=params['sort_by'], k=params['k'],
+                                   fuzzy=params['fuzzy'], date_from=params['date_from'], date_to=params['date_to'],
+                                   suggestion=suggestion,
+                                   page=page, page_size=params['page_size'], page_count=page_count,
+                                   total_results=len(ranking), results=results, error_message=error_message)
+    record_search(search_metrics, timer, *metric_labels(params),
+                  'invalid' if error_message else 'ok', time.perf_counter() - start)
+    return html
+
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    params = search_parameters(request.args)
+    try:
+        validate_parameters(params)
+    except InvalidQueryException as e:
+        return jsonify({'error': e.message}), 400
+    snapshot = snapshots.current
+    start = time.perf_counter()
+    with measure_search() as timer:
+        try:
+            ranking, scores = cached_search(snapshot, params)
+            result = api_result(snapshot, params, ranking, scores)
+        except InvalidQueryException as e:
+            record_search(search_metrics, timer, *metric_labels(params), 'invalid',
+                          time.perf_counter() - start)
+            return jsonify({'error': e.message}), 400
+        with stage('render'):
+            response = jsonify(result)
+    record_search(search_metrics, timer, *metric_labels(params), 'ok',
+                  time.perf_counter() - start)
+    return response
+
+
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    Runs many queries at once and streams one JSON result per line (NDJSON), in request order.
+
+    The body is {"queries": [...], ...defaults}, each query being a string or an object with the
+    /api/search parameters. Vector space queries missing from the cache are scored together with one
+    sparse matrix product per search option, unless the index is sharded, and BM25 queries share their
+    decoded postings.
+    """
+    body = request.get_json(silent=True) or {}
+    queries = body.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return jsonify({'error': "Expected a non-empty 'queries' list."}), 400
+    if len(queries) > SearchConfig.MAX_BATCH_SIZE.value:
+        return jsonify({'error': f"At most {SearchConfig.MAX_BATCH_SIZE.value} queries per batch."}), 400
+
+    defaults = {name: value for name, value in body.items() if name != 'queries'}
+    batch = [search_parameters({**defaults, **(item if isinstance(item, dict) else {'query': item})})
+             for item in queries]
+    errors = []
+    for params in batch:
+        try:
+            validate_parameters(params)
+            errors.append(None)
+        except InvalidQueryException as e:
+            errors.append(e.message)
+    snapshot = snapshots.current
+
+    # Score the uncached vector space queries of each search option and date range together; the TF-IDF
+    # rows of a sharded index are held by the shard workers, which score its queries one at a time
+    rankings = [query_cache.get(snapshot.version, cache_key(params)) for params in batch]
+    groups = {}
+    for position, params in enumerate(batch):
+        if rankings[position] is None and errors[position] is None and snapshot.shards is None \
+                and params['algorithm'] == 'vector_space' and not params['fuzzy']:
+            groups.setdefault((params['search_option'], params['k'], params['date_from'], params['date_to']),
+                              []).append(position)
+    for (search_option, k, _, _), positions in groups.items():
+        start = time.perf_counter()
+        with measure_search() as timer:
+            results = vector_space_batch_search([batch[position]['query'] for position in positions],
+                                                search_option, snapshot.data_sets['vector_index'], k,
+                                                search_filter(snapshot, batch[positions[0]]))
+        # Recorded once per group: its queries are scored together
+        record_search(search_metrics, timer, 'vector_space_batch', search_option, 'ok', time.perf_counter() - start)
+        for position, ranking in zip(positions, results):
+            rankings[position] = ranking
+            query_cache.put(snapshot.version, cache_key(batch[position]), ranking)
+
+    def generate():
+        postings_caches = {}
+        for position, params in enumerate(batch):
+            if errors[position] is not None:
+                yield json.dumps({'index': position, 'error': errors[position]}) + '\n'
+                continue
+            start = time.perf_counter()
+            with measure_search() as timer:
+                try:
+                    ranking, scores = rankings[position] or cached_search(
+                        snapshot, params, postings_caches.setdefault(params['search_option'], {}))
+                    result = api_result(snapshot, params, ranking, scores)
+                    status = 'ok'
+                except InvalidQueryException as e:
+                    result = {'error': e.message}
+                    status = 'invalid'
+                with stage('render'):
+                    line = json.dumps({'index': position, **result}, ensure_ascii=False) + '\n'
+            record_search(search_metrics, timer, *metric_labels(params), status,
+                          time.perf_counter() - start)
+            yield line
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(query_cache.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Cache and index figures are read when scraped rather than updated on every search
+    stats = query_cache.stats()
+    snapshot = snapshots.current
+    search_metrics.set('query_cache_hits_total', value=stats['hits'])
+    search_metrics.set('query_cache_misses_total', value=stats['misses'])
+    search_metrics.set('query_cache_entries', value=stats['size'])
+    search_metrics.set('index_version', value=snapshot.version)
+    search_metrics.set('index_documents', value=snapshot.doc_count)
+    for status, count in crawl_jobs.counts().items():
+        search_metrics.set('crawl_jobs', {'status': status}, count)
+    return Response(search_metrics.render(), mimetype='text/plain; version=0.0.4')
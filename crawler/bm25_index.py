@@ -0,0 +1,58 @@
+import logging
+
+from utils.json_config import json_write
+
+
+def document_lengths(inverted_index, doc_count):
+    """
+    Computes the length of every document from the term frequencies of an inverted index.
+
+    Parameters:
+    - inverted_index (dict): Inverted index with 'documents' and 'frequencies' postings.
+    - doc_count (int): Number of documents in the corpus.
+
+    Returns:
+    - list: Number of terms of each document, indexed by document.
+    """
+    doc_lengths = [0] * doc_count
+    for postings in inverted_index.values():
+        for doc, frequency in zip(postings['documents'], postings['frequencies']):
+            doc_lengths[doc] += frequency
+    return doc_lengths
+
+
+def create_and_save_bm25_index(inverted_indexes, doc_count, output_file, bm25_index=None):
+    """
+    Creates and saves the BM25 collection statistics of every field from its inverted index.
+
+    The postings themselves stay in the inverted index files; this index only keeps the document
+    lengths and the average length needed to score them. 'all_fields' treats a paper as the
+    concatenation of its fields; its BM25F scoring reads the lengths of every field instead.
+
+    Parameters:
+    - inverted_indexes (dict): Field name ('Title', 'Authors', ...) to its inverted index.
+    - doc_count (int): Number of documents in the corpus.
+    - output_file (str): The file path to save the BM25 index.
+    - bm25_index (dict): Statistics of the corpus the inverted indexes extend, if they only hold new documents.
+
+    Returns:
+    - dict: The BM25 index.
+    """
+    lengths = {}
+    for field, inverted_index in inverted_indexes.items():
+        lengths[field] = document_lengths(inverted_index, doc_count)
+        if bm25_index:  # Keep the lengths of the documents indexed by earlier crawls
+            previous = bm25_index[field]['doc_lengths']
+            lengths[field][:len(previous)] = previous
+    lengths['all_fields'] = [sum(field_lengths) for field_lengths in zip(*lengths.values())]
+
+    bm25_index = {field: {
+        'doc_count': doc_count,
+        'avgdl': sum(doc_lengths) / doc_count if doc_count else 0.0,
+        'doc_lengths': doc_lengths,
+    } for field, doc_lengths in lengths.items()}
+
+    # Written compact: the document lengths make up most of the file, one short number each
+    json_write(bm25_index, output_file, indent=None)
+    logging.info(f"Successfully created and saved BM25 index ({doc_count} items).")
+    return bm25_index
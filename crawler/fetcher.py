@@ -0,0 +1,157 @@
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.enums import ArxivConfig
+
+PAGE_SIZES = (25, 50, 100, 200)  # Result page sizes accepted by the arXiv listing
+TOTAL_PATTERN = re.compile(r'Showing\s+[\d,]+\D+[\d,]+\s+of\s+([\d,]+)\s+results')
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # Throttled or failing server, worth asking again
+
+
+class RateLimiter:
+    """
+    Spaces out requests shared by several threads to a maximum rate.
+    """
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def create_session(pool_size):
+    """
+    Creates an HTTP session with a connection pool. Failed requests are retried by ArxivFetcher.fetch_page,
+    not by the session, so that every attempt waits for the rate limiter.
+
+    Parameters:
+    - pool_size (int): Connections kept open to the host.
+
+    Returns:
+    - requests.Session: The session.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def retry_delay(response, attempt, backoff_factor):
+    """
+    Returns the seconds to wait before retrying a request: the server's Retry-After in seconds if it
+    sent one, otherwise an exponential backoff.
+    """
+    retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+    return backoff_factor * 2 ** attempt
+
+
+class ArxivFetcher:
+    """
+    Fetches the result pages of an arXiv listing search concurrently.
+
+    The first page tells how many results the query has; the remaining pages are then requested by
+    their 'start' offset over a bounded pool of threads sharing one session, and yielded in order as
+    soon as each one and the ones before it have arrived.
+    """
+
+    def __init__(self, base_url=ArxivConfig.BASE_URL.value, page_size=ArxivConfig.PAGE_SIZE.value,
+                 workers=ArxivConfig.MAX_CONNECTIONS.value, requests_per_second=ArxivConfig.REQUESTS_PER_SECOND.value,
+                 retries=ArxivConfig.RETRIES.value, backoff_factor=ArxivConfig.BACKOFF_FACTOR.value,
+                 timeout=ArxivConfig.TIMEOUT.value):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session = create_session(workers)
+
+    def fetch_page(self, query, start, size):
+        """
+        Fetches one page of results, retrying with exponential backoff when the connection fails or the
+        server answers one of RETRY_STATUSES. Every attempt counts against the rate limit.
+
+        Parameters:
+        - query (str): The search query for arXiv papers.
+        - start (int): Offset of the first result of the page.
+        - size (int): Number of results of the page, one of PAGE_SIZES.
+
+        Returns:
+        - str: The HTML of the page.
+        """
+        params = {  # Parameters for the API request
+            "query": query,
+            "searchtype": "all",
+            "abstracts": "show",
+            "size": size,
+            "order": "-submitted_date",
+            "start": start,
+        }
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                response, error = None, e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    logging.info(f"Fetched results {start} to {start + size} for {query}.")
+                    return response.text
+                if attempt == self.retries:
+                    raise requests.exceptions.RetryError(
+                        f"Results {start} to {start + size} failed {attempt + 1} times, last with status "
+                        f"{response.status_code}.", response=response)
+                response.close()
+                error = f"status {response.status_code}"
+            delay = retry_delay(response, attempt, self.backoff_factor)
+            logging.warning(f"Fetching results {start} to {start + size} failed ({error}), retrying in {delay}s.")
+            time.sleep(delay)
+
+    def iter_pages(self, query, max_results):
+        """
+        Yields the result pages of a query, in order, while later pages are still being fetched.
+
+        Parameters:
+        - query (str): The search query for arXiv papers.
+        - max_results (int): The maximum number of results to fetch.
+
+        Yields:
+        - str: The HTML of each page.
+        """
+        # Smallest accepted page size holding every result, capped to the configured page size
+        size = next((size for size in PAGE_SIZES if size >= min(max_results, self.page_size)), PAGE_SIZES[-1])
+        first_page = self.fetch_page(query, 0, size)
+        yield first_page
+
+        match = TOTAL_PATTERN.search(first_page)
+        total = min(max_results, int(match.group(1).replace(',', ''))) if match else max_results
+        starts = [page * size for page in range(1, math.ceil(total / size))]
+        if not starts:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(lambda start: self.fetch_page(query, start, size), starts)
+
+    def close(self):
+        self.session.close()
@@ -1,29 +1,182 @@
-from utils.json_config import json_write
+import os
+from collections import Counter
+
+from utils.binary_index import binary_write, segments_read
+from utils.fuzzy_index import fuzzy_write
+from utils.kgram_index import kgram_write
+from utils.enums import Paths, IndexConfig
 import logging
 
+# Inverted index file of each searchable field
+FIELD_INDEX_PATHS = {
+    'Authors': Paths.INVERTED_INDEX_AUTHORS_PATH.value,
+    'Abstract': Paths.INVERTED_INDEX_ABSTRACT_PATH.value,
+    'Date': Paths.INVERTED_INDEX_DATE_PATH.value,
+    'Title': Paths.INVERTED_INDEX_TITLE_PATH.value,
+}
+# Fields whose postings keep the term positions, for phrase and proximity queries
+POSITIONAL_FIELDS = {'Title', 'Abstract'}
+
 
-def create_and_save_inverted_index(data, field_name, output_file):
+def build_inverted_index(data, field_name, first_doc=0, positions=False):
     """
-    Creates and saves an inverted index for a specific field in the given data.
+    Builds an inverted index for a specific field in the given data.
 
     Parameters:
     - data (list): List of items containing the field for which the inverted index needs to be created.
     - field_name (str): The field name for which the inverted index is created.
-    - output_file (str): The file path to save the inverted index.
+    - first_doc (int): Document ID of the first item, when the items extend an existing corpus.
+    - positions (bool): Also record the positions of each term in the preprocessed text of each document.
 
     Returns:
-    - None
+    - dict: The inverted index, mapping each term to its documents and in-document term frequencies,
+      and to its positions in each document if asked.
     """
-    # logging.info(f"Creating and saving inverted index for {field_name}...")
     inverted_index = {}
-    for idx, item in enumerate(data):
-        if field_name in item:
+    for idx, item in enumerate(data, start=first_doc):
+        if item.get(field_name):
             terms = item[field_name].split()
-            for term in set(terms):
+            if positions:
+                term_positions = {}
+                for position, term in enumerate(terms):
+                    term_positions.setdefault(term, []).append(position)
+                for term, doc_positions in term_positions.items():
+                    entry = inverted_index.setdefault(term, {'documents': [], 'frequencies': [], 'positions': []})
+                    entry['documents'].append(idx)
+                    entry['frequencies'].append(len(doc_positions))
+                    entry['positions'].append(doc_positions)
+                continue
+            for term, frequency in Counter(terms).items():
                 if term not in inverted_index:
-                    inverted_index[term] = {'documents': [idx]}
+                    inverted_index[term] = {'documents': [idx], 'frequencies': [frequency]}
                 else:
                     inverted_index[term]['documents'].append(idx)
+                    inverted_index[term]['frequencies'].append(frequency)
+    return inverted_index
+
+
+def merge_inverted_indexes(inverted_indexes):
+    """
+    Merges inverted indexes built over consecutive ranges of documents.
+
+    Parameters:
+    - inverted_indexes (list): Partial inverted indexes, ordered by the documents they cover.
+
+    Returns:
+    - dict: The inverted index of all the documents.
+    """
+    merged = {}
+    for inverted_index in inverted_indexes:
+        for term, entry in inverted_index.items():
+            if term not in merged:
+                merged[term] = {name: list(values) for name, values in entry.items()}
+            else:
+                for name, values in entry.items():
+                    merged[term][name] += values
+    return merged
+
 
-    json_write(inverted_index, output_file)
+def create_and_save_inverted_index(data, field_name, output_file, first_doc=0, positions=False):
+    """
+    Creates and saves an inverted index for a specific field in the given data.
+
+    Parameters:
+    - data (list): List of items containing the field for which the inverted index needs to be created.
+    - field_name (str): The field name for which the inverted index is created.
+    - output_file (str): The file path to save the inverted index.
+    - first_doc (int): Document ID of the first item, when the items extend an existing corpus.
+    - positions (bool): Also record the positions of each term in each document.
+
+    Returns:
+    - dict: The inverted index, mapping each term to its documents and in-document term frequencies.
+    """
+    inverted_index = build_inverted_index(data, field_name, first_doc, positions)
+    binary_write(inverted_index, output_file)
     logging.info(f"Successfully created and saved all inverted index for {field_name} ({len(data)} items).")
+    return inverted_index
+
+
+def segment_path(base_path, segment):
+    """
+    Returns the file path of an index segment, e.g. data/inverted_index_title.3.bin.
+    """
+    root, extension = os.path.splitext(base_path)
+    return f"{root}.{segment}{extension}"
+
+
+def compact_segments(field, segments, segment):
+    """
+    Merges all the segments of a field into a new segment.
+
+    The merged segments are left in place for the index version being served; they are deleted once the
+    manifest without them is published.
+
+    Parameters:
+    - field (str): The field name ('Authors', 'Abstract', 'Date', 'Title').
+    - segments (list): Paths of the field segments, oldest first.
+    - segment (int): Number of the new segment.
+
+    Returns:
+    - list: The segment list after compaction, holding only the new segment.
+    """
+    path = segment_path(FIELD_INDEX_PATHS[field], segment)
+    index = segments_read(segments)
+    binary_write(dict(index.items()), path)
+    index.close()
+    logging.info(f"Compacted {len(segments)} segments of the {field} inverted index.")
+    return [path]
+
+
+def add_inverted_index_segments(inverted_indexes, doc_count, manifest):
+    """
+    Saves the indexes of new documents as a new segment of every field and compacts fields with too many segments.
+
+    Every segment gets a number of its own, so no file of the manifest being replaced is modified.
+
+    Parameters:
+    - inverted_indexes (dict): Field name to the inverted index of the new documents only.
+    - doc_count (int): Number of documents in the corpus, new ones included.
+    - manifest (dict): Index manifest with 'doc_count', 'next_segment' and the 'segments' of each field;
+      updated in place.
+    """
+    segment = manifest['next_segment']
+    compacted = False
+    for field, base_path in FIELD_INDEX_PATHS.items():
+        # The first segment of a corpus is its base file
+        path = base_path if segment == 0 else segment_path(base_path, segment)
+        binary_write(inverted_indexes[field], path)
+        segments = manifest['segments'][field] = manifest['segments'].get(field, []) + [path]
+        if len(segments) > IndexConfig.MAX_SEGMENTS.value:
+            manifest['segments'][field] = compact_segments(field, segments, segment + 1)
+            os.remove(path)  # Merged into the compacted segment before any manifest listed it
+            compacted = True
+
+    manifest['next_segment'] = segment + (2 if compacted else 1)
+    manifest['doc_count'] = doc_count
+
+
+def create_and_save_term_indexes(manifest, kgram_base_path=Paths.KGRAM_INDEX_PATH.value,
+                                 fuzzy_base_path=Paths.FUZZY_INDEX_PATH.value):
+    """
+    Rebuilds the indexes of the term dictionary of every field: the k-gram index for wildcard and
+    substring lookups, and the fuzzy index for misspelled terms. Their files are named after the index
+    version, e.g. data/kgram_index.title.v3.bin.
+
+    Parameters:
+    - manifest (dict): Index manifest with the 'version' and the 'segments' of each field; its 'kgram_indexes'
+      and 'fuzzy_indexes' are updated in place.
+    - kgram_base_path (str): Path the k-gram index file of each field is named after.
+    - fuzzy_base_path (str): Path the fuzzy index file of each field is named after.
+    """
+    # Listed before they are written, so the files of a failed crawl are known
+    kgram_indexes = manifest['kgram_indexes'] = {}
+    fuzzy_indexes = manifest['fuzzy_indexes'] = {}
+    for field, segments in manifest['segments'].items():
+        index = segments_read(segments)
+        vocabulary = list(index)
+        index.close()
+        kgram_indexes[field] = segment_path(kgram_base_path, f"{field.lower()}.v{manifest['version']}")
+        kgram_write(vocabulary, kgram_indexes[field])
+        fuzzy_indexes[field] = segment_path(fuzzy_base_path, f"{field.lower()}.v{manifest['version']}")
+        fuzzy_write(vocabulary, fuzzy_indexes[field])
+    logging.info(f"K-gram and fuzzy indexes created and saved for {list(kgram_indexes)}.")
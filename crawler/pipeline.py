@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from crawler.inverted_index import FIELD_INDEX_PATHS, POSITIONAL_FIELDS, build_inverted_index, \
+    merge_inverted_indexes
+from crawler.preprocess import get_preprocessor
+from utils.enums import CrawlerConfig
+
+
+def process_chunk(papers, first_doc, preprocess=True):
+    """
+    Preprocesses a chunk of papers and builds the inverted index of every field over it.
+
+    Parameters:
+    - papers (list): Raw papers, or already preprocessed ones if preprocess is False.
+    - first_doc (int): Document ID of the first paper of the chunk.
+    - preprocess (bool): Whether the papers still need to be preprocessed.
+
+    Returns:
+    - tuple: (preprocessed papers, field name to the partial inverted index of the chunk).
+    """
+    data_preprocessed = get_preprocessor().preprocess_batch(papers) if preprocess else papers
+    inverted_indexes = {field: build_inverted_index(data_preprocessed, f'{field}_processed', first_doc,
+                                                    positions=field in POSITIONAL_FIELDS)
+                        for field in FIELD_INDEX_PATHS}
+    return data_preprocessed, inverted_indexes
+
+
+class IndexingPipeline:
+    """
+    Preprocesses and indexes papers chunk by chunk as they are produced, e.g. while a crawl is still fetching.
+
+    Chunks are spread over a pool of worker processes, each building partial inverted indexes over
+    consecutive documents that are merged in document order once every chunk is done. With a single
+    worker the chunks are processed in the calling process.
+    """
+
+    def __init__(self, first_doc, workers=None, preprocess=True):
+        self.next_doc = first_doc
+        self.workers = workers or CrawlerConfig.WORKERS.value
+        self.preprocess = preprocess
+        self.executor = None
+        self.results = []
+
+    def submit(self, papers):
+        """
+        Queues papers for processing, split into chunks of CrawlerConfig.CHUNK_SIZE.
+
+        Parameters:
+        - papers (list): Raw papers, or already preprocessed ones, following the previously submitted ones.
+        """
+        chunk_size = CrawlerConfig.CHUNK_SIZE.value
+        for start in range(0, len(papers), chunk_size):
+            chunk = papers[start:start + chunk_size]
+            if self.workers <= 1:
+                self.results.append(process_chunk(chunk, self.next_doc, self.preprocess))
+            else:
+                if self.executor is None:  # Started with the first chunk
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                self.results.append(self.executor.submit(process_chunk, chunk, self.next_doc, self.preprocess))
+            self.next_doc += len(chunk)
+
+    def finish(self):
+        """
+        Waits for every chunk and merges their results.
+
+        Returns:
+        - tuple: (preprocessed papers, field name to the inverted index of all the papers).
+        """
+        if self.executor is not None:
+            self.results = [future.result() for future in self.results]
+            self.executor.shutdown()
+            self.executor = None
+        data_preprocessed = [paper for chunk_preprocessed, _ in self.results for paper in chunk_preprocessed]
+        inverted_indexes = {field: merge_inverted_indexes([chunk_indexes[field] for _, chunk_indexes in self.results])
+                            for field in FIELD_INDEX_PATHS}
+        return data_preprocessed, inverted_indexes
+
+    def close(self):
+        """
+        Stops the worker processes, dropping the chunks not processed yet.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+def run_pipeline(papers, first_doc, workers=None, preprocess=True):
+    """
+    Preprocesses and indexes papers in chunks, spread over a pool of worker processes.
+
+    Parameters:
+    - papers (list): Raw papers, or already preprocessed ones if preprocess is False.
+    - first_doc (int): Document ID of the first paper.
+    - workers (int): Number of worker processes; defaults to CrawlerConfig.WORKERS.
+    - preprocess (bool): Whether the papers still need to be preprocessed.
+
+    Returns:
+    - tuple: (preprocessed papers, field name to the inverted index of all the papers).
+    """
+    # A single chunk is not worth starting worker processes
+    if len(papers) <= CrawlerConfig.CHUNK_SIZE.value:
+        workers = 1
+    pipeline = IndexingPipeline(first_doc, workers, preprocess)
+    pipeline.submit(papers)
+    return pipeline.finish()
@@ -1,10 +1,34 @@
 import datetime
+import logging
 import unicodedata
+from functools import lru_cache
 from nltk import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import re
 
+from utils.enums import PreprocessConfig
+
+# NLTK's English stop word list, so that query terms can be checked against it without loading the NLTK data
+STOP_WORDS = frozenset({
+    'a', 'about', 'above', 'after', 'again', 'against', 'ain', 'all', 'am', 'an', 'and', 'any', 'are', 'aren',
+    "aren't", 'as', 'at', 'be', 'because', 'been', 'before', 'being', 'below', 'between', 'both', 'but', 'by',
+    'can', 'couldn', "couldn't", 'd', 'did', 'didn', "didn't", 'do', 'does', 'doesn', "doesn't", 'doing', 'don',
+    "don't", 'down', 'during', 'each', 'few', 'for', 'from', 'further', 'had', 'hadn', "hadn't", 'has', 'hasn',
+    "hasn't", 'have', 'haven', "haven't", 'having', 'he', "he'd", "he'll", "he's", 'her', 'here', 'hers',
+    'herself', 'him', 'himself', 'his', 'how', 'i', "i'd", "i'll", "i'm", "i've", 'if', 'in', 'into', 'is', 'isn',
+    "isn't", 'it', "it'd", "it'll", "it's", 'its', 'itself', 'just', 'll', 'm', 'ma', 'me', 'mightn', "mightn't",
+    'more', 'most', 'mustn', "mustn't", 'my', 'myself', 'needn', "needn't", 'no', 'nor', 'not', 'now', 'o', 'of',
+    'off', 'on', 'once', 'only', 'or', 'other', 'our', 'ours', 'ourselves', 'out', 'over', 'own', 're', 's',
+    'same', 'shan', "shan't", 'she', "she'd", "she'll", "she's", 'should', "should've", 'shouldn', "shouldn't",
+    'so', 'some', 'such', 't', 'than', 'that', "that'll", 'the', 'their', 'theirs', 'them', 'themselves', 'then',
+    'there', 'these', 'they', "they'd", "they'll", "they're", "they've", 'this', 'those', 'through', 'to', 'too',
+    'under', 'until', 'up', 've', 'very', 'was', 'wasn', "wasn't", 'we', "we'd", "we'll", "we're", "we've", 'were',
+    'weren', "weren't", 'what', 'when', 'where', 'which', 'while', 'who', 'whom', 'why', 'will', 'with', 'won',
+    "won't", 'wouldn', "wouldn't", 'y', 'you', "you'd", "you'll", "you're", "you've", 'your', 'yours', 'yourself',
+    'yourselves'
+})
+
 
 def preprocess_abstract(text):
     """
@@ -16,14 +40,7 @@ def preprocess_abstract(text):
     Returns:
     - str: The preprocessed abstract text.
     """
-    tokens = word_tokenize(text)  # Τokenization
-    tokens = [re.sub(r'[^a-zA-Z0-9]', '', unicodedata.normalize('NFKD', token.lower())) for token in tokens]
-    stop_words = set(stopwords.words('english'))  # stop-word removal
-    tokens = [token for token in tokens if token not in stop_words]
-    lemmatizer = WordNetLemmatizer()  # lemmatization
-    tokens = [lemmatizer.lemmatize(token) for token in tokens]
-    preprocessed_text = ' '.join(tokens)
-    return preprocessed_text
+    return get_preprocessor().preprocess_abstract(text)
 
 
 def preprocess_authors(authors_text):
@@ -92,16 +109,146 @@ def preprocess_title(title_text):
     Returns:
     - str: The preprocessed title text.
     """
-    # Remove special characters and normalize to lowercase
-    preprocessed_title = re.sub(r'[^a-zA-Z0-9\s]', '', unicodedata.normalize('NFKD', title_text.lower()))
-    # Tokenization: Split the text into words
-    tokens = word_tokenize(preprocessed_title)
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    tokens = [token for token in tokens if token not in stop_words]
-    # Lemmatization: Convert words to their base form
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(token) for token in tokens]
-    # Join the tokens back into a preprocessed title
-    preprocessed_title = ' '.join(tokens)
-    return preprocessed_title
+    return get_preprocessor().preprocess_title(title_text)
+
+
+class Preprocessor:
+    """
+    Preprocesses papers with NLTK resources loaded once and shared by every paper.
+
+    Stop words and the lemmatizer are created when the preprocessor is, and lemmas are memoized in a
+    bounded LRU cache, since the vocabulary of a crawl is much smaller than its number of tokens.
+    """
+
+    def __init__(self, lemma_cache_size=PreprocessConfig.LEMMA_CACHE_SIZE.value):
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.lemmatizer = WordNetLemmatizer()
+        self.lemmatize = lru_cache(maxsize=lemma_cache_size)(self.lemmatizer.lemmatize)
+
+    def abstract_tokens(self, text):
+        tokens = word_tokenize(text)  # Τokenization
+        tokens = [re.sub(r'[^a-zA-Z0-9]', '', unicodedata.normalize('NFKD', token.lower())) for token in tokens]
+        return [token for token in tokens if token not in self.stop_words]  # stop-word removal
+
+    def title_tokens(self, title_text):
+        # Remove special characters and normalize to lowercase
+        title_text = re.sub(r'[^a-zA-Z0-9\s]', '', unicodedata.normalize('NFKD', title_text.lower()))
+        # Tokenization and stop-word removal
+        return [token for token in word_tokenize(title_text) if token not in self.stop_words]
+
+    def preprocess_abstract(self, text):
+        """
+        Preprocesses the abstract text of an academic paper.
+
+        Parameters:
+        - text (str): The raw abstract text.
+
+        Returns:
+        - str: The preprocessed abstract text.
+        """
+        return ' '.join(self.lemmatize(token) for token in self.abstract_tokens(text))  # lemmatization
+
+    def preprocess_title(self, title_text):
+        """
+        Preprocesses the title of an academic paper.
+
+        Parameters:
+        - title_text (str): The raw title text.
+
+        Returns:
+        - str: The preprocessed title text.
+        """
+        return ' '.join(self.lemmatize(token) for token in self.title_tokens(title_text))
+
+    def preprocess_batch(self, papers):
+        """
+        Preprocesses a list of raw papers at once.
+
+        Titles and abstracts of the whole batch are tokenized first and every distinct token is
+        lemmatized once for the batch.
+
+        Parameters:
+        - papers (list): Raw papers with 'ID', 'Title', 'Authors', 'Abstract' and 'Date'.
+
+        Returns:
+        - list: Preprocessed papers, in the same order.
+        """
+        titles = [self.title_tokens(paper['Title']) for paper in papers]
+        abstracts = [self.abstract_tokens(paper['Abstract']) for paper in papers]
+        lemmas = {token: self.lemmatize(token) for token in set().union(*titles, *abstracts)}
+
+        return [{
+            "ID": paper['ID'],
+            "Title_processed": ' '.join(lemmas[token] for token in title),
+            "Authors_processed": preprocess_authors(paper['Authors']),
+            "Abstract_processed": ' '.join(lemmas[token] for token in abstract),
+            "Date_processed": preprocess_date(paper['Date']),
+        } for paper, title, abstract in zip(papers, titles, abstracts)]
+
+
+@lru_cache(maxsize=None)
+def get_preprocessor():
+    """
+    Returns the preprocessor shared by the module functions, created on first use.
+    """
+    return Preprocessor()
+
+
+@lru_cache(maxsize=None)
+def get_query_preprocessor():
+    """
+    Returns the shared preprocessor if the NLTK data it needs is installed, otherwise None; checked once.
+    """
+    try:
+        preprocessor = get_preprocessor()
+        preprocessor.preprocess_title('indexed papers')  # The tokenizer and WordNet are loaded on first use
+        return preprocessor
+    except LookupError:
+        logging.warning("NLTK data is missing, query words are not lemmatized.")
+        return None
+
+
+def analyze_query(text):
+    """
+    Preprocesses query text like the titles and abstracts it is matched against.
+
+    Searches are served even if the NLTK data is not installed: the words are then only normalized
+    and stop words removed, without lemmatization.
+
+    Parameters:
+    - text (str): Words of the query.
+
+    Returns:
+    - list: The preprocessed words, stop words removed.
+    """
+    preprocessor = get_query_preprocessor()
+    if preprocessor is not None:
+        return preprocessor.preprocess_title(text).split()
+    text = re.sub(r'[^a-zA-Z0-9\s]', '', unicodedata.normalize('NFKD', text.lower()))
+    return [token for token in text.split() if token not in STOP_WORDS]
+
+
+def analyze_field_query(query, search_option):
+    """
+    Preprocesses a free text query like the field(s) of a search option: words lemmatized as in the
+    titles and abstracts, author names and dates joined as in their fields.
+
+    Parameters:
+    - query (str): User's search query.
+    - search_option (str): 'all_fields' or a specific field like 'Authors', 'Date', 'Abstract', 'Title'.
+
+    Returns:
+    - list: The distinct preprocessed words, in query order.
+    """
+    words = []
+    if search_option in ('Title', 'Abstract', 'all_fields'):
+        words += analyze_query(query)
+    if search_option in ('Authors', 'all_fields'):
+        words += preprocess_authors(query).split()
+    if search_option in ('Date', 'all_fields'):
+        try:
+            date = preprocess_date(query)
+        except ValueError:  # Not a month name
+            date = None
+        words += [date] if date else []
+    return list(dict.fromkeys(words))
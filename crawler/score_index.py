@@ -0,0 +1,164 @@
+import logging
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+from utils.binary_index import segments_read
+from utils.enums import BM25Config, BM25FConfig, PruningConfig
+from utils.json_config import joblib_write
+
+
+def field_postings(segments):
+    """
+    Reads every postings list of a field.
+
+    Returns:
+    - tuple: (sorted terms, and for every posting its term number, document ID and term frequency).
+    """
+    index = segments_read(segments)
+    terms = []
+    columns = []
+    documents = []
+    frequencies = []
+    for column, term in enumerate(index):
+        entry = index.get(term)
+        terms.append(term)
+        columns.append(np.full(len(entry['documents']), column, dtype=np.int64))
+        documents.append(np.asarray(entry['documents'], dtype=np.int64))
+        frequencies.append(np.asarray(entry['frequencies'], dtype=np.float64))
+    index.close()
+    # Object arrays store every term with its own length, where string arrays pad them to the longest
+    if not terms:
+        return np.array([], dtype=object), np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float64)
+    return np.array(terms, dtype=object), np.concatenate(columns), np.concatenate(documents), \
+        np.concatenate(frequencies)
+
+
+def bm25_idfs(doc_count, document_frequencies):
+    return np.log((doc_count - document_frequencies + 0.5) / (document_frequencies + 0.5) + 1)
+
+
+def bm25_impacts(postings, field_stats):
+    """
+    Computes the BM25 score of every posting of a field, as bm25_scores adds it.
+
+    Returns:
+    - tuple: (sorted terms, term by document matrix of the scores).
+    """
+    terms, columns, documents, frequencies = postings
+    k1 = BM25Config.K1.value
+    b = BM25Config.B.value
+    doc_lengths = np.asarray(field_stats['doc_lengths'], dtype=np.float64)
+    avgdl = field_stats['avgdl'] or 1.0
+    idf = bm25_idfs(field_stats['doc_count'], np.bincount(columns, minlength=len(terms)))
+    norm = k1 * (1 - b + b * doc_lengths[documents] / avgdl)
+    scores = idf[columns] * frequencies * (k1 + 1) / (frequencies + norm)
+    return terms, csc_matrix((scores, (documents, columns)), shape=(field_stats['doc_count'], len(terms)))
+
+
+def bm25f_impacts(field_postings_by_field, bm25_index):
+    """
+    Computes the BM25F score of every term of every document over all the fields, as bm25f_scores does.
+
+    Returns:
+    - tuple: (sorted terms of all the fields, term by document matrix of the scores).
+    """
+    k1 = BM25Config.K1.value
+    doc_count = bm25_index['all_fields']['doc_count']
+    terms = np.unique(np.concatenate([postings[0] for postings in field_postings_by_field.values()]))
+    columns = []
+    documents = []
+    weighted = []
+    for field, (field_terms, field_columns, field_documents, frequencies) in field_postings_by_field.items():
+        weight = BM25FConfig.WEIGHTS.value.get(field, 1.0)
+        b = BM25FConfig.B.value.get(field, BM25Config.B.value)
+        doc_lengths = np.asarray(bm25_index[field]['doc_lengths'], dtype=np.float64)
+        avgdl = bm25_index[field]['avgdl'] or 1.0
+        columns.append(np.searchsorted(terms, field_terms)[field_columns])
+        documents.append(field_documents)
+        weighted.append(weight * frequencies / (1 - b + b * doc_lengths[field_documents] / avgdl))
+    # The frequencies of a term in the fields of a document are summed into one entry
+    matrix = csc_matrix((np.concatenate(weighted), (np.concatenate(documents), np.concatenate(columns))),
+                        shape=(doc_count, len(terms)))
+    matrix.sum_duplicates()
+    idf = bm25_idfs(doc_count, np.diff(matrix.indptr))
+    frequencies = matrix.data
+    matrix.data = np.repeat(idf, np.diff(matrix.indptr)) * frequencies * (k1 + 1) / (frequencies + k1)
+    return terms, matrix
+
+
+def block_maxima(impacts, block_size=PruningConfig.BLOCK_SIZE.value):
+    """
+    Splits the postings of every term into blocks of block_size document IDs and finds the best score
+    of every block and of every term.
+
+    Parameters:
+    - impacts (csc_matrix): Document by term matrix of scores, with sorted indices.
+    - block_size (int): Document IDs per block.
+
+    Returns:
+    - dict: 'block_size', 'term_max', and per block of every term, term by term: its 'block_ids' (document ID //
+      block_size), 'block_max' and 'block_starts' (position of its first posting in impacts.data);
+      'block_indptr' locates the blocks of every term.
+    """
+    term_count = impacts.shape[1]
+    postings_terms = np.repeat(np.arange(term_count), np.diff(impacts.indptr))
+    blocks = impacts.indices // block_size
+    new_block = np.ones(len(blocks), dtype=bool)
+    new_block[1:] = (postings_terms[1:] != postings_terms[:-1]) | (blocks[1:] != blocks[:-1])
+    starts = np.flatnonzero(new_block)
+    block_max = np.maximum.reduceat(impacts.data, starts) if len(starts) else np.zeros(0)
+    block_indptr = np.searchsorted(postings_terms[starts], np.arange(term_count + 1))
+    term_max = np.zeros(term_count)
+    non_empty = np.diff(block_indptr) > 0
+    if non_empty.any():
+        term_max[non_empty] = np.maximum.reduceat(block_max, block_indptr[:-1][non_empty])
+    return {
+        'block_size': block_size,
+        'term_max': term_max,
+        'block_indptr': block_indptr.astype(np.int32),
+        'block_ids': blocks[starts].astype(np.int32),
+        'block_max': block_max,
+        'block_starts': starts.astype(np.int32),
+    }
+
+
+def score_entry(impacts, terms=None):
+    impacts = csc_matrix(impacts)
+    impacts.sort_indices()
+    entry = {'impacts': impacts, **block_maxima(impacts)}
+    if terms is not None:
+        entry['terms'] = terms
+    return entry
+
+
+def create_and_save_score_index(manifest, bm25_index, vector_index, output_file):
+    """
+    Precomputes the score of every posting for the BM25 and TF-IDF searches, with the per-term and
+    per-block maxima that let a top-k query skip the documents that cannot make it into the results.
+
+    The scores depend on collection statistics, so the whole index is rebuilt by every crawl.
+
+    Parameters:
+    - manifest (dict): Index manifest with the inverted index 'segments' of every field.
+    - bm25_index (dict): BM25 statistics of every search option.
+    - vector_index (dict): TF-IDF models of every search option.
+    - output_file (str): The file path to save the score index.
+
+    Returns:
+    - dict: 'bm25' and 'vector_space', each mapping a search option to its score entry.
+    """
+    postings = {field: field_postings(segments) for field, segments in manifest['segments'].items()}
+    score_index = {'bm25': {}, 'vector_space': {}}
+    for field, field_postings_lists in postings.items():
+        terms, impacts = bm25_impacts(field_postings_lists, bm25_index[field])
+        score_index['bm25'][field] = score_entry(impacts, terms)
+    if postings:
+        terms, impacts = bm25f_impacts(postings, bm25_index)
+        score_index['bm25']['all_fields'] = score_entry(impacts, terms)
+    for search_option, model in vector_index.items():
+        score_index['vector_space'][search_option] = score_entry(model['tfidf_matrix'])
+
+    joblib_write(score_index, output_file)
+    logging.info(f"Successfully created and saved score index ({manifest['doc_count']} items).")
+    return score_index
@@ -0,0 +1,238 @@
+import copy
+import logging
+import math
+
+import numpy as np
+from gensim.models import Word2Vec
+
+from crawler.vector_index import SEARCH_OPTIONS, build_corpus
+from crawler.versions import DATA_FILES, index_lock, publish_manifest, versioned_path
+from utils.enums import Paths, SemanticConfig, CrawlerConfig
+from utils.json_config import json_read, manifest_file, numpy_write
+from utils.semantic_index import embed_texts
+
+
+def train_word_vectors(data):
+    """
+    Trains word embeddings on the preprocessed text of every paper, locally and on the CPU. With a
+    SemanticConfig.SEED, training is reproducible: the same corpus always gives the same embeddings.
+
+    Parameters:
+    - data (list): List of preprocessed papers.
+
+    Returns:
+    - dict: The sorted vocabulary ('words'), the unit vector of every word ('word_vectors') and its
+      smooth inverse frequency weight ('word_weights').
+    """
+    sentences = [text.split() for text in build_corpus(data, 'all_fields')]
+    model = Word2Vec(sentences=sentences, vector_size=SemanticConfig.DIMENSIONS.value,
+                     window=SemanticConfig.WINDOW.value, min_count=SemanticConfig.MIN_COUNT.value,
+                     epochs=SemanticConfig.EPOCHS.value, sg=1, seed=SemanticConfig.SEED.value,
+                     # Several threads train in scheduling order, which the seed cannot fix
+                     workers=1 if SemanticConfig.SEED.value is not None else CrawlerConfig.WORKERS.value)
+    vectors = model.wv
+    order = np.argsort(np.array(vectors.index_to_key))
+    words = np.array(vectors.index_to_key)[order]
+    counts = np.array([vectors.get_vecattr(word, 'count') for word in vectors.index_to_key], dtype=np.float64)[order]
+    # Smooth inverse frequency: a / (a + p(word))
+    weights = SemanticConfig.SIF_WEIGHT.value / (SemanticConfig.SIF_WEIGHT.value + counts / counts.sum())
+    return {
+        'words': words,
+        'word_vectors': vectors.get_normed_vectors()[order].astype(np.float32),
+        'word_weights': weights.astype(np.float32),
+    }
+
+
+def spherical_kmeans(vectors, clusters, iterations=SemanticConfig.KMEANS_ITERATIONS.value,
+                     seed=SemanticConfig.SEED.value):
+    """
+    Clusters unit vectors by cosine similarity.
+
+    Parameters:
+    - vectors (np.ndarray): Unit vectors, one per row.
+    - clusters (int): Number of clusters.
+    - iterations (int): Lloyd iterations.
+    - seed (int): Seed of the initial centroid sample.
+
+    Returns:
+    - tuple: (unit centroids, cluster of every vector).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)]
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # A cluster left empty keeps its previous centroid
+        centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_ivf_index(vectors):
+    """
+    Builds the inverted file (IVF) index of document embeddings: the documents grouped by nearest centroid.
+
+    About the square root of the document count lists are made, the usual balance between the cost
+    of scoring the centroids and the cost of scanning the probed lists.
+
+    Returns:
+    - dict: 'centroids', 'list_offsets' and 'list_documents' arrays.
+    """
+    documents = np.flatnonzero(np.linalg.norm(vectors, axis=1) > 0)  # Documents without known words never match
+    clusters = min(len(documents), max(1, round(math.sqrt(len(documents)))))
+    if not clusters:
+        return {'centroids': np.zeros((0, vectors.shape[1]), dtype=np.float32),
+                'list_offsets': np.zeros(1, dtype=np.int64), 'list_documents': documents}
+    centroids, assignments = spherical_kmeans(vectors[documents], clusters)
+    order = np.argsort(assignments, kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=clusters))))
+    return {'centroids': centroids.astype(np.float32), 'list_offsets': offsets,
+            'list_documents': documents[order]}
+
+
+def create_and_save_semantic_index(data, output_file):
+    """
+    Trains word embeddings on the corpus, embeds the papers of every search option and saves them with
+    their approximate nearest neighbour (IVF) indexes.
+
+    Parameters:
+    - data (list): List of preprocessed papers.
+    - output_file (str): The file path to save the semantic index.
+
+    Returns:
+    - dict: Array name to array, as saved.
+    """
+    semantic_index = train_word_vectors(data)
+    semantic_index['trained_doc_count'] = np.array(len(data))
+    for search_option in SEARCH_OPTIONS:
+        vectors = embed_texts(build_corpus(data, search_option), semantic_index)
+        semantic_index[f'{search_option}.vectors'] = vectors
+        for name, array in build_ivf_index(vectors).items():
+            semantic_index[f'{search_option}.{name}'] = array
+
+    numpy_write(semantic_index, output_file)
+    logging.info(f"Successfully created and saved semantic index of {len(semantic_index['words'])} words "
+                 f"({len(data)} items).")
+    return semantic_index
+
+
+def unknown_words_share(semantic_index, data):
+    """
+    Returns the share of the words of preprocessed papers missing from the vocabulary of the embeddings.
+    """
+    tokens = ' '.join(build_corpus(data, 'all_fields')).split()
+    if not tokens:
+        return 0.0
+    return 1 - np.isin(np.array(tokens, dtype=object), semantic_index['words']).mean()
+
+
+def needs_training(semantic_index, doc_count, new_data):
+    """
+    Tells whether the embeddings of a semantic index drifted too far from the corpus to embed its new
+    papers: the corpus grew RETRAIN_GROWTH times over since they were trained, which also leaves too few
+    inverted lists, or too many of the words of the new papers are unknown to them.
+
+    Parameters:
+    - semantic_index (dict): The semantic index before the new papers, or None.
+    - doc_count (int): Number of papers of the corpus, new ones included.
+    - new_data (list): Preprocessed new papers.
+
+    Returns:
+    - bool: Whether the embeddings and inverted lists have to be trained again on the whole corpus.
+    """
+    if semantic_index is None or not len(semantic_index['words']) or \
+            not all(len(semantic_index[f'{search_option}.centroids']) for search_option in SEARCH_OPTIONS):
+        return True
+    if len(semantic_index['all_fields.vectors']) != doc_count - len(new_data):  # Not the index of the corpus
+        return True
+    trained_doc_count = int(semantic_index.get('trained_doc_count', len(semantic_index['all_fields.vectors'])))
+    if doc_count > SemanticConfig.RETRAIN_GROWTH.value * max(1, trained_doc_count):
+        return True
+    return unknown_words_share(semantic_index, new_data) > SemanticConfig.RETRAIN_UNKNOWN_WORDS.value
+
+
+def add_to_ivf_index(ivf_index, vectors, first_doc):
+    """
+    Adds documents to the inverted lists of their nearest centroids, the centroids staying as they are.
+
+    Parameters:
+    - ivf_index (dict): 'centroids', 'list_offsets' and 'list_documents' arrays.
+    - vectors (np.ndarray): Unit embeddings of the new documents, one row per document.
+    - first_doc (int): Document ID of the first new document.
+
+    Returns:
+    - dict: The IVF index with the new documents.
+    """
+    offsets = ivf_index['list_offsets']
+    list_count = len(offsets) - 1
+    documents = np.flatnonzero(np.linalg.norm(vectors, axis=1) > 0)  # Documents without known words never match
+    lists = np.concatenate((np.repeat(np.arange(list_count), np.diff(offsets)),
+                            np.argmax(vectors[documents] @ ivf_index['centroids'].T, axis=1)))
+    documents = np.concatenate((ivf_index['list_documents'], documents + first_doc))
+    # The new documents follow the earlier ones of their list, so every list stays sorted by document ID
+    order = np.argsort(lists, kind='stable')
+    return {'centroids': ivf_index['centroids'],
+            'list_offsets': np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=list_count)))),
+            'list_documents': documents[order]}
+
+
+def update_and_save_semantic_index(existing_data, new_data, output_file, semantic_index=None):
+    """
+    Adds new papers to the semantic index of a corpus and saves it.
+
+    The new papers are embedded with the existing word embeddings and added to the inverted lists of their
+    nearest centroids, which costs a crawl a pass over its own papers only. The embeddings are trained and
+    the papers clustered again on the whole corpus when there is no semantic index yet or when it drifted
+    too far from the corpus (see needs_training).
+
+    Parameters:
+    - existing_data (list): Preprocessed papers of the semantic index.
+    - new_data (list): Preprocessed papers to add.
+    - output_file (str): The file path to save the semantic index.
+    - semantic_index (dict): Semantic index of existing_data, or None to train one.
+
+    Returns:
+    - dict: Array name to array, as saved.
+    """
+    if needs_training(semantic_index, len(existing_data) + len(new_data), new_data):
+        return create_and_save_semantic_index(existing_data + new_data, output_file)
+
+    semantic_index = dict(semantic_index)
+    for search_option in SEARCH_OPTIONS:
+        vectors = embed_texts(build_corpus(new_data, search_option), semantic_index)
+        ivf_index = {name: semantic_index[f'{search_option}.{name}']
+                     for name in ('centroids', 'list_offsets', 'list_documents')}
+        for name, array in add_to_ivf_index(ivf_index, vectors, len(existing_data)).items():
+            semantic_index[f'{search_option}.{name}'] = array
+        semantic_index[f'{search_option}.vectors'] = np.concatenate((semantic_index[f'{search_option}.vectors'],
+                                                                     vectors))
+
+    numpy_write(semantic_index, output_file)
+    logging.info(f"Successfully added {len(new_data)} items to the semantic index "
+                 f"({len(existing_data) + len(new_data)} items).")
+    return semantic_index
+
+
+def rebuild_semantic_index():
+    """
+    Trains the embeddings and clusters the papers again on the whole corpus, and publishes them as a new
+    index version for the server to load. A crawl saving its papers meanwhile waits for it, and the other
+    way round (see index_lock).
+    """
+    with index_lock():
+        previous_manifest = json_read(Paths.MANIFEST_PATH.value)
+        if previous_manifest is None:
+            logging.warning("No index to rebuild the semantic index of.")
+            return
+        manifest = copy.deepcopy(previous_manifest)
+        manifest['version'] = previous_manifest.get('version', 0) + 1
+        manifest['files'] = {name: manifest_file(previous_manifest, name, path) for name, path in DATA_FILES.items()}
+        manifest['files']['semantic_index'] = versioned_path(Paths.SEMANTIC_INDEX_PATH.value, manifest['version'])
+        data = json_read(manifest['files']['papers_preprocessed']) or []
+        create_and_save_semantic_index(data, manifest['files']['semantic_index'])
+        publish_manifest(manifest, previous_manifest)
+
+
+if __name__ == '__main__':
+    rebuild_semantic_index()
@@ -0,0 +1,129 @@
+import logging
+import os
+from bisect import bisect_left
+
+import numpy as np
+
+from crawler.vector_index import SEARCH_OPTIONS
+from utils.binary_index import binary_write, segments_read
+from utils.enums import Paths, ShardConfig
+from utils.json_config import joblib_write, json_write, numpy_write
+
+
+def shard_ranges(doc_count, shard_count):
+    """
+    Splits the document IDs into contiguous ranges of nearly equal size.
+
+    Returns:
+    - list: (first document ID, end document ID) of every non-empty shard.
+    """
+    bounds = [doc_count * shard // shard_count for shard in range(shard_count + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def split_postings(entry, starts):
+    """
+    Splits sorted postings at the first document ID of every shard.
+
+    Returns:
+    - list: (shard, documents, frequencies) of the shards holding some of the documents.
+    """
+    documents = entry['documents']
+    parts = []
+    for shard, start in enumerate(starts):
+        low = bisect_left(documents, start)
+        high = bisect_left(documents, starts[shard + 1]) if shard + 1 < len(starts) else len(documents)
+        if high > low:
+            parts.append((shard, documents[low:high], entry['frequencies'][low:high]))
+    return parts
+
+
+def shard_inverted_indexes(manifest, ranges):
+    """
+    Splits the inverted index of every field by document shard, and adds an 'all_fields' index whose
+    frequencies are summed over the fields, like the postings BM25 scores.
+
+    Returns:
+    - list: Per shard, search option to its inverted index.
+    """
+    starts = [start for start, _ in ranges]
+    shard_indexes = [{search_option: {} for search_option in SEARCH_OPTIONS} for _ in ranges]
+    for field, segments in manifest['segments'].items():
+        index = segments_read(segments)
+        for term in index:
+            for shard, documents, frequencies in split_postings(index.get(term), starts):
+                shard_indexes[shard][field][term] = {'documents': documents, 'frequencies': frequencies}
+                merged = shard_indexes[shard]['all_fields'].setdefault(term, {})
+                for doc, frequency in zip(documents, frequencies):
+                    merged[doc] = merged.get(doc, 0) + frequency
+        index.close()
+    for indexes in shard_indexes:
+        for term, postings in indexes['all_fields'].items():
+            documents = sorted(postings)
+            indexes['all_fields'][term] = {'documents': documents, 'frequencies': [postings[doc] for doc in documents]}
+    return shard_indexes
+
+
+def shard_path(base_path, version, shard):
+    """
+    Returns the directory of a shard, e.g. data/shards/3/0 for the first shard of index version 3.
+    """
+    return os.path.join(base_path, str(version), str(shard))
+
+
+def create_and_save_shards(manifest, papers, bm25_index, vector_index, shard_count=ShardConfig.SHARDS.value,
+                           base_path=Paths.SHARDS_PATH.value):
+    """
+    Splits the corpus into document shards, each with the papers, inverted indexes, BM25 document lengths
+    and TF-IDF rows of its documents, for queries scored in parallel by one process per shard.
+
+    Collection statistics (document frequencies, average lengths, IDF) stay global: the searching
+    process computes them and sends them to the shards with the query. Document IDs are kept, so the
+    results of the shards merge without translation. The searching process only loads the TF-IDF
+    vectorizers and the BM25 averages, written next to the shards and listed in the manifest's
+    'coordinator_files'; the papers, TF-IDF rows and document lengths stay with the shards.
+
+    Parameters:
+    - manifest (dict): Index manifest with the 'version', 'doc_count' and 'segments' of the new index;
+      its 'shards' and 'coordinator_files' are updated in place, and removed if shard_count is 1.
+    - papers (list): Raw papers of the whole corpus.
+    - bm25_index (dict): BM25 statistics of every search option.
+    - vector_index (dict): TF-IDF models of every search option.
+    - shard_count (int): Number of shards.
+    - base_path (str): Directory holding the shards of every index version. The shards of the version
+      being served are deleted once the new manifest replaces it.
+    """
+    ranges = shard_ranges(manifest['doc_count'], shard_count)
+    if shard_count <= 1 or len(ranges) <= 1:
+        manifest.pop('shards', None)
+        manifest.pop('coordinator_files', None)
+        return
+
+    shards = []
+    for shard, ((start, end), indexes) in enumerate(zip(ranges, shard_inverted_indexes(manifest, ranges))):
+        path = shard_path(base_path, manifest['version'], shard)
+        os.makedirs(path, exist_ok=True)
+        json_write(papers[start:end], os.path.join(path, 'papers.json'))
+        for search_option, inverted_index in indexes.items():
+            binary_write(inverted_index, os.path.join(path, f"inverted_index_{search_option.lower()}.bin"))
+        numpy_write({search_option: np.asarray(stats['doc_lengths'][start:end], dtype=np.float64)
+                     for search_option, stats in bm25_index.items()}, os.path.join(path, 'doc_lengths.npz'))
+        joblib_write({search_option: model['tfidf_matrix'][start:end]
+                      for search_option, model in vector_index.items()}, os.path.join(path, 'tfidf.joblib'))
+        shards.append({'path': path, 'start': start, 'end': end})
+
+    # What the searching process needs of the vector and BM25 indexes, None for the data sets it leaves to the shards
+    path = os.path.join(base_path, str(manifest['version']))
+    coordinator_files = {
+        'vector_index': os.path.join(path, 'vectorizers.joblib'),
+        'bm25_index': os.path.join(path, 'bm25_stats.json'),
+        'paper_data': None,
+        'score_index': None,
+    }
+    joblib_write({search_option: {'vectorizer': model['vectorizer']} for search_option, model in vector_index.items()},
+                 coordinator_files['vector_index'])
+    json_write({search_option: {'doc_count': stats['doc_count'], 'avgdl': stats['avgdl']}
+                for search_option, stats in bm25_index.items()}, coordinator_files['bm25_index'])
+    manifest['shards'] = shards
+    manifest['coordinator_files'] = coordinator_files
+    logging.info(f"Corpus split into {len(shards)} shards.")
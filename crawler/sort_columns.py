@@ -0,0 +1,75 @@
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+from utils.json_config import numpy_write
+from utils.utils import parse_date
+
+
+def normalize_key(text):
+    """
+    Normalizes text for sorting: accents removed, case folded and whitespace collapsed.
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def first_author_key(authors_text):
+    """
+    Returns the normalized name of the first author from the raw authors text ('Authors:\\nMathilde Papillon, ...').
+    """
+    authors_text = re.sub(r'^\s*Authors:', '', authors_text, flags=re.IGNORECASE)
+    return normalize_key(authors_text.split(',')[0])
+
+
+def rank_keys(keys):
+    """
+    Replaces every key by its rank among all the keys, equal keys sharing a rank.
+
+    Returns:
+    - np.ndarray: The int32 ranks, indexed like the keys.
+    """
+    ranks = np.zeros(len(keys), dtype=np.int32)
+    rank = -1
+    previous = None
+    for position in sorted(range(len(keys)), key=keys.__getitem__):
+        if keys[position] != previous:
+            rank += 1
+            previous = keys[position]
+        ranks[position] = rank
+    return ranks
+
+
+def create_and_save_sort_columns(papers, output_file):
+    """
+    Creates and saves the sort columns of the corpus, one array entry per document ID.
+
+    - date: Proleptic Gregorian ordinal of the submission date, 0 if it cannot be parsed.
+    - author: Rank of the normalized first author name.
+    - title: Rank of the normalized title.
+    - date_order: Document IDs ordered by date, and sorted_dates their dates, so that the documents of
+      a date range are found by binary search.
+
+    Parameters:
+    - papers (list): The raw papers of the whole corpus, in document ID order.
+    - output_file (str): The file path to save the sort columns.
+
+    Returns:
+    - dict: Column name to its array.
+    """
+    dates = [parse_date(paper.get('Date', '')) for paper in papers]
+    date_column = np.array([date.toordinal() if date.year > 1 else 0 for date in dates], dtype=np.int32)
+    date_order = np.argsort(date_column, kind='stable').astype(np.int32)
+    sort_columns = {
+        'date': date_column,
+        'date_order': date_order,
+        'sorted_dates': date_column[date_order],
+        'author': rank_keys([first_author_key(paper.get('Authors', '')) for paper in papers]),
+        'title': rank_keys([normalize_key(paper.get('Title', '')) for paper in papers]),
+    }
+    numpy_write(sort_columns, output_file)
+    logging.info(f"Successfully created and saved sort columns ({len(papers)} items).")
+    return sort_columns
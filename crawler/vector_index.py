@@ -0,0 +1,50 @@
+import logging
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from utils.json_config import joblib_write
+
+SEARCH_OPTIONS = ['Title', 'Authors', 'Abstract', 'Date', 'all_fields']
+
+
+def build_corpus(data, search_option):
+    """
+    Builds the text corpus of a search option from the preprocessed papers.
+
+    Parameters:
+    - data (list): List of preprocessed papers.
+    - search_option (str): 'all_fields' or a specific field like 'Authors', 'Date', 'Abstract', 'Title'.
+
+    Returns:
+    - list: One document string per paper, in paper order.
+    """
+    if search_option == 'all_fields':
+        return [' '.join([paper['Title_processed'] or '', paper['Authors_processed'] or '',
+                          paper['Abstract_processed'] or '', paper['Date_processed'] or '']) for paper in data]
+    return [paper[f'{search_option}_processed'] or '' for paper in data]
+
+
+def create_and_save_vector_index(data, output_file):
+    """
+    Fits one TF-IDF model per search option and saves the fitted vectorizers with their document matrices.
+
+    Parameters:
+    - data (list): List of preprocessed papers.
+    - output_file (str): The file path to save the vector index.
+
+    Returns:
+    - dict: Search option to its fitted vectorizer and document matrix.
+    """
+    vector_index = {}
+    for search_option in SEARCH_OPTIONS:
+        vectorizer = TfidfVectorizer()
+        try:
+            tfidf_matrix = vectorizer.fit_transform(build_corpus(data, search_option))
+        except ValueError as e:  # Empty vocabulary, nothing to index for this option
+            logging.warning(f"Skipping vector index for {search_option}: {e}")
+            continue
+        vector_index[search_option] = {'vectorizer': vectorizer, 'tfidf_matrix': tfidf_matrix}
+
+    joblib_write(vector_index, output_file)
+    logging.info(f"Successfully created and saved vector index for {list(vector_index)} ({len(data)} items).")
+    return vector_index
@@ -0,0 +1,133 @@
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from utils.enums import Paths
+from utils.json_config import json_read, json_write, manifest_file
+
+# Every index version writes its data files under new paths, so that the files of the version being
+# served are never modified; the manifest lists them, the defaults being those of unversioned manifests.
+DATA_FILES = {
+    'paper_data': Paths.PAPERS_PATH.value,
+    'papers_preprocessed': Paths.PAPERS_PREPROCESSED_PATH.value,
+    'bm25_index': Paths.BM25_INDEX_PATH.value,
+    'vector_index': Paths.VECTOR_INDEX_PATH.value,
+    'score_index': Paths.SCORE_INDEX_PATH.value,
+    'semantic_index': Paths.SEMANTIC_INDEX_PATH.value,
+    'sort_columns': Paths.SORT_COLUMNS_PATH.value,
+}
+
+
+@contextmanager
+def index_lock(lock_path=Paths.INDEX_LOCK_PATH.value):
+    """
+    Holds the lock of the index files while a new index version is written, waiting for it if another
+    process writes one: a crawl and a rebuild of the semantic index would otherwise both publish the
+    version after the same manifest, and each delete files the other one uses.
+
+    The lock is held on an open file, so the system releases it if the process dies.
+    """
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)  # Retries for 10 seconds, then raises
+                    break
+                except OSError:
+                    logging.info("Waiting for another process to publish its index version.")
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def versioned_path(path, version):
+    """
+    Returns the path of a data file in one index version, e.g. data/bm25_index.v3.json.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.v{version}{extension}"
+
+
+def manifest_paths(manifest):
+    """
+    Returns the paths of the files and shard directories an index version uses.
+    """
+    paths = {manifest_file(manifest, name, path) for name, path in DATA_FILES.items()}
+    paths |= {path for segments in manifest.get('segments', {}).values() for path in segments}
+    paths |= set(manifest.get('kgram_indexes', {}).values()) | set(manifest.get('fuzzy_indexes', {}).values())
+    # The shards of a version are the directories of data/shards/<version>
+    paths |= {os.path.dirname(shard['path']) for shard in manifest.get('shards', [])}
+    return paths
+
+
+def publish_manifest(manifest, previous_manifest, manifest_path=Paths.MANIFEST_PATH.value):
+    """
+    Publishes a new index version by replacing the manifest, then deletes the files of the previous
+    version that the new one does not use.
+
+    The manifest is renamed into place, so a reader sees either version as a whole; a reader still
+    loading the files of the previous one finds the manifest changed and loads again. If the manifest
+    cannot be written, the files of the new version are deleted and the error is raised.
+
+    Parameters:
+    - manifest (dict): Manifest of the new version, listing every file it uses.
+    - previous_manifest (dict): Manifest of the version being replaced, or None.
+    - manifest_path (str): The file path of the manifest.
+    """
+    try:
+        json_write(manifest, manifest_path)
+    except Exception:
+        discard_version(manifest, previous_manifest)
+        raise
+    if (json_read(manifest_path) or {}).get('version') != manifest['version']:
+        logging.error(f"Index version {manifest['version']} was not published, its files are kept.")
+        return
+    logging.info(f"Published index version {manifest['version']}.")
+    if previous_manifest is None:
+        return
+    delete_paths(manifest_paths(previous_manifest) - manifest_paths(manifest), previous_manifest.get('version'))
+
+
+def discard_version(manifest, previous_manifest, shards_path=Paths.SHARDS_PATH.value):
+    """
+    Deletes the files a new index version wrote before it failed, keeping those of the published version.
+
+    Parameters:
+    - manifest (dict): Manifest of the failed version, listing the files it wrote so far.
+    - previous_manifest (dict): Manifest of the version being served, or None.
+    - shards_path (str): Directory holding the shards of every index version.
+    """
+    paths = manifest_paths(manifest) | {os.path.join(shards_path, str(manifest['version']))}
+    delete_paths(paths - manifest_paths(previous_manifest or {}), manifest['version'])
+    logging.info(f"Discarded the files of index version {manifest['version']}.")
+
+
+def delete_paths(paths, version):
+    """
+    Deletes the files and shard directories of an index version that no published version uses.
+    """
+    for path in sorted(paths):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:  # e.g. still mapped by a server on Windows
+            logging.warning(f"Could not delete {path} of index version {version}: {e}")
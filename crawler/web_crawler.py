@@ -1,90 +1,301 @@
-import requests
+import copy
 import logging
-from bs4 import BeautifulSoup
+
+from lxml import etree
 
 from exceptions.no_paper_exception import NoPapersFoundException
-from utils.enums import Paths, ArxivConfig
-from utils.json_config import json_write, json_read
-from crawler.preprocess import preprocess_abstract, preprocess_authors, preprocess_date, preprocess_title
-from crawler.inverted_index import create_and_save_inverted_index
+from utils.enums import Paths, CrawlerConfig
+from utils.json_config import json_write, json_read, manifest_file, numpy_read
+from crawler.fetcher import ArxivFetcher
+from crawler.pipeline import IndexingPipeline, run_pipeline
+from crawler.inverted_index import add_inverted_index_segments, create_and_save_term_indexes
+from crawler.vector_index import create_and_save_vector_index
+from crawler.semantic_index import update_and_save_semantic_index
+from crawler.bm25_index import create_and_save_bm25_index
+from crawler.sort_columns import create_and_save_sort_columns
+from crawler.score_index import create_and_save_score_index
+from crawler.shards import create_and_save_shards
+from crawler.versions import DATA_FILES, discard_version, index_lock, publish_manifest, versioned_path
+
+# Items of a result page, matched on one of their classes like BeautifulSoup's class_ does
+RESULT_ITEMS = etree.XPath('//li[contains(concat(" ", normalize-space(@class), " "), " arxiv-result ")]')
+# Classes of the paragraph holding every field of a result item, matched like BeautifulSoup's class_ does
+FIELD_CLASSES = {
+    'ArxivID': lambda classes: 'list-title' in classes,
+    'Title': lambda classes: classes == ['title', 'is-5', 'mathjax'],
+    'Authors': lambda classes: 'authors' in classes,
+    'Abstract': lambda classes: 'abstract' in classes,
+    'Date': lambda classes: 'is-size-7' in classes,
+}
+# Elements whose text BeautifulSoup's .text leaves out
+HIDDEN_TEXT_TAGS = {'script', 'style', 'template'}
+ASCII_SPACES = ' \t\n\r\x0c'
+
+
+def title_key(paper):
+    return ' '.join(paper['Title'].lower().split())
+
+
+def known_papers_keys(papers):
+    """
+    Returns the keys identifying the papers of the corpus across crawls: the arXiv identifiers, and the
+    normalized titles of the papers crawled before identifiers were stored, which are only known by title.
+    """
+    known_ids = {paper['ArxivID'] for paper in papers if paper.get('ArxivID')}
+    id_less_titles = {title_key(paper) for paper in papers if not paper.get('ArxivID')}
+    return known_ids, id_less_titles
+
+
+def is_new_paper(paper, known_ids, id_less_titles):
+    """
+    Tells whether a crawled paper is missing from the corpus, and records it as known.
+
+    A paper with an arXiv identifier is known by it; distinct papers may share a title, so its title only
+    matches a paper crawled without identifier, which is then accounted for.
+
+    Parameters:
+    - paper (dict): The crawled paper.
+    - known_ids (set): arXiv identifiers of the corpus, updated with the new paper's.
+    - id_less_titles (set): Normalized titles of the papers without identifier not matched yet, updated too.
+
+    Returns:
+    - bool: Whether the paper is new.
+    """
+    title = title_key(paper)
+    if paper.get('ArxivID'):
+        if paper['ArxivID'] in known_ids:
+            return False
+        known_ids.add(paper['ArxivID'])
+        if title in id_less_titles:  # The same paper, crawled before identifiers were stored
+            id_less_titles.remove(title)
+            return False
+        return True
+    if title in id_less_titles:
+        return False
+    id_less_titles.add(title)
+    return True
+
+
+def element_text(element):
+    """
+    Returns the text of an element the way BeautifulSoup's .text reads it from html.parser: script and
+    style contents and comments are left out, and a string of whitespace only counts as a single newline
+    (or a space, if it holds no newline).
+    """
+    parts = []
+
+    def collect(node):
+        if isinstance(node.tag, str) and node.tag not in HIDDEN_TEXT_TAGS and node.text:
+            parts.append(node.text)
+        for child in node:
+            collect(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    collect(element)
+    return ''.join(part if part.strip(ASCII_SPACES) else '\n' if '\n' in part else ' ' for part in parts)
+
+
+def field_paragraphs(item):
+    """
+    Finds the paragraph of every field in a result item: the first <p> holding the class of the field.
+
+    Returns:
+    - dict: Field name to its <p> element, for the fields found.
+    """
+    paragraphs = {}
+    for paragraph in item.iter('p'):
+        classes = paragraph.get('class', '').split()
+        for field, matches in FIELD_CLASSES.items():
+            if field not in paragraphs and matches(classes):
+                paragraphs[field] = paragraph
+    return paragraphs
+
+
+def extract_papers(html):
+    """
+    Extracts the raw data of the papers listed in an arXiv result page.
+
+    The page is parsed by lxml and only the result items are read, without building a BeautifulSoup tree
+    of the whole page. The text of every field is the one BeautifulSoup(html, "html.parser") gives, except
+    that carriage returns are read as newlines like browsers do.
+
+    Parameters:
+    - html (str): The HTML of the result page.
 
+    Items missing a field are skipped. An item without the identifier link is kept with an empty 'ArxivID',
+    so that it is deduplicated by title.
 
-def arxiv_crawler(query, max_results):
+    Returns:
+    - list: Raw papers with 'ArxivID', 'Title', 'Authors', 'Abstract' and 'Date', in page order.
+    """
+    root = etree.HTML(html)
+    if root is None:  # Empty page
+        return []
+    papers = []
+    for paper in RESULT_ITEMS(root):
+        paragraphs = field_paragraphs(paper)
+        missing = [field for field in FIELD_CLASSES if field != 'ArxivID' and field not in paragraphs]
+        if missing:
+            logging.warning(f"Skipped a result item without {', '.join(missing)}.")
+            continue
+        id_link = paragraphs['ArxivID'].find('.//a') if 'ArxivID' in paragraphs else None
+        if id_link is None:
+            logging.warning(f"No arXiv identifier for '{element_text(paragraphs['Title']).strip()}'.")
+        papers.append({
+            "ArxivID": element_text(id_link).strip().removeprefix("arXiv:") if id_link is not None else '',
+            "Title": element_text(paragraphs['Title']).strip(),
+            "Authors": element_text(paragraphs['Authors']).strip(),
+            "Abstract": element_text(paragraphs['Abstract']).strip(),
+            "Date": element_text(paragraphs['Date']).strip(),
+        })
+    return papers
+
+
+def arxiv_crawler(query, max_results, merge=True, workers=None, fetcher=None, progress=None):
     """
     Perform crawling of arXiv papers based on the given query.
 
+    Result pages are fetched concurrently and each page is handed to preprocessing as soon as it arrives.
+
     Parameters:
     - query (str): The search query for arXiv papers.
     - max_results (int): The maximum number of results to fetch.
+    - merge (bool): Add the new papers to the existing corpus instead of replacing it.
+    - workers (int): Processes used to preprocess and index the papers; defaults to CrawlerConfig.WORKERS.
+    - fetcher (ArxivFetcher): Fetcher of the result pages; defaults to one for arXiv with the ArxivConfig settings.
+    - progress (callable): Called with the current stage ('fetching', 'indexing' or 'saving'), the papers
+      found and the new papers so far, e.g. to report the progress of a background crawl.
     """
     logging.info("Starting arXiv crawler...")
-    base_url = ArxivConfig.BASE_URL.value
-
-    params = {  # Parameters for the API request
-        "query": query,
-        "searchtype": "all",
-        "abstracts": "show",
-        "size": max_results,
-        "order": "-submitted_date"
-    }
-    # Make the API request and parse the response with BeautifulSoup
-    response = requests.get(base_url, params=params)
-    soup = BeautifulSoup(response.text, "html.parser")
-    # Extract relevant information from each paper
-    papers = soup.find_all("li", class_="arxiv-result")
-
-    if not papers:
+    progress = progress or (lambda stage, papers_found, new_papers: None)
+    # Existing raw and preprocessed data of the index version being served, extended by this crawl
+    existing_data = []
+    existing_preprocessed = []
+    if merge:
+        manifest = json_read(Paths.MANIFEST_PATH.value)
+        existing_data = json_read(manifest_file(manifest, 'paper_data', Paths.PAPERS_PATH.value)) or []
+        existing_preprocessed = json_read(manifest_file(manifest, 'papers_preprocessed',
+                                                        Paths.PAPERS_PREPROCESSED_PATH.value)) or []
+    known_ids, id_less_titles = known_papers_keys(existing_data)
+    ID = len(existing_data)
+    # A crawl that fits in one chunk is not worth starting worker processes
+    if max_results <= CrawlerConfig.CHUNK_SIZE.value:
+        workers = 1
+    pipeline = IndexingPipeline(ID, workers)
+    page_fetcher = fetcher or ArxivFetcher()
+    found = 0
+    # List to store raw data
+    data_to_save = []
+
+    try:
+        progress('fetching', 0, 0)
+        for page in page_fetcher.iter_pages(query, max_results):
+            papers = extract_papers(page)[:max_results - found]
+            found += len(papers)
+            new_papers = []
+            for paper_data in papers:
+                if not is_new_paper(paper_data, known_ids, id_less_titles):  # Already in the corpus
+                    continue
+                ID += 1  # Increment ID for each paper
+                new_papers.append({"ID": ID, **paper_data})
+            pipeline.submit(new_papers)
+            data_to_save += new_papers
+            progress('fetching', found, len(data_to_save))
+            if not papers or found >= max_results:
+                break
+    except Exception:
+        pipeline.close()
+        raise
+    finally:
+        if fetcher is None:
+            page_fetcher.close()
+
+    if not found:
+        pipeline.close()
         raise NoPapersFoundException("No papers found for the given query.")
 
-    logging.info(f"Found {len(papers)} papers about {query}.")
-    ID = 0
-    # Lists to store raw and preprocessed data
-    data_to_save = []
-    data_preprocessed = []
-
-    for paper in papers:
-        title = paper.find("p", class_="title is-5 mathjax").text.strip()
-        authors = paper.find("p", class_="authors").text.strip()
-        abstract = paper.find("p", class_="abstract").text.strip()
-        date = paper.find("p", class_="is-size-7").text.strip()
-        # Preprocess the data
-        preprocessed_abstract = preprocess_abstract(abstract)
-        authors_processed = preprocess_authors(authors)
-        date_processed = preprocess_date(date)
-        title_processed = preprocess_title(title)
-        ID += 1  # Increment ID for each paper
-        paper_data = {  # Raw paper data
-            "ID": ID,
-            "Title": title,
-            "Authors": authors,
-            "Abstract": abstract,
-            "Date": date,
-        }
-        data_to_save.append(paper_data)
-
-        paper_data_processed = {  # Preprocessed paper data
-            "ID": ID,
-            "Title_processed": title_processed,
-            "Authors_processed": authors_processed,
-            "Abstract_processed": preprocessed_abstract,
-            "Date_processed": date_processed,
-        }
-        data_preprocessed.append(paper_data_processed)
-    # Save raw paper data to a JSON file
-    json_write(data_to_save, Paths.PAPERS_PATH.value)
-    logging.info(f"Processed those {len(data_to_save)} papers.")
-    # Save preprocessed paper data to a JSON file
-    json_write(data_preprocessed, Paths.PAPERS_PREPROCESSED_PATH.value)
-    logging.info(f"Successfully saved all {len(data_preprocessed)} preprocessed papers to papers_preprocessed.json.")
-    # Create and save inverted indices for preprocessed data
-    data_preprocessed = json_read(Paths.PAPERS_PREPROCESSED_PATH.value)
-
-    if data_preprocessed is not None:
-        create_and_save_inverted_index(data_preprocessed, 'Authors_processed', Paths.INVERTED_INDEX_AUTHORS_PATH.value)
-        create_and_save_inverted_index(data_preprocessed, 'Abstract_processed', Paths.INVERTED_INDEX_ABSTRACT_PATH.value)
-        create_and_save_inverted_index(data_preprocessed, 'Date_processed', Paths.INVERTED_INDEX_DATE_PATH.value)
-        create_and_save_inverted_index(data_preprocessed, 'Title_processed', Paths.INVERTED_INDEX_TITLE_PATH.value)
-
-        logging.info("All Inverted indices created and saved.")
-    else:
-        logging.error("Failed to load preprocessed data. Inverted indices not created.")
+    logging.info(f"Found {found} papers about {query}, {len(data_to_save)} of them are new.")
+    # Wait for the preprocessing and indexing of the new papers
+    progress('indexing', found, len(data_to_save))
+    data_preprocessed, inverted_indexes = pipeline.finish()
+    if not data_to_save:
+        return
+    progress('saving', found, len(data_to_save))
+    save_indexes(existing_data + data_to_save, existing_preprocessed, data_preprocessed, inverted_indexes, merge,
+                 workers)
+
+
+def save_indexes(papers, existing_preprocessed, data_preprocessed, inverted_indexes, merge=True, workers=None):
+    """
+    Saves the papers and the indexes of the new preprocessed papers as a new index version, updating the
+    corpus wide indexes.
+
+    The inverted indexes only receive a new segment holding the new papers. The BM25 statistics are
+    extended with the new document lengths, and the TF-IDF models are refitted on the already preprocessed
+    text of the whole corpus. The new papers are embedded with the existing word embeddings and added to
+    the nearest inverted lists of the semantic index, which is only trained again when the corpus drifted
+    too far from it. The precomputed BM25 and TF-IDF postings scores depend on the whole corpus too and
+    are computed again. The sort columns are rebuilt from the raw papers, and the corpus is split again
+    into document shards if it is sharded.
+
+    Every file is written under a new path, the version's own, so the version being served is left
+    untouched until the manifest of the new one replaces its manifest (see publish_manifest). If a file
+    cannot be written, the files of the new version are deleted and the error is raised, unpublished.
+
+    Parameters:
+    - papers (list): Raw papers of the whole corpus, new ones included.
+    - existing_preprocessed (list): Preprocessed papers already indexed.
+    - data_preprocessed (list): Preprocessed papers to add to the indexes.
+    - inverted_indexes (dict): Field name to the inverted index of data_preprocessed.
+    - merge (bool): Extend the existing indexes instead of starting new ones.
+    - workers (int): Processes used if the existing papers have to be indexed again.
+    """
+    # Another process publishing a version meanwhile would publish the same version number
+    with index_lock():
+        previous_manifest = json_read(Paths.MANIFEST_PATH.value)
+        version = (previous_manifest or {}).get('version', 0) + 1
+        if merge and previous_manifest is not None:
+            manifest = copy.deepcopy(previous_manifest)
+            bm25_index = json_read(manifest_file(previous_manifest, 'bm25_index', Paths.BM25_INDEX_PATH.value))
+            semantic_index = numpy_read(manifest_file(previous_manifest, 'semantic_index',
+                                                      Paths.SEMANTIC_INDEX_PATH.value))
+        else:
+            # The segments of the replaced corpus are deleted once the new version is published
+            manifest = {'doc_count': 0, 'next_segment': (previous_manifest or {}).get('next_segment', 0),
+                        'segments': {}}
+            bm25_index = None
+            semantic_index = None
+            if existing_preprocessed:
+                # Without a manifest the existing papers have no segments yet, so they are indexed again
+                data_preprocessed, inverted_indexes = run_pipeline(existing_preprocessed + data_preprocessed, 0,
+                                                                   workers, preprocess=False)
+                existing_preprocessed = []
+        manifest['version'] = version
+        files = {name: versioned_path(path, version) for name, path in DATA_FILES.items()}
+        manifest['files'] = files
+
+        try:
+            json_write(papers, files['paper_data'])
+            json_write(existing_preprocessed + data_preprocessed, files['papers_preprocessed'])
+            logging.info(f"Successfully saved all {len(papers)} papers and their preprocessed text.")
+
+            add_inverted_index_segments(inverted_indexes, len(existing_preprocessed) + len(data_preprocessed), manifest)
+            create_and_save_term_indexes(manifest)
+            logging.info("All Inverted indices created and saved.")
+
+            bm25_index = create_and_save_bm25_index(inverted_indexes, manifest['doc_count'], files['bm25_index'],
+                                                    bm25_index)
+            vector_index = create_and_save_vector_index(existing_preprocessed + data_preprocessed,
+                                                        files['vector_index'])
+            create_and_save_score_index(manifest, bm25_index, vector_index, files['score_index'])
+            update_and_save_semantic_index(existing_preprocessed, data_preprocessed, files['semantic_index'],
+                                           semantic_index)
+            create_and_save_sort_columns(papers, files['sort_columns'])
+            create_and_save_shards(manifest, papers, bm25_index, vector_index)
+        except Exception:
+            # A version missing some of its files is never published, the served one is left as it was
+            discard_version(manifest, previous_manifest)
+            raise
+        # The manifest is written last: a new version tells the server that every other file is ready
+        publish_manifest(manifest, previous_manifest)
@@ -0,0 +1,4 @@
+class CrawlQueueFullException(Exception):
+    def __init__(self, message="Too many crawls are waiting, please try again later."):
+        self.message = message
+        super().__init__(self.message)
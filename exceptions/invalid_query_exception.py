@@ -0,0 +1,4 @@
+class InvalidQueryException(Exception):
+    def __init__(self, message="The query could not be parsed."):
+        self.message = message
+        super().__init__(self.message)
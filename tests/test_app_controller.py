@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from controllers.app_controller import app
+
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('query_string', [
+    'search_option=Title&algorithm=probabilistic',
+    'query=%20&search_option=Title&algorithm=vector_space',
+    'query=graph&search_option=Bogus&algorithm=probabilistic',
+])
+def test_api_search_rejects_searches_without_query_or_known_search_option(client, query_string):
+    response = client.get(f'/api/search?{query_string}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_api_batch_reports_invalid_queries_in_place(client):
+    response = client.post('/api/search/batch', json={'algorithm': 'probabilistic', 'search_option': 'Title',
+                                                      'queries': ['graph', {'search_option': 'Bogus'}, {}]})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['index'] for line in lines] == [0, 1, 2]
+    assert 'results' in lines[0]
+    assert 'error' in lines[1] and 'error' in lines[2]
+
+
+@pytest.mark.parametrize('query_string, message', [
+    ('search_option=Title&algorithm=probabilistic', b'Expected a search'),
+    ('query=graph&search_option=Bogus&algorithm=vector_space', b'Unknown search option Bogus.'),
+])
+def test_search_page_shows_why_a_search_is_invalid(client, query_string, message):
+    response = client.get(f'/search?{query_string}')
+    assert response.status_code == 200
+    assert message in response.data
@@ -0,0 +1,177 @@
+import random
+
+import pytest
+
+from crawler.inverted_index import build_inverted_index
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.binary_index import binary_write, segments_read
+from utils.boolean_query import BooleanParser, evaluate, positional_documents, proximity_spans
+from utils.postings import difference, gallop, intersect, union
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+DOC_COUNT = 60
+
+
+def parse(query):
+    return BooleanParser(query, analyzer=str.split).parse()
+
+
+def term(word):
+    return ('TERM', word, word, (word,))
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = random.Random(0)
+    documents = [set(rng.sample(WORDS, rng.randint(0, len(WORDS)))) for _ in range(DOC_COUNT)]
+    inverted_index = {}
+    for doc, words in enumerate(documents):
+        for word in sorted(words):
+            entry = inverted_index.setdefault(word, {'documents': [], 'frequencies': []})
+            entry['documents'].append(doc)
+            entry['frequencies'].append(1)
+    return documents, inverted_index
+
+
+def random_query(rng, depth=0):
+    """
+    Returns a random Boolean query and the same expression in Python, whose 'not', 'and' and 'or' have
+    the precedence the parser gives to NOT, AND and OR.
+    """
+    query, expression = [], []
+    for position in range(rng.randint(1, 4)):
+        if position:
+            operator = rng.choice(['AND', 'OR', 'NOT'])
+            query.append(operator)
+            expression.append({'AND': 'and', 'OR': 'or', 'NOT': 'and not'}[operator])
+        for _ in range(rng.choice([0, 0, 0, 1, 2])):
+            query.append('NOT')
+            expression.append('not')
+        if depth < 2 and rng.random() < 0.3:
+            sub_query, sub_expression = random_query(rng, depth + 1)
+            query.append(f"( {sub_query} )")
+            expression.append(f"({sub_expression})")
+        else:
+            word = rng.choice(WORDS)
+            query.append(word)
+            expression.append(f"'{word}' in words")
+    return ' '.join(query), ' '.join(expression)
+
+
+def test_operator_precedence():
+    alpha, beta, gamma = term('alpha'), term('beta'), term('gamma')
+    assert parse('alpha OR beta AND gamma') == ('OR', [alpha, ('AND', [beta, gamma])])
+    assert parse('alpha AND beta OR gamma') == ('OR', [('AND', [alpha, beta]), gamma])
+    assert parse('NOT alpha AND beta') == ('AND', [('NOT', alpha), beta])
+    assert parse('alpha NOT beta OR gamma') == ('OR', [('AND', [alpha, ('NOT', beta)]), gamma])
+    assert parse('alpha AND (beta OR gamma)') == ('AND', [alpha, ('OR', [beta, gamma])])
+    assert parse('NOT alpha NEAR/2 beta') == ('NOT', ('NEAR', 2, ('PHRASE', ('alpha',)), ('PHRASE', ('beta',))))
+
+
+@pytest.mark.parametrize('query', ['', 'alpha AND', 'alpha beta )', '( alpha OR beta', 'OR alpha',
+                                   'alpha NEAR/0 beta', '"alpha beta'])
+def test_malformed_queries_are_rejected(query):
+    with pytest.raises(InvalidQueryException):
+        parse(query)
+
+
+def test_evaluation_matches_brute_force(corpus):
+    documents, inverted_index = corpus
+    rng = random.Random(1)
+    for _ in range(300):
+        query, expression = random_query(rng)
+        expected = [doc for doc, words in enumerate(documents) if eval(expression, {}, {'words': words})]
+        assert evaluate(parse(query), [inverted_index], DOC_COUNT) == expected, query
+
+
+def sorted_sample(rng, size, universe=1000):
+    return sorted(rng.sample(range(universe), size))
+
+
+def test_gallop_finds_the_first_position_at_or_after_target():
+    rng = random.Random(2)
+    for _ in range(200):
+        postings = sorted_sample(rng, rng.randint(0, 50), 100)
+        low = rng.randint(0, len(postings))
+        target = rng.randint(-1, 101)
+        expected = next((position for position in range(low, len(postings)) if postings[position] >= target),
+                        len(postings))
+        assert gallop(postings, target, low) == expected
+
+
+def test_postings_operations_match_set_operations():
+    rng = random.Random(3)
+    # Equal sizes and very skewed ones, where galloping skips most of the longer list
+    for left_size, right_size in [(0, 10), (10, 0), (1, 500), (500, 1), (30, 30), (5, 900), (300, 700)]:
+        for _ in range(20):
+            left, right = sorted_sample(rng, left_size), sorted_sample(rng, right_size)
+            assert intersect(left, right) == sorted(set(left) & set(right))
+            assert difference(left, right) == sorted(set(left) - set(right))
+            assert union(left, right) == sorted(set(left) | set(right))
+
+
+@pytest.fixture(scope='module', params=[1, 2], ids=['one segment', 'two segments'])
+def positional_corpus(request, tmp_path_factory):
+    rng = random.Random(4)
+    texts = [[rng.choice(WORDS[:4]) for _ in range(rng.randint(0, 25))] for _ in range(DOC_COUNT)]
+    directory = tmp_path_factory.mktemp('positional')
+    paths = []
+    size = -(-DOC_COUNT // request.param)
+    for first_doc in range(0, DOC_COUNT, size):
+        data = [{'Text': ' '.join(words)} for words in texts[first_doc:first_doc + size]]
+        paths.append(str(directory / f"segment.{first_doc}.bin"))
+        binary_write(build_inverted_index(data, 'Text', first_doc, positions=True), paths[-1])
+    inverted_index = segments_read(paths)
+    yield texts, inverted_index
+    inverted_index.close()
+
+
+def brute_force_spans(node, words):
+    """
+    Returns the (first, last) positions of every occurrence of a phrase or NEAR expression in a text,
+    comparing every pair of occurrences of the NEAR operands.
+    """
+    if node[0] == 'PHRASE':
+        length = len(node[1])
+        return {(start, start + length - 1) for start in range(len(words) - length + 1)
+                if tuple(words[start:start + length]) == node[1]}
+    _, distance, left, right = node
+    return {(min(start, other_start), max(end, other_end))
+            for start, end in brute_force_spans(left, words)
+            for other_start, other_end in brute_force_spans(right, words)
+            if 1 <= max(other_start - end, start - other_end) <= distance}
+
+
+def random_proximity_node(rng, depth=0):
+    if depth < 2 and rng.random() < 0.5:
+        left, right = random_proximity_node(rng, depth + 1), random_proximity_node(rng, depth + 1)
+        return ('NEAR', rng.randint(1, 6), left, right)
+    return ('PHRASE', tuple(rng.choice(WORDS[:4]) for _ in range(rng.randint(1, 3))))
+
+
+def test_phrase_and_near_spans_match_brute_force(positional_corpus):
+    texts, inverted_index = positional_corpus
+    assert inverted_index.has_positions
+    rng = random.Random(5)
+    for _ in range(200):
+        node = random_proximity_node(rng)
+        expected = {doc: sorted(brute_force_spans(node, words)) for doc, words in enumerate(texts)}
+        expected = {doc: spans for doc, spans in expected.items() if spans}
+        assert proximity_spans(node, inverted_index) == expected, node
+        assert positional_documents(node, inverted_index) == sorted(expected)
+
+
+def test_near_queries_match_in_either_order(positional_corpus):
+    texts, inverted_index = positional_corpus
+    node = parse('"alpha beta" NEAR/3 gamma')
+    assert node == ('NEAR', 3, ('PHRASE', ('alpha', 'beta')), ('PHRASE', ('gamma',)))
+    expected = [doc for doc, words in enumerate(texts) if brute_force_spans(node, words)]
+    assert evaluate(node, [inverted_index], DOC_COUNT) == expected
+    swapped = parse('gamma NEAR/3 "alpha beta"')
+    assert evaluate(swapped, [inverted_index], DOC_COUNT) == expected
+
+
+def test_unknown_phrase_words_match_nothing(positional_corpus):
+    _, inverted_index = positional_corpus
+    assert proximity_spans(('PHRASE', ('alpha', 'omega')), inverted_index) == {}
+    assert proximity_spans(('NEAR', 2, ('PHRASE', ('omega',)), ('PHRASE', ('alpha',))), inverted_index) == {}
@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+
+import pytest
+
+from exceptions.crawl_queue_full_exception import CrawlQueueFullException
+from exceptions.no_paper_exception import NoPapersFoundException
+from utils.crawl_jobs import CrawlJobManager, crawl_key
+
+TIMEOUT = 10
+
+
+class BlockedCrawls:
+    """
+    A run_crawl that holds every crawl until it is released, recording the crawls it ran.
+    """
+
+    def __init__(self, error=None):
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.error = error
+        self.crawls = []
+
+    def __call__(self, query, max_results, merge, progress):
+        self.crawls.append((query, max_results, merge))
+        progress('fetching', papers_found=3)
+        self.started.set()
+        assert self.released.wait(TIMEOUT)
+        if self.error is not None:
+            raise self.error
+        progress('saving', new_papers=2)
+
+
+@pytest.fixture
+def crawls():
+    crawls = BlockedCrawls()
+    yield crawls
+    crawls.released.set()
+
+
+def start(crawls, max_queued=2, max_finished=100):
+    """
+    Returns a manager with one worker, busy running a first crawl.
+    """
+    manager = CrawlJobManager(crawls, workers=1, max_queued=max_queued, max_finished=max_finished)
+    running, _ = manager.submit('running crawl', 10)
+    assert crawls.started.wait(TIMEOUT)
+    return manager, running
+
+
+def finish(manager, crawls):
+    """
+    Releases the crawls and waits until no job is queued or running.
+    """
+    crawls.released.set()
+    deadline = time.time() + TIMEOUT
+    while manager.active:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_identical_crawls_join_the_queued_or_running_job(crawls):
+    manager, running = start(crawls)
+    assert running.status == 'running' and running.stage == 'fetching' and running.papers_found == 3
+    assert manager.submit('  Running   CRAWL ', 10) == (running, False)
+    queued, created = manager.submit('graph neural networks', 10)
+    assert created and queued.status == 'queued'
+    assert manager.submit('Graph Neural Networks', 10) == (queued, False)
+    # The same query with other results or without merging fetches other papers
+    assert manager.submit('graph neural networks', 20)[1]
+    with pytest.raises(CrawlQueueFullException):
+        manager.submit('graph neural networks', 10, merge=False)
+
+    finish(manager, crawls)
+    assert crawls.crawls == [('running crawl', 10, True), ('graph neural networks', 10, True),
+                             ('graph neural networks', 20, True)]
+    assert running.status == 'succeeded' and running.new_papers == 2
+    # Once finished, the same crawl runs again
+    job, created = manager.submit('running crawl', 10)
+    assert created and job is not running
+    finish(manager, crawls)
+
+
+def test_submissions_match_a_model_of_the_queue(crawls):
+    manager, running = start(crawls, max_queued=4)
+    rng = random.Random(0)
+    jobs = {running.key(): running}
+    for _ in range(200):
+        query = rng.choice(['running crawl', 'a', 'b', 'c', 'd', 'e', 'f'])
+        if rng.random() < 0.5:
+            query = query.upper()
+        max_results, merge = rng.choice([10, 20]), rng.random() < 0.5
+        key = crawl_key(query, max_results, merge)
+        queued = sum(job.status == 'queued' for job in jobs.values())
+        if key in jobs:
+            assert manager.submit(query, max_results, merge) == (jobs[key], False)
+        elif queued >= 4:
+            with pytest.raises(CrawlQueueFullException):
+                manager.submit(query, max_results, merge)
+        else:
+            job, created = manager.submit(query, max_results, merge)
+            assert created and job.status == 'queued' and manager.get(job.id) is job
+            jobs[key] = job
+    assert manager.counts() == {'queued': 4, 'running': 1, 'succeeded': 0, 'failed': 0}
+
+    finish(manager, crawls)
+    assert manager.counts() == {'queued': 0, 'running': 0, 'succeeded': 5, 'failed': 0}
+
+
+def test_finished_jobs_past_max_finished_are_dropped(crawls):
+    manager, running = start(crawls, max_queued=5, max_finished=2)
+    jobs = [manager.submit(query, 10)[0] for query in 'abcde']
+    finish(manager, crawls)
+    assert [manager.get(job.id) for job in [running] + jobs] == [None] * 4 + jobs[-2:]
+
+
+@pytest.mark.parametrize('error, message', [
+    (NoPapersFoundException(), NoPapersFoundException().message),
+    (RuntimeError('arXiv is down'), "An error occurred during crawling. Please try again later."),
+])
+def test_failed_crawls_report_their_error(error, message):
+    crawls = BlockedCrawls(error)
+    manager, running = start(crawls)
+    finish(manager, crawls)
+    assert running.status == 'failed' and running.error == message
+    assert running.finished_at >= running.started_at >= running.submitted_at
@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from crawler.sort_columns import create_and_save_sort_columns
+from utils.utils import date_range_filter
+
+
+@pytest.fixture(scope='module')
+def sort_columns(tmp_path_factory):
+    papers = json.loads((Path(__file__).parents[1] / 'data' / 'papers.json').read_text(encoding='utf-8'))
+    # Papers whose date cannot be parsed never match a range
+    papers = papers + [{'Date': ''}, {'Date': 'Submitted sometime'}]
+    return create_and_save_sort_columns(papers, str(tmp_path_factory.mktemp('sort') / 'sort_columns.npz'))
+
+
+def brute_force_filter(dates, date_from, date_to):
+    return np.array([date > 0 and (date_from is None or date >= date_from) and (date_to is None or date <= date_to)
+                     for date in dates])
+
+
+def test_filter_matches_brute_force_at_every_boundary(sort_columns):
+    dates = sort_columns['date']
+    known = np.unique(dates[dates > 0])
+    assert len(known) > 1 and (dates == 0).sum() == 2
+    # Every date, the days around it and dates outside the corpus, so ties and ends are covered
+    bounds = sorted({int(date) + offset for date in known for offset in (-1, 0, 1)} | {1, int(known[-1]) + 400})
+    for date_from in [None] + bounds[::3]:
+        for date_to in [None] + bounds[1::3]:
+            doc_filter = date_range_filter(sort_columns, date_from, date_to)
+            if date_from is None and date_to is None:
+                assert doc_filter is None
+                continue
+            assert doc_filter.dtype == bool
+            np.testing.assert_array_equal(doc_filter, brute_force_filter(dates, date_from, date_to),
+                                          err_msg=f"{date_from} - {date_to}")
+
+
+def test_single_day_and_empty_ranges(sort_columns):
+    dates = sort_columns['date']
+    day = int(np.median(dates[dates > 0]))
+    np.testing.assert_array_equal(date_range_filter(sort_columns, day, day), dates == day)
+    assert not date_range_filter(sort_columns, day + 1, day).any()
+    assert not date_range_filter(sort_columns, None, 0).any()
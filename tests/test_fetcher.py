@@ -0,0 +1,165 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from crawler.fetcher import ArxivFetcher, RateLimiter
+
+
+class ArxivStub:
+    """
+    Local stand-in for the arXiv listing: serves numbered result pages, answers the configured error
+    statuses before a page succeeds, and records every request.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.failures = {}  # Start offset to the statuses answered before its page succeeds
+        self.delays = {}  # Start offset to the seconds its page takes
+        self.retry_after = None  # Retry-After header of the error statuses
+        self.requests = []  # (start, size, monotonic time) of every request
+        self.lock = threading.Lock()
+
+    def page(self, start, size):
+        return f"<h1>Showing {start + 1}&ndash;{min(start + size, self.total)} of {self.total:,} results</h1>" \
+               f"<p id='start'>{start}</p>"
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                start, size = int(params['start'][0]), int(params['size'][0])
+                with stub.lock:
+                    stub.requests.append((start, size, time.monotonic()))
+                    failures = stub.failures.get(start, [])
+                    status = failures.pop(0) if failures else 200
+                time.sleep(stub.delays.get(start, 0))
+                body = stub.page(start, size).encode() if status == 200 else b'error'
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if status != 200 and stub.retry_after is not None:
+                    self.send_header('Retry-After', str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def arxiv():
+    stub = ArxivStub(total=1000)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub.handler())
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_address[1]}/search/"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher(arxiv, **options):
+    options = {'page_size': 25, 'workers': 4, 'requests_per_second': 0, 'retries': 3, 'backoff_factor': 0.01,
+               'timeout': 5, **options}
+    return ArxivFetcher(base_url=arxiv.url, **options)
+
+
+def page_starts(pages):
+    return [int(page.split("<p id='start'>")[1].split('<')[0]) for page in pages]
+
+
+def test_pages_are_yielded_in_order(arxiv):
+    # Later pages arrive first
+    arxiv.delays = {start: 0.02 * (6 - start // 25) for start in range(0, 150, 25)}
+    pages = list(fetcher(arxiv).iter_pages('python', 150))
+    assert page_starts(pages) == [0, 25, 50, 75, 100, 125]
+    assert {size for _, size, _ in arxiv.requests} == {25}
+
+
+def test_pages_stop_at_the_total_results(arxiv):
+    arxiv.total = 60
+    pages = list(fetcher(arxiv).iter_pages('python', 200))
+    assert page_starts(pages) == [0, 25, 50]
+
+
+def test_page_size_fits_max_results(arxiv):
+    pages = list(fetcher(arxiv, page_size=200).iter_pages('python', 40))
+    assert page_starts(pages) == [0]
+    assert arxiv.requests[0][1] == 50
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_failed_pages_are_retried(arxiv, status):
+    arxiv.failures = {0: [status], 50: [status, status]}
+    pages = list(fetcher(arxiv).iter_pages('python', 100))
+    assert page_starts(pages) == [0, 25, 50, 75]
+    assert sorted(start for start, _, _ in arxiv.requests) == [0, 0, 25, 50, 50, 50, 75]
+
+
+def test_retries_are_bounded(arxiv):
+    arxiv.failures = {0: [503] * 5}
+    with pytest.raises(requests.exceptions.RetryError):
+        list(fetcher(arxiv, retries=2).iter_pages('python', 25))
+    assert len(arxiv.requests) == 3
+
+
+def test_client_errors_are_not_retried(arxiv):
+    arxiv.failures = {0: [404]}
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(fetcher(arxiv).iter_pages('python', 25))
+    assert len(arxiv.requests) == 1
+
+
+def test_requests_are_rate_limited(arxiv):
+    requests_per_second = 20
+    pages = list(fetcher(arxiv, requests_per_second=requests_per_second).iter_pages('python', 200))
+    assert len(pages) == 8
+    times = sorted(time_ for _, _, time_ in arxiv.requests)
+    # Pages are fetched by 4 threads, yet the requests arrive at the rate allowed, give or take scheduling
+    assert times[-1] - times[0] >= (len(times) - 1) * 0.8 / requests_per_second
+
+
+def test_retries_are_rate_limited(arxiv):
+    requests_per_second = 20
+    # Throttled pages are retried at once, yet their retries wait for the rate limit like any request
+    arxiv.failures = {start: [429, 429] for start in range(0, 100, 25)}
+    pages = list(fetcher(arxiv, requests_per_second=requests_per_second, backoff_factor=0).iter_pages('python', 100))
+    assert page_starts(pages) == [0, 25, 50, 75]
+    times = sorted(time_ for _, _, time_ in arxiv.requests)
+    assert len(times) == 12
+    assert times[-1] - times[0] >= (len(times) - 1) * 0.8 / requests_per_second
+
+
+def test_retries_wait_for_retry_after(arxiv):
+    arxiv.failures = {0: [503]}
+    arxiv.retry_after = 1
+    list(fetcher(arxiv).iter_pages('python', 25))
+    first, second = (time_ for _, _, time_ in arxiv.requests)
+    assert second - first >= 0.9
+
+
+def test_rate_limiter_spaces_out_threads():
+    limiter = RateLimiter(50)
+    times = []
+    lock = threading.Lock()
+
+    def wait():
+        limiter.wait()
+        with lock:
+            times.append(time.monotonic())
+
+    threads = [threading.Thread(target=wait) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    times.sort()
+    assert times[-1] - times[0] >= 9 * 0.9 / 50
@@ -0,0 +1,120 @@
+import random
+from itertools import combinations
+
+import pytest
+
+from utils.binary_index import binary_read, binary_write
+from utils.enums import FuzzyConfig
+from utils.fuzzy_index import (FuzzyIndex, allowed_distance, closest_terms, correction, edit_distance, fuzzy_matches,
+                               fuzzy_write, term_deletes)
+
+ALPHABET = 'bkqv'
+DOC_COUNT = 40
+MAX_DISTANCE = FuzzyConfig.MAX_DISTANCE.value
+
+
+def reference_distance(source, target):
+    """
+    Optimal string alignment distance, from the whole dynamic programming table.
+    """
+    table = [[0] * (len(target) + 1) for _ in range(len(source) + 1)]
+    for row in range(len(source) + 1):
+        for column in range(len(target) + 1):
+            if not row or not column:
+                table[row][column] = row + column
+                continue
+            table[row][column] = min(table[row - 1][column] + 1, table[row][column - 1] + 1,
+                                     table[row - 1][column - 1] + (source[row - 1] != target[column - 1]))
+            if row > 1 and column > 1 and source[row - 1] == target[column - 2] \
+                    and source[row - 2] == target[column - 1]:
+                table[row][column] = min(table[row][column], table[row - 2][column - 2] + 1)
+    return table[-1][-1]
+
+
+def random_term(rng, length):
+    return ''.join(rng.choice(ALPHABET) for _ in range(length))
+
+
+def misspelled(rng, term):
+    """
+    Applies up to three random edits to a term.
+    """
+    for _ in range(rng.randint(0, 3)):
+        position = rng.randrange(len(term) + 1)
+        edit = rng.choice(['insert', 'delete', 'substitute', 'transpose'])
+        if edit == 'insert':
+            term = term[:position] + rng.choice(ALPHABET) + term[position:]
+        elif edit == 'delete' and len(term) > 1:
+            term = term[:max(0, position - 1)] + term[max(1, position):]
+        elif edit == 'substitute':
+            term = term[:max(0, position - 1)] + rng.choice(ALPHABET) + term[max(1, position):]
+        elif edit == 'transpose' and position + 1 < len(term):
+            term = term[:position] + term[position + 1] + term[position] + term[position + 2:]
+    return term
+
+
+@pytest.fixture(scope='module')
+def indexes(tmp_path_factory):
+    rng = random.Random(0)
+    directory = tmp_path_factory.mktemp('fuzzy')
+    # Longer terms than PREFIX_LENGTH too, whose deletes only cover their prefix
+    terms = {random_term(rng, rng.randint(1, 11)) for _ in range(300)}
+    inverted_index = {}
+    for term in terms:
+        documents = sorted(rng.sample(range(DOC_COUNT), rng.randint(1, 8)))
+        inverted_index[term] = {'documents': documents, 'frequencies': [1] * len(documents)}
+    binary_write(inverted_index, str(directory / 'inverted_index.bin'))
+    index = binary_read(str(directory / 'inverted_index.bin'))
+    fuzzy_write(list(index), str(directory / 'fuzzy_index.bin'))
+    index.fuzzy_index = FuzzyIndex(str(directory / 'fuzzy_index.bin'))
+    yield inverted_index, index, [misspelled(rng, rng.choice(sorted(terms))) for _ in range(150)]
+    index.fuzzy_index.close()
+    index.close()
+
+
+def test_edit_distance_matches_reference():
+    rng = random.Random(1)
+    for _ in range(2000):
+        source, target = random_term(rng, rng.randint(0, 8)), random_term(rng, rng.randint(0, 8))
+        expected = reference_distance(source, target)
+        for max_distance in range(4):
+            assert edit_distance(source, target, max_distance) == min(expected, max_distance + 1), (source, target)
+
+
+def test_transpositions_are_one_edit():
+    assert edit_distance('graph', 'garph', 2) == 1
+    assert edit_distance('ca', 'abc', 3) == 3  # Optimal string alignment never edits a transposed pair again
+
+
+def test_deletes_match_brute_force():
+    rng = random.Random(2)
+    for term in [random_term(rng, length) for length in range(1, 12) for _ in range(5)]:
+        prefix = term[:FuzzyConfig.PREFIX_LENGTH.value]
+        expected = {''.join(character for position, character in enumerate(prefix) if position not in deleted)
+                    for count in range(MAX_DISTANCE + 1) for deleted in combinations(range(len(prefix)), count)}
+        assert term_deletes(term) == expected - {''}
+
+
+def test_fuzzy_matches_equal_a_scan_of_the_vocabulary(indexes):
+    inverted_index, index, queries = indexes
+    for term in queries:
+        distances = {candidate: reference_distance(term, candidate) for candidate in inverted_index}
+        for max_distance in range(1, MAX_DISTANCE + 1):
+            expected = {candidate: distance for candidate, distance in distances.items() if distance <= max_distance}
+            assert fuzzy_matches(term, index, max_distance) == expected, term
+            assert fuzzy_matches(term, inverted_index, max_distance) == expected, term
+
+
+def test_closest_terms_are_the_nearest_most_frequent(indexes):
+    inverted_index, index, queries = indexes
+    for term in queries:
+        distances = {candidate: reference_distance(term, candidate) for candidate in inverted_index}
+        best = min(distances.values())
+        expected = []
+        if best <= allowed_distance(term):
+            expected = sorted((candidate for candidate, distance in distances.items() if distance == best),
+                              key=lambda candidate: (-len(inverted_index[candidate]['documents']), candidate))
+        assert closest_terms(term, [index]) == expected[:FuzzyConfig.MAX_EXPANSIONS.value], term
+        if len(term) < FuzzyConfig.MIN_TERM_LENGTH.value or term in inverted_index:
+            expected = [term]
+        assert correction(term, [index]) == (expected or [term])[0], term
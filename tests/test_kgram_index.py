@@ -0,0 +1,98 @@
+import random
+from fnmatch import fnmatchcase
+
+import pytest
+
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.binary_index import binary_read, binary_write
+from utils.enums import KGramConfig
+from utils.kgram_index import KGramIndex, expand_wildcard, kgram_write, wildcard_documents
+
+ALPHABET = 'abcé'
+DOC_COUNT = 50
+
+
+def random_term(rng, length):
+    return ''.join(rng.choice(ALPHABET) for _ in range(length))
+
+
+def write_index(directory, terms, rng):
+    """
+    Writes an inverted index holding the terms, each in a few random documents, and its k-gram index.
+    """
+    inverted_index = {term: {'documents': sorted(rng.sample(range(DOC_COUNT), rng.randint(1, 5)))} for term in terms}
+    for entry in inverted_index.values():
+        entry['frequencies'] = [1] * len(entry['documents'])
+    binary_write(inverted_index, str(directory / 'inverted_index.bin'))
+    index = binary_read(str(directory / 'inverted_index.bin'))
+    kgram_write(list(index), str(directory / 'kgram_index.bin'))
+    index.kgram_index = KGramIndex(str(directory / 'kgram_index.bin'))
+    return inverted_index, index
+
+
+@pytest.fixture(scope='module')
+def indexes(tmp_path_factory):
+    rng = random.Random(0)
+    terms = {random_term(rng, rng.randint(1, 7)) for _ in range(600)}
+    inverted_index, index = write_index(tmp_path_factory.mktemp('kgram'), terms, rng)
+    yield inverted_index, index
+    index.kgram_index.close()
+    index.close()
+
+
+def random_pattern(rng):
+    pattern = list(random_term(rng, rng.randint(1, 6)))
+    for _ in range(rng.randint(1, 3)):
+        pattern.insert(rng.randint(0, len(pattern)), '*')
+    return ''.join(pattern)
+
+
+def test_expansions_match_fnmatch(indexes):
+    inverted_index, index = indexes
+    vocabulary = list(index)
+    assert vocabulary == sorted(inverted_index, key=lambda term: term.encode('utf-8'))
+    rng = random.Random(1)
+    # Short patterns have no k-grams and are looked up by prefix, longer ones through their k-grams
+    for pattern in ['a*', 'é*', '*a', 'ab*', '*é*', 'a*c'] + [random_pattern(rng) for _ in range(300)]:
+        expected = [term for term in vocabulary if fnmatchcase(term, pattern)]
+        assert index.kgram_index.expand(pattern) == expected, pattern
+        # Without a k-gram index the term dictionary is scanned
+        assert sorted(expand_wildcard(pattern, inverted_index)) == expected, pattern
+
+
+def test_wildcard_documents_match_brute_force(indexes):
+    inverted_index, index = indexes
+    rng = random.Random(2)
+    for pattern in [random_pattern(rng) for _ in range(100)]:
+        expected = sorted({doc for term, entry in inverted_index.items() if fnmatchcase(term, pattern)
+                           for doc in entry['documents']})
+        assert wildcard_documents(pattern, index) == expected, pattern
+
+
+def test_expansions_are_limited(indexes):
+    _, index = indexes
+    matching = len(index.kgram_index.expand('*a*'))
+    assert len(index.kgram_index.expand('*a*', limit=matching)) == matching
+    with pytest.raises(InvalidQueryException):
+        index.kgram_index.expand('*a*', limit=matching - 1)
+
+
+def test_expansions_are_limited_to_max_expansions(tmp_path):
+    limit = KGramConfig.MAX_EXPANSIONS.value
+    rng = random.Random(3)
+    terms = [f"a{number:05d}" for number in range(limit)] + ['b00000']
+    _, index = write_index(tmp_path, terms, rng)
+    try:
+        assert len(expand_wildcard('a*', index)) == limit
+        with pytest.raises(InvalidQueryException):
+            expand_wildcard('*0*', index)
+    finally:
+        index.kgram_index.close()
+        index.close()
+
+
+@pytest.mark.parametrize('pattern', ['*', '**'])
+def test_patterns_without_characters_are_rejected(indexes, pattern):
+    _, index = indexes
+    with pytest.raises(InvalidQueryException):
+        expand_wildcard(pattern, index)
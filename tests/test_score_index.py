@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from crawler.score_index import block_maxima
+from utils.score_index import block_max_top_k, exhaustive_top_k, score_top_k
+
+
+@pytest.fixture(scope='module')
+def entry():
+    # Small blocks, so that a small corpus spreads its postings over many of them
+    impacts = sparse_random(3000, 40, density=0.05, format='csc', random_state=np.random.default_rng(0))
+    impacts.sort_indices()
+    return {'impacts': impacts, **block_maxima(impacts, block_size=64)}
+
+
+@pytest.fixture(scope='module')
+def queries(entry):
+    rng = np.random.default_rng(1)
+    term_count = entry['impacts'].shape[1]
+    return [(np.sort(rng.choice(term_count, size, replace=False)), rng.uniform(0.5, 2, size))
+            for size in (1, 2, 3, 5, 8, 13) for _ in range(5)]
+
+
+@pytest.mark.parametrize('k', [1, 10, 100, 5000])
+def test_pruned_top_k_equals_exhaustive(entry, queries, k):
+    for columns, weights in queries:
+        assert block_max_top_k(entry, columns, weights, k) == exhaustive_top_k(entry, columns, weights, k)
+
+
+@pytest.mark.parametrize('share', [0.0, 0.001, 0.01, 0.3, 1.0])
+def test_pruned_top_k_equals_exhaustive_with_filter(entry, queries, share):
+    doc_filter = np.random.default_rng(2).random(entry['impacts'].shape[0]) < share
+    for columns, weights in queries:
+        for k in (1, 10, 100):
+            assert block_max_top_k(entry, columns, weights, k, doc_filter) == \
+                exhaustive_top_k(entry, columns, weights, k, doc_filter)
+
+
+def test_filter_keeps_only_allowed_documents(entry, queries):
+    doc_filter = np.zeros(entry['impacts'].shape[0], dtype=bool)
+    doc_filter[::7] = True
+    for columns, weights in queries:
+        documents, scores = score_top_k(entry, columns, weights, 50, doc_filter)
+        assert all(doc_filter[documents])
+        unfiltered, unfiltered_scores = exhaustive_top_k(entry, columns, weights, entry['impacts'].shape[0])
+        expected = [(doc, score) for doc, score in zip(unfiltered, unfiltered_scores) if doc_filter[doc]][:50]
+        assert list(zip(documents, scores)) == expected
+
+
+def test_no_query_terms(entry):
+    empty = np.zeros(0, dtype=np.int64)
+    assert block_max_top_k(entry, empty, np.zeros(0), 10) == ([], [])
+    assert exhaustive_top_k(entry, empty, np.zeros(0), 10) == ([], [])
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from gensim.models import Word2Vec
+
+import crawler.semantic_index as semantic_index_module
+from crawler.semantic_index import add_to_ivf_index, create_and_save_semantic_index, train_word_vectors, \
+    update_and_save_semantic_index
+from crawler.vector_index import SEARCH_OPTIONS
+
+
+@pytest.fixture(scope='module')
+def papers():
+    return json.loads((Path(__file__).parents[1] / 'data' / 'papers_preprocessed.json').read_text(encoding='utf-8'))
+
+
+def test_new_documents_join_the_list_of_their_nearest_centroid():
+    rng = np.random.default_rng(0)
+    centroids = np.eye(3, dtype=np.float32)
+    ivf_index = {'centroids': centroids, 'list_offsets': np.array([0, 2, 3, 5]),
+                 'list_documents': np.array([0, 3, 1, 2, 4])}
+    vectors = np.abs(rng.normal(size=(4, 3))).astype(np.float32)
+    vectors[2] = 0  # No known words
+    updated = add_to_ivf_index(ivf_index, vectors, 5)
+    assert np.array_equal(updated['centroids'], centroids)
+    offsets, documents = updated['list_offsets'], updated['list_documents']
+    assert offsets[-1] == 8 and 7 not in documents
+    nearest = np.argmax(vectors @ centroids.T, axis=1)
+    for list_number in range(3):
+        members = documents[offsets[list_number]:offsets[list_number + 1]]
+        assert list(members) == sorted(members)
+        expected_new = [5 + row for row in (0, 1, 3) if nearest[row] == list_number]
+        assert [doc for doc in members if doc >= 5] == expected_new
+
+
+def test_crawl_adds_papers_without_training_again(papers, tmp_path):
+    path = str(tmp_path / 'semantic_index.npz')
+    existing = papers[:80]
+    semantic_index = create_and_save_semantic_index(existing, path)
+    # Papers whose words are all known to the embeddings: copies of indexed ones
+    new = [{**paper, 'ID': len(existing) + number + 1} for number, paper in enumerate(existing[:10])]
+    updated = update_and_save_semantic_index(existing, new, path, semantic_index)
+    assert np.array_equal(updated['words'], semantic_index['words'])
+    assert int(updated['trained_doc_count']) == len(existing)
+    for search_option in SEARCH_OPTIONS:
+        vectors = updated[f'{search_option}.vectors']
+        assert len(vectors) == len(existing) + len(new)
+        assert np.array_equal(vectors[:len(existing)], semantic_index[f'{search_option}.vectors'])
+        assert np.array_equal(updated[f'{search_option}.centroids'], semantic_index[f'{search_option}.centroids'])
+        assert np.array_equal(vectors[len(existing):], vectors[:len(new)])
+        # Every copy joins the inverted list of its original
+        offsets = updated[f'{search_option}.list_offsets']
+        lists = dict(zip(updated[f'{search_option}.list_documents'], np.repeat(np.arange(len(offsets) - 1),
+                                                                             np.diff(offsets))))
+        assert sorted(lists) == list(np.flatnonzero(np.linalg.norm(vectors, axis=1) > 0))
+        assert all(lists.get(len(existing) + doc) == lists.get(doc) for doc in range(len(new)))
+
+
+def test_unknown_words_train_again(papers, tmp_path):
+    path = str(tmp_path / 'semantic_index.npz')
+    semantic_index = create_and_save_semantic_index(papers[:50], path)
+    updated = update_and_save_semantic_index(papers[:50], papers[50:], path, semantic_index)
+    assert int(updated['trained_doc_count']) == len(papers)
+    assert len(updated['words']) > len(semantic_index['words'])
+
+
+
+def test_seeded_training_is_reproducible(papers, monkeypatch):
+    calls = []
+
+    def word2vec(**kwargs):
+        calls.append(kwargs)
+        return Word2Vec(**kwargs)
+
+    monkeypatch.setattr(semantic_index_module, 'Word2Vec', word2vec)
+    first, second = train_word_vectors(papers[:40]), train_word_vectors(papers[:40])
+    # Threads would train in scheduling order whatever the seed
+    assert all(call['workers'] == 1 for call in calls)
+    assert np.array_equal(first['word_vectors'], second['word_vectors'])
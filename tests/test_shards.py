@@ -0,0 +1,74 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from crawler.bm25_index import create_and_save_bm25_index
+from crawler.shards import create_and_save_shards
+from crawler.vector_index import create_and_save_vector_index
+from utils.algorithms import vector_space_batch_search, vector_space_search
+from utils.binary_index import binary_write
+from utils.enums import Paths
+from utils.json_config import load_files
+from utils.shards import ShardPool
+from utils.snapshot import snapshot_files
+
+DOC_COUNT = 40
+
+
+def read_data(name):
+    return json.loads((Path(__file__).parents[1] / 'data' / name).read_text(encoding='utf-8'))[:DOC_COUNT]
+
+
+def title_index(preprocessed):
+    inverted_index = {}
+    for doc, paper in enumerate(preprocessed):
+        words = (paper['Title_processed'] or '').split()
+        for word in sorted(set(words)):
+            entry = inverted_index.setdefault(word, {'documents': [], 'frequencies': []})
+            entry['documents'].append(doc)
+            entry['frequencies'].append(words.count(word))
+    return inverted_index
+
+
+@pytest.fixture(scope='module')
+def sharded_index(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('index')
+    papers, preprocessed = read_data('papers.json'), read_data('papers_preprocessed.json')
+    inverted_indexes = {'Title': title_index(preprocessed)}
+    segment = os.path.join(directory, 'inverted_index_title.bin')
+    binary_write(inverted_indexes['Title'], segment)
+    manifest = {'version': 1, 'doc_count': DOC_COUNT, 'segments': {'Title': [segment]}}
+    bm25_index = create_and_save_bm25_index(inverted_indexes, DOC_COUNT, os.path.join(directory, 'bm25.json'))
+    vector_index = create_and_save_vector_index(preprocessed, os.path.join(directory, 'vector_index.joblib'))
+    create_and_save_shards(manifest, papers, bm25_index, vector_index, 3, os.path.join(directory, 'shards'))
+    pool = ShardPool(manifest['shards'])
+    yield manifest, papers, preprocessed, vector_index, pool
+    pool.close()
+
+
+def test_the_searching_process_loads_neither_papers_nor_document_rows(sharded_index):
+    manifest, _, _, _, _ = sharded_index
+    files = snapshot_files(manifest, {'paper_data': Paths.PAPERS_PATH, 'vector_index': Paths.VECTOR_INDEX_PATH,
+                                      'score_index': Paths.SCORE_INDEX_PATH, 'manifest': Paths.MANIFEST_PATH})
+    assert files['paper_data'] is None and files['score_index'] is None
+    vectorizers = load_files({'vector_index': files['vector_index']})['vector_index']
+    assert all(set(model) == {'vectorizer'} for model in vectorizers.values())
+
+
+def test_papers_are_read_from_the_shards_holding_them(sharded_index):
+    _, papers, _, _, pool = sharded_index
+    ids = [DOC_COUNT - 1, 0, 20, 13, 14]
+    assert pool.papers(ids) == [papers[idx] for idx in ids]
+    assert pool.papers([]) == []
+
+
+def test_sharded_vector_space_search_matches_the_whole_index(sharded_index):
+    manifest, _, preprocessed, vector_index, pool = sharded_index
+    vectorizers = load_files({'vector_index': manifest['coordinator_files']['vector_index']})['vector_index']
+    for query in [paper['Title_processed'] for paper in preprocessed[:5]]:
+        ranking, scores = vector_space_search(query, 'Title', vectorizers, 10, shards=pool)
+        expected_ranking, expected_scores = vector_space_batch_search([query], 'Title', vector_index, 10)[0]
+        assert ranking == expected_ranking
+        assert scores == pytest.approx(expected_scores)
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from crawler.versions import DATA_FILES, index_lock, manifest_paths, publish_manifest, versioned_path
+from crawler.web_crawler import save_indexes
+from utils.enums import Paths
+from utils.json_config import json_read
+import utils.snapshot as snapshot_module
+from utils.snapshot import SnapshotManager, load_snapshot
+
+
+def write(path, content='x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def version_manifest(directory, version, segments):
+    files = {name: versioned_path(os.path.join(directory, os.path.basename(path)), version)
+             for name, path in DATA_FILES.items()}
+    manifest = {'version': version, 'files': files, 'segments': {'Title': segments},
+                'kgram_indexes': {'Title': os.path.join(directory, f'kgram_index.title.v{version}.bin')},
+                'shards': [{'path': os.path.join(directory, 'shards', str(version), '0')}]}
+    for path in list(files.values()) + segments + list(manifest['kgram_indexes'].values()):
+        write(path)
+    write(os.path.join(manifest['shards'][0]['path'], 'tfidf.joblib'))
+    return manifest
+
+
+def test_versioned_path():
+    assert versioned_path('data/bm25_index.json', 3) == 'data/bm25_index.v3.json'
+
+
+def test_publish_replaces_the_manifest_then_deletes_superseded_files(tmp_path):
+    directory = str(tmp_path)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    shared_segment = os.path.join(directory, 'inverted_index_title.bin')
+    first = version_manifest(directory, 1, [shared_segment])
+    publish_manifest(first, None, manifest_path)
+    second = version_manifest(directory, 2, [shared_segment, os.path.join(directory, 'inverted_index_title.1.bin')])
+    # Writing a version leaves every file of the published one in place
+    assert all(os.path.exists(path) for path in manifest_paths(first))
+
+    publish_manifest(second, first, manifest_path)
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        assert json.load(manifest_file)['version'] == 2
+    assert all(os.path.exists(path) for path in manifest_paths(second))
+    assert not any(os.path.exists(path) for path in manifest_paths(first) - manifest_paths(second))
+    assert os.path.exists(shared_segment)
+    assert os.listdir(os.path.join(directory, 'shards')) == ['2']
+
+
+def test_unversioned_manifests_use_the_default_paths():
+    paths = manifest_paths({'version': 1, 'segments': {}})
+    assert set(DATA_FILES.values()) <= paths
+
+
+def test_a_failed_write_publishes_nothing_and_leaves_no_file(tmp_path, monkeypatch):
+    shutil.copytree(Path(__file__).parents[1] / 'data', tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    before = sorted(os.listdir('data'))
+    with open('data/manifest.json', encoding='utf-8') as manifest_file:
+        manifest = manifest_file.read()
+    papers = json_read('data/papers.json')
+    preprocessed = json_read('data/papers_preprocessed.json')
+
+    def disk_full(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(np, 'savez', disk_full)
+    with pytest.raises(OSError):
+        save_indexes(papers, preprocessed, [], {field: {} for field in ('Authors', 'Abstract', 'Date', 'Title')})
+    with open('data/manifest.json', encoding='utf-8') as manifest_file:
+        assert manifest_file.read() == manifest
+    assert sorted(set(os.listdir('data')) - {'index.lock'}) == before
+
+
+def test_a_version_missing_a_segment_is_not_served(tmp_path, monkeypatch):
+    shutil.copytree(Path(__file__).parents[1] / 'data', tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    os.remove('data/inverted_index_title.bin')
+    with pytest.raises(FileNotFoundError):
+        load_snapshot({'paper_data': Paths.PAPERS_PATH, 'manifest': Paths.MANIFEST_PATH})
+
+
+def test_reloading_an_unchanged_version_loads_nothing(tmp_path, monkeypatch):
+    shutil.copytree(Path(__file__).parents[1] / 'data', tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    snapshots = SnapshotManager({'paper_data': Paths.PAPERS_PATH, 'manifest': Paths.MANIFEST_PATH})
+    loads = []
+    monkeypatch.setattr(snapshot_module, 'load_snapshot', lambda data_paths: loads.append(data_paths))
+    assert not snapshots.reload()
+    assert loads == []
+
+
+def test_index_versions_are_written_one_at_a_time(tmp_path):
+    lock_path = str(tmp_path / 'index.lock')
+    events = []
+
+    def write_version(name):
+        with index_lock(lock_path):
+            events.append(f'{name} start')
+            time.sleep(0.2)
+            events.append(f'{name} end')
+
+    threads = [threading.Thread(target=write_version, args=(name,)) for name in ('crawl', 'rebuild')]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert events == ['crawl start', 'crawl end', 'rebuild start', 'rebuild end']
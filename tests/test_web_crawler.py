@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmarks.run import extract_papers_full_tree
+from crawler.web_crawler import extract_papers, is_new_paper, known_papers_keys
+
+# arXiv result pages for the query 'python', whose text is the one the crawler read from arxiv.org for the
+# papers of data/papers.json (their identifiers are made up); the .json files hold the papers expected
+FIXTURES = Path(__file__).parent / 'fixtures'
+RESULT_PAGES = sorted(FIXTURES.glob('arxiv_results_*.html'))
+
+
+def read_page(path):
+    return path.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('path', RESULT_PAGES, ids=lambda path: path.stem)
+def test_lxml_extraction_matches_beautifulsoup(path):
+    html = read_page(path)
+    assert extract_papers(html) == extract_papers_full_tree(html)
+
+
+@pytest.mark.parametrize('path', [path for path in RESULT_PAGES if path.with_suffix('.json').exists()],
+                         ids=lambda path: path.stem)
+def test_extraction_reads_the_text_of_the_live_pages(path):
+    expected = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+    assert extract_papers(read_page(path)) == expected
+
+
+def test_edge_cases():
+    papers = extract_papers(read_page(FIXTURES / 'arxiv_results_edge_cases.html'))
+    assert [paper['ArxivID'] for paper in papers] == ['2401.00001', '2401.00002v2']
+    # Comments and scripts are left out, entities decoded, and whitespace between elements read as BeautifulSoup does
+    assert papers[0]['Title'] == 'Graph & neural  nets: $\\mathcal{O}(n^2)$ <fast>  café — ünïcødé'
+    assert papers[0]['Authors'] == "Authors:\nJ. O'Neil,\n         Zoë   Müller"
+    assert papers[0]['Date'] == 'Comments first'
+
+
+def test_malformed_items():
+    papers = extract_papers(read_page(FIXTURES / 'arxiv_results_malformed.html'))
+    # Items missing a field are skipped, those missing the identifier link are kept without identifier
+    assert [(paper['ArxivID'], paper['Title']) for paper in papers] == [
+        ('2402.00001', 'Complete'), ('', 'No identifier link'), ('', 'No identifier')]
+    known_ids, id_less_titles = known_papers_keys([{'ArxivID': '', 'Title': 'No identifier'}])
+    assert [is_new_paper(paper, known_ids, id_less_titles) for paper in papers] == [True, True, False]
+
+
+def test_page_without_results():
+    assert extract_papers(read_page(FIXTURES / 'arxiv_results_empty.html')) == []
+    assert extract_papers('') == []
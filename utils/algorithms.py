@@ -1,284 +1,336 @@
 import logging
-import re
 
-from rank_bm25 import BM25Okapi
-from flask import render_template
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.utils import sort_results, inverted_index_search
+import numpy as np
 
+from crawler.preprocess import analyze_field_query
+from utils.bm25 import bm25_idf, bm25_scores, bm25f_scores
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.boolean_query import boolean_query_search, suggest_boolean_query
+from utils.enums import SemanticConfig
+from utils.fuzzy_index import correction, expand_query_words, is_known, suggest_query_words
+from utils.kgram_index import WILDCARD
+from utils.metrics import stage
+from utils.score_index import score_top_k, term_columns
+from utils.semantic_index import embed_texts, semantic_scores
+from utils.shards import merge_top_k, shard_bm25_search, shard_bm25f_search, shard_vector_space_search
+from utils.utils import inverted_index_search, top_k
 
-def vector_space_search(query, search_option, algorithm, paper_processed_data, paper_data, sort_by):
+
+def vector_space_batch_search(queries, search_option, vector_index, k, doc_filter=None):
+    """
+    Perform vector space search algorithm for several queries at once.
+
+    All the queries are vectorized together and scored with a single sparse matrix product.
+
+    Parameters:
+    - queries: Users' search queries.
+    - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
+    - vector_index: TF-IDF models fitted at crawl time, one per search option.
+    - k: Maximum number of documents to return per query.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID; only their
+      rows of the document matrix are scored.
+
+    Returns:
+    - List of (IDs of the k most similar documents, best first, and their similarities), one per query.
+    """
+    # Only the queries are vectorized, the document matrix was fitted by the crawler
+    field_index = vector_index[search_option]
+    with stage('parse'):
+        query_matrix = field_index['vectorizer'].transform(queries)
+    tfidf_matrix = field_index['tfidf_matrix']
+    ids = None
+    if doc_filter is not None:
+        with stage('filter'):
+            ids = np.flatnonzero(doc_filter)
+            tfidf_matrix = tfidf_matrix[ids]
+    with stage('scoring'):
+        # Rows of both matrices are L2 normalized, so their products are the cosine similarities
+        similarities = (query_matrix @ tfidf_matrix.T).tocsr()
+
+        results = []
+        for row in range(len(queries)):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            indices = similarities.indices[start:end]
+            results.append(top_k(similarities.data[start:end], k, ids[indices] if ids is not None else indices))
+    return results
+
+
+def selected_indexes(search_option, field_indexes):
+    """
+    Returns the inverted indexes searched for a search option: every field for 'all_fields', otherwise that field.
+    """
+    if search_option == 'all_fields':
+        return list(field_indexes.values())
+    return [field_indexes[search_option]]
+
+
+def vector_space_search(query, search_option, vector_index, k, field_indexes=None, shards=None, doc_filter=None,
+                        score_index=None):
     """
     Perform vector space search algorithm.
 
     Parameters:
     - query: User's search query.
     - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
-    - algorithm: Search algorithm ('vector_space').
-    - paper_processed_data: Processed paper data.
-    - paper_data: Original paper data.
-    - sort_by: Sorting option ('date', 'author', 'title').
+    - vector_index: TF-IDF models fitted at crawl time, one per search option.
+    - k: Maximum number of documents to return.
+    - field_indexes: Inverted index of each field, given to expand the query words missing from them
+      to their closest indexed terms.
+    - shards: Shard workers of a sharded index, which score their documents in parallel.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID.
+    - score_index: Precomputed postings scores with their maxima, to skip the documents that cannot
+      make it into the k most similar.
 
     Returns:
-    - Rendered template with search results.
+    - Tuple of the IDs of the k most similar documents, best first, and their similarities.
     """
     logging.info("Entered vector space algorithm")
 
-    # Construct corpus and query_data based on search_option
-    if search_option == 'all_fields':
-        corpus = [' '.join([paper['Title_processed'], paper['Authors_processed'], paper['Abstract_processed'],
-                            paper['Date_processed']]) for paper in paper_processed_data]
-        query_data = ' '.join([query])
-    else:
-        corpus = [' '.join([paper[f'{search_option}_processed']]) for paper in paper_processed_data]
-        query_data = ' '.join([query])
-
-    # Create TF-IDF matrix and compute similarities
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(corpus + [query_data])
-    similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
-    ranking = similarities.argsort()[0][::-1]
-    papers_to_display = [paper_data[index] for index in ranking]
-
-    # Sort the filtered papers
-    papers_to_display = sort_results(papers_to_display, sort_by)
-    logging.debug(f"Matching documents: {papers_to_display}")
+    if field_indexes is not None:
+        with stage('parse'):
+            query = expand_query_words(query, selected_indexes(search_option, field_indexes))
+    if shards is not None:
+        with stage('parse'):
+            query_matrix = vector_index[search_option]['vectorizer'].transform([query])
+        with stage('shards'):
+            results = shards.scatter(shard_vector_space_search, search_option, query_matrix, k, doc_filter)
+        with stage('merge'):
+            ranking, similarities = merge_top_k(results, k)
+        logging.debug("Matching documents: %s", ranking)
+        return ranking, similarities
+    entry = score_index['vector_space'].get(search_option) if score_index else None
+    if entry is not None:
+        with stage('parse'):
+            query_matrix = vector_index[search_option]['vectorizer'].transform([query])
+        with stage('scoring'):
+            ranking, similarities = score_top_k(entry, query_matrix.indices, query_matrix.data, k, doc_filter)
+        logging.debug("Matching documents: %s", ranking)
+        return ranking, similarities
+    ranking, similarities = vector_space_batch_search([query], search_option, vector_index, k, doc_filter)[0]
+    logging.debug("Matching documents: %s", ranking)
+
+    return ranking, similarities
+
+
+def semantic_search(query, search_option, semantic_index, k, nprobe=SemanticConfig.NPROBE.value, exact=False,
+                    field_indexes=None, doc_filter=None, fuzzy=False):
+    """
+    Perform semantic search algorithm.
 
-    return render_template('results.html', query=query, search_option=search_option,
-                           algorithm=algorithm, results=papers_to_display)
+    The query is preprocessed and embedded like the documents, from the word embeddings trained at crawl
+    time, and the documents with the most similar embeddings are found through the IVF index. A query
+    none of whose words is in the searched fields has nothing in common with their documents and
+    matches none.
 
+    Parameters:
+    - query: User's search query.
+    - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
+    - semantic_index: Word embeddings, document embeddings and IVF index of each search option.
+    - k: Maximum number of documents to return.
+    - nprobe: Inverted lists scanned; more means better recall and slower queries.
+    - exact: Score every document instead, e.g. to measure the recall of the approximate search.
+    - field_indexes: Inverted index of each field, to check that the query words are in the searched fields.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID.
+    - fuzzy: Whether query words missing from the searched fields are expanded to their closest indexed terms.
 
-def probabilistic_search(query, search_option, algorithm, paper_processed_data, paper_data, sort_by):
+    Returns:
+    - Tuple of the IDs of the k most similar documents, best first, and their similarities.
+    """
+    logging.info("Entered semantic algorithm")
+
+    if semantic_index is None:
+        raise InvalidQueryException("The semantic index has not been built yet, please crawl again.")
+    with stage('parse'):
+        words = analyze_field_query(query, search_option)
+        if field_indexes is not None:
+            inverted_indexes = selected_indexes(search_option, field_indexes)
+            if fuzzy:
+                words = expand_query_words(' '.join(words), inverted_indexes).split()
+            if not any(is_known(word, inverted_indexes) for word in words):
+                return [], []
+        query_vector = embed_texts([' '.join(words)], semantic_index)[0]
+    if not query_vector.any():  # No query word is in the vocabulary
+        return [], []
+    with stage('retrieval'):
+        similarities, ids = semantic_scores(query_vector, semantic_index, search_option, nprobe, exact,
+                                              doc_filter)
+    with stage('scoring'):
+        ranking, scores = top_k(similarities, k, ids)
+    logging.debug("Matching documents: %s", ranking)
+
+    return ranking, scores
+
+
+def probabilistic_search(query, search_option, field_indexes, bm25_index, k, postings_cache=None, fuzzy=False,
+                         shards=None, doc_filter=None, score_index=None):
     """
     Perform probabilistic search algorithm.
 
+    A field is scored with BM25. 'all_fields' is scored with BM25F over the index of every field,
+    weighting each field and normalizing it by its own length (see BM25FConfig).
+
     Parameters:
     - query: User's search query.
     - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
-    - algorithm: Search algorithm ('probabilistic').
-    - paper_processed_data: Processed paper data.
-    - paper_data: Original paper data.
-    - sort_by: Sorting option ('date', 'author', 'title').
+    - field_indexes: Inverted index of each field ('Authors', 'Date', 'Abstract', 'Title').
+    - bm25_index: BM25 collection statistics of each search option.
+    - k: Maximum number of documents to return.
+    - postings_cache: Dict reused across the queries of a batch to decode the postings of a term once.
+    - fuzzy: Whether query terms missing from the indexes are expanded to their closest indexed terms.
+    - shards: Shard workers of a sharded index, which score their documents in parallel with the
+      global IDF of the query terms.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID; the other
+      documents are skipped before scoring.
+    - score_index: Precomputed postings scores with their maxima, to skip the documents that cannot
+      make it into the k best.
 
     Returns:
-    - Rendered template with search results.
+    - Tuple of the IDs of the k best scoring documents, best first, and their scores.
     """
     logging.info("Entered probabilistic algorithm")
 
-    # Construct corpus and query_data based on search_option
+    # Select the postings to score based on search_option
+    inverted_indexes = selected_indexes(search_option, field_indexes)
+
+    with stage('parse'):
+        query_terms = (expand_query_words(query, inverted_indexes) if fuzzy else query.lower()).split()
+    if shards is not None:
+        field_stats = bm25_index[search_option]
+        with stage('parse'):
+            weighted_terms = []
+            for term in query_terms:
+                document_frequency = shards.document_frequency(term, search_option)
+                if document_frequency:
+                    weighted_terms.append((term, bm25_idf(field_stats['doc_count'], document_frequency)))
+        with stage('shards'):
+            if search_option == 'all_fields':
+                avgdls = {field: bm25_index[field]['avgdl'] for field in field_indexes}
+                results = shards.scatter(shard_bm25f_search, weighted_terms, avgdls, k, doc_filter)
+            else:
+                results = shards.scatter(shard_bm25_search, search_option, weighted_terms,
+                                         field_stats['avgdl'] or 1.0, k, doc_filter)
+        with stage('merge'):
+            ranking, scores = merge_top_k(results, k)
+        logging.debug("Matching documents: %s", ranking)
+        return ranking, scores
+    entry = score_index['bm25'].get(search_option) if score_index else None
+    if entry is not None:
+        with stage('retrieval'):
+            columns, weights = term_columns(query_terms, entry)
+        with stage('scoring'):
+            ranking, scores = score_top_k(entry, columns, weights, k, doc_filter)
+        logging.debug("Matching documents: %s", ranking)
+        return ranking, scores
+    # Score only the documents in the postings of the query terms
     if search_option == 'all_fields':
-        corpus = [' '.join([paper['Title_processed'], paper['Authors_processed'], paper['Abstract_processed'],
-                            paper['Date_processed']]) for paper in paper_processed_data]
-        query_data = ' '.join([query])
+        similarities = bm25f_scores(query_terms, field_indexes, bm25_index, postings_cache, doc_filter)
     else:
-        corpus = [' '.join([paper[f'{search_option}_processed']]) for paper in paper_processed_data]
-        query_data = ' '.join([query])
-
-    # Create BM25 model and compute similarities
-    bm25 = BM25Okapi([doc.split() for doc in corpus])
-    similarities = bm25.get_scores(query_data.split())
-    ranking = sorted(range(len(similarities)), key=lambda i: similarities[i], reverse=True)
-    papers_to_display = [paper_data[index] for index in ranking]
+        similarities = bm25_scores(query_terms, inverted_indexes, bm25_index[search_option], postings_cache,
+                                   doc_filter)
+    with stage('scoring'):
+        ranking, scores = top_k(similarities, k)
+    logging.debug("Matching documents: %s", ranking)
 
-    # Sort the filtered papers
-    papers_to_display = sort_results(papers_to_display, sort_by)
-    logging.debug(f"Matching documents: {papers_to_display}")
+    return ranking, scores
 
-    return render_template('results.html', query=query, search_option=search_option,
-                           algorithm=algorithm, results=papers_to_display)
 
-
-def simple_search(query, search_option, algorithm, author_data, date_data, abstract_data, title_data, paper_data,
-                  sort_by):
+def simple_search(query, search_option, author_data, date_data, abstract_data, title_data, fuzzy=False,
+                  doc_filter=None):
     """
     Perform simple search algorithm.
 
     Parameters:
     - query: User's search query.
     - search_option: Search option ('Authors', 'Date', 'Abstract', 'Title', 'all_fields').
-    - algorithm: Search algorithm ('simple' in this case).
     - author_data: Data for the 'Authors' field.
     - date_data: Data for the 'Date' field.
     - abstract_data: Data for the 'Abstract' field.
     - title_data: Data for the 'Title' field.
-    - paper_data: Original paper data.
-    - sort_by: Sorting option ('date', 'author', 'title').
+    - fuzzy: Whether a query missing from a field matches the closest terms of that field.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID.
 
     Returns:
-    - Rendered template with search results.
+    - List of the IDs of the matching documents.
     """
     logging.info("Entered simple search")
 
     if query and search_option:
-        logging.info(f"Performing search with option: {search_option}")
-
-        if search_option == 'Authors':
-            logging.debug("Search option: Authors")
-            matching_documents = inverted_index_search(query, author_data)
-        elif search_option == 'Date':
-            logging.debug("Search option: Date")
-            matching_documents = inverted_index_search(query, date_data)
-        elif search_option == 'Abstract':
-            logging.debug("Search option: Abstract")
-            matching_documents = inverted_index_search(query, abstract_data)
-        elif search_option == 'Title':
-            logging.debug("Search option: Title")
-            matching_documents = inverted_index_search(query, title_data)
-        else:  # Default to 'all_fields' or any other case
-            logging.debug("Search option: all_fields")
-            matching_documents = inverted_index_search(query, author_data) + \
-                                 inverted_index_search(query, date_data) + \
-                                 inverted_index_search(query, abstract_data) + \
-                                 inverted_index_search(query, title_data)
-
-        logging.info(f"Matching documents: {matching_documents}")
-
-        papers_to_display = [paper_data[idx] for idx in matching_documents]
-        logging.debug(f"Matching documents: {papers_to_display}")
-
-        # Sort the filtered papers
-        papers_to_display = sort_results(papers_to_display, sort_by)
-        logging.debug(f"Final results: {papers_to_display}")
-
-        return render_template('results.html', query=query, search_option=search_option,
-                               algorithm=algorithm, results=papers_to_display)
-
-
-def boolean_search(query, search_option, algorithm, paper_processed_data, paper_data, sort_by):
+        logging.info("Performing search with option: %s", search_option)
+
+        with stage('retrieval'):
+            if search_option == 'Authors':
+                logging.debug("Search option: Authors")
+                matching_documents = inverted_index_search(query, author_data, fuzzy, doc_filter)
+            elif search_option == 'Date':
+                logging.debug("Search option: Date")
+                matching_documents = inverted_index_search(query, date_data, fuzzy, doc_filter)
+            elif search_option == 'Abstract':
+                logging.debug("Search option: Abstract")
+                matching_documents = inverted_index_search(query, abstract_data, fuzzy, doc_filter)
+            elif search_option == 'Title':
+                logging.debug("Search option: Title")
+                matching_documents = inverted_index_search(query, title_data, fuzzy, doc_filter)
+            else:  # Default to 'all_fields' or any other case
+                logging.debug("Search option: all_fields")
+                matching_documents = inverted_index_search(query, author_data, fuzzy, doc_filter) + \
+                                     inverted_index_search(query, date_data, fuzzy, doc_filter) + \
+                                     inverted_index_search(query, abstract_data, fuzzy, doc_filter) + \
+                                     inverted_index_search(query, title_data, fuzzy, doc_filter)
+
+        # A document matching in several fields is listed once
+        matching_documents = list(dict.fromkeys(matching_documents))
+        logging.info("Matching documents: %d", len(matching_documents))
+        logging.debug("Matching documents: %s", matching_documents)
+
+        return matching_documents
+    return []
+
+
+def boolean_search(query, search_option, field_indexes, doc_count, fuzzy=False, doc_filter=None):
+    """
+    Perform Boolean search algorithm.
+
+    Parameters:
+    - query: User's search query with AND, OR, NOT operators and parentheses.
+    - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
+    - field_indexes: Inverted index of each field ('Authors', 'Date', 'Abstract', 'Title').
+    - doc_count: Number of documents in the corpus.
+    - fuzzy: Whether terms missing from the indexes match their closest indexed terms.
+    - doc_filter: Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - Sorted list of the IDs of the matching documents.
+    """
     logging.info("Entered boolean algorithm")
-    matching_documents = []
-    if 'AND' in query or 'OR' in query or 'NOT' in query:
-        split_query = re.split(r'(AND|OR|NOT)', query)
-        logging.info(f"Split query into terms and operators: {split_query}")
-        terms_and_operators = [term.strip() for term in split_query if term.strip()]
-
-        terms = []
-        operators = []
-        queries = []
-
-        for item in terms_and_operators:
-            if item in {'AND', 'OR', 'NOT'}:
-                operators.append(item)
-            else:
-                terms.append(item.lower().replace(" ", ""))
-        logging.debug(f"Query terms: {terms}")
-        logging.debug(f"Query operators: {operators}")
-        for i in range(1, len(terms)):
-            query_string = f"{terms[i - 1]} {operators[i - 1]} {terms[i]}"
-            queries.append(query_string)
-        logging.info(f"Generated queries: {queries}")
-
-        for query in queries:
-            if 'AND' in query:
-                terms = query.split(' AND ')
-                term1 = terms[0]
-                term2 = terms[1]
-                logging.debug(f"terms1: {term1}")
-                logging.debug(f"terms2: {term2}")
-
-                for paper in paper_processed_data:
-                    if search_option == 'all_fields':
-                        if term1 in paper['Title_processed'] or term1 in paper['Authors_processed'] or term1 in \
-                                paper[
-                                    'Abstract_processed'] or term1 in paper['Date_processed']:
-                            matching_documents.append(paper['ID'])
-                    else:
-                        if term1 in paper[f'{search_option}_processed']:
-                            matching_documents.append(paper['ID'])
-                # print(f"Matching documents term1{matching_documents}")
-                final_matching_documents = []
-                for paper_id in matching_documents:
-                    paper = paper_processed_data[
-                        paper_id - 1]
-                    if search_option == 'all_fields':
-                        if term2 in paper['Title_processed'] or term2 in paper['Authors_processed'] or term2 in \
-                                paper[
-                                    'Abstract_processed'] or term2 in paper['Date_processed']:
-                            final_matching_documents.append(paper_id)
-                    else:
-                        if term2 in paper[f'{search_option}_processed']:
-                            final_matching_documents.append(paper_id)
-
-                logging.info(f"Final matching documents: {final_matching_documents}")
-                papers_to_display = [paper_data[paper_id - 1] for paper_id in final_matching_documents]
-                logging.debug(f"papers_to_display: {papers_to_display}")
-                # Sort the filtered papers
-                papers_to_display = sort_results(papers_to_display, sort_by)
-                return render_template('results.html', query=query, search_option=search_option,
-                                       algorithm=algorithm, results=papers_to_display)
-            elif 'OR' in query:
-                terms = query.split(' OR ')
-                term1 = terms[0]
-                term2 = terms[1]
-                logging.debug(f"terms1: {term1}")
-                logging.debug(f"terms2: {term2}")
-
-                for paper in paper_processed_data:
-                    if term1 in paper['Title_processed'] or term1 in paper['Authors_processed'] or term1 in paper[
-                        'Abstract_processed'] or term1 in paper['Date_processed'] or term2 in paper[
-                        'Title_processed'] or term2 in paper['Authors_processed'] or term2 in paper[
-                        'Abstract_processed'] or term2 in paper['Date_processed']:
-                        matching_documents.append(paper['ID'])
-
-                if not matching_documents:
-                    for paper in paper_processed_data:
-                        if term2 in paper['Title_processed'] or term2 in paper['Authors_processed'] or term2 in \
-                                paper['Abstract_processed'] or term2 in paper['Date_processed']:
-                            matching_documents.append(paper['ID'])
-
-                logging.info(f"Final matching documents term1 OR term2: {matching_documents}")
-                final_matching_documents = []
-
-                for paper_id in matching_documents:
-                    paper = paper_processed_data[paper_id - 1]
-                    final_matching_documents.append(paper_id)
-                    logging.debug(f"Match found for term1 OR term2 in paper {paper_id}")
-
-                logging.info(f"Final matching documents: {final_matching_documents}")
-                papers_to_display = [paper_data[paper_id - 1] for paper_id in final_matching_documents]
-                logging.debug(f"papers_to_display: {papers_to_display}")
-                # Sort the filtered papers
-                papers_to_display = sort_results(papers_to_display, sort_by)
-                return render_template('results.html', query=query, search_option=search_option,
-                                       algorithm=algorithm, results=papers_to_display)
-            elif 'NOT' in query:
-                terms = query.split(' NOT ')
-                term1 = terms[0]
-                term2 = terms[1]
-                logging.debug(f"terms1: {term1}")
-                logging.debug(f"terms2: {term2}")
-
-                matching_documents_term1 = []
-
-                for paper in paper_processed_data:
-                    if term1 in paper['Title_processed'] or term1 in paper['Authors_processed'] or term1 in paper[
-                        'Abstract_processed'] or term1 in paper['Date_processed']:
-                        matching_documents_term1.append(paper['ID'])
-
-                matching_documents_term2 = []
-
-                for paper in paper_processed_data:
-                    if term2 in paper['Title_processed'] or term2 in paper['Authors_processed'] or term2 in paper[
-                        'Abstract_processed'] or term2 in paper['Date_processed']:
-                        matching_documents_term2.append(paper['ID'])
-
-                matching_documents = list(set(matching_documents_term1) - set(matching_documents_term2))
-                logging.info(f"Final matching documents term1 NOT term2: {matching_documents}")
-                final_matching_documents = []
-
-                for paper_id in matching_documents:
-                    paper = paper_processed_data[paper_id - 1]
-                    final_matching_documents.append(paper_id)
-                    logging.debug(f"Match found for term1 NOT term2 in paper {paper_id}")
-
-                logging.info(f"Final matching documents: {final_matching_documents}")
-                papers_to_display = [paper_data[paper_id - 1] for paper_id in final_matching_documents]
-                logging.debug(f"papers_to_display: {papers_to_display}")
-                # Sort the filtered papers
-                papers_to_display = sort_results(papers_to_display, sort_by)
-                return render_template('results.html', query=query, search_option=search_option,
-                                       algorithm=algorithm, results=papers_to_display)
 
-    else:
-        return []
+    inverted_indexes = selected_indexes(search_option, field_indexes)
+
+    matching_documents = boolean_query_search(query, inverted_indexes, doc_count, fuzzy, doc_filter)
+    logging.info("Final matching documents: %d", len(matching_documents))
+    return matching_documents
+
+
+def suggest_query(query, search_option, algorithm, field_indexes):
+    """
+    Suggests a spelling of a query whose terms are missing from the searched fields ("did you mean").
+
+    Parameters:
+    - query: User's search query.
+    - search_option: Search option ('all_fields' or specific field like 'Authors', 'Date', 'Abstract', 'Title').
+    - algorithm: The selected algorithm, which decides how the query is split into terms.
+    - field_indexes: Inverted index of each field ('Authors', 'Date', 'Abstract', 'Title').
+
+    Returns:
+    - The suggested query, or None if it has nothing to correct.
+    """
+    inverted_indexes = selected_indexes(search_option, field_indexes)
+    if algorithm == 'boolean':
+        return suggest_boolean_query(query, inverted_indexes)
+    if algorithm in ('vector_space', 'probabilistic', 'semantic'):
+        return suggest_query_words(query, inverted_indexes)
+    # Simple search looks the whole query up as one term
+    term = query.lower().replace(" ", "")
+    if WILDCARD in term:
+        return None
+    corrected = correction(term, inverted_indexes)
+    return corrected if corrected != term else None
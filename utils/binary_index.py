@@ -0,0 +1,416 @@
+import heapq
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+
+# File layout (all integers little endian):
+#   header          magic, format version, flags, term count
+#   offsets table   one u64 per term, pointing at its dictionary entry, then one u64 for the postings start
+#   dictionary      per term, sorted by UTF-8 bytes: varint length, term bytes,
+#                   varint document frequency, varint postings offset, varint postings length
+#                   and, in positional indexes, varint positions offset, varint positions length
+#   postings        per document: varint doc ID gap, varint term frequency
+#   positions       positional indexes only, per document: varint position count, varint position gaps
+# Positions are kept apart from the postings, so lookups that do not need them never decode them.
+MAGIC = b'SEIX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+OFFSET = struct.Struct('<Q')
+FLAG_POSITIONS = 0x1
+
+
+def encode_varint(value, buffer):
+    """
+    Appends an unsigned integer to a bytearray as a LEB128 varint.
+    """
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def decode_varint(data, position):
+    """
+    Reads a LEB128 varint.
+
+    Returns:
+    - tuple: (the decoded integer, the position after it).
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def encode_postings(documents, frequencies):
+    """
+    Delta and varint encodes a sorted postings list.
+    """
+    buffer = bytearray()
+    previous = 0
+    for doc, frequency in zip(documents, frequencies):
+        encode_varint(doc - previous, buffer)
+        encode_varint(frequency, buffer)
+        previous = doc
+    return buffer
+
+
+def encode_positions(positions):
+    """
+    Delta and varint encodes the sorted positions of a term in each of its documents.
+
+    The count is stored per document rather than taken from the term frequency, so documents indexed
+    without positions (an empty list) can be merged with positional ones.
+    """
+    buffer = bytearray()
+    for doc_positions in positions:
+        encode_varint(len(doc_positions), buffer)
+        previous = 0
+        for position in doc_positions:
+            encode_varint(position - previous, buffer)
+            previous = position
+    return buffer
+
+
+def binary_write(inverted_index, file_path):
+    """
+    Write an inverted index to a compact binary file. A failed write raises, leaving the file as it was.
+
+    Parameters:
+    - inverted_index (dict): Term to {'documents': [...], 'frequencies': [...]} with sorted documents, and
+      'positions' (the sorted positions of the term in each document) if the index is positional.
+    - file_path (str): The path to the binary index file.
+    """
+    # Written aside and renamed, so readers that still map the old file keep a consistent view
+    temp_path = f"{file_path}.tmp"
+    try:
+        terms = sorted(inverted_index, key=lambda term: term.encode('utf-8'))
+        positional = any('positions' in entry for entry in inverted_index.values())
+        encoded_postings = []
+        encoded_positions = []
+        for term in terms:
+            entry = inverted_index[term]
+            frequencies = entry.get('frequencies') or [1] * len(entry['documents'])
+            encoded_postings.append(encode_postings(entry['documents'], frequencies))
+            if positional:
+                encoded_positions.append(encode_positions(entry['positions']) if 'positions' in entry else b'')
+
+        dictionary = bytearray()
+        entry_offsets = []
+        # Offsets are relative to the start of the postings, the positions following every postings list
+        postings_offset = 0
+        positions_offset = sum(len(encoded) for encoded in encoded_postings)
+        for ordinal, term in enumerate(terms):
+            term_bytes = term.encode('utf-8')
+            entry_offsets.append(len(dictionary))
+            encode_varint(len(term_bytes), dictionary)
+            dictionary += term_bytes
+            encode_varint(len(inverted_index[term]['documents']), dictionary)
+            encode_varint(postings_offset, dictionary)
+            encode_varint(len(encoded_postings[ordinal]), dictionary)
+            postings_offset += len(encoded_postings[ordinal])
+            if positional:
+                encode_varint(positions_offset, dictionary)
+                encode_varint(len(encoded_positions[ordinal]), dictionary)
+                positions_offset += len(encoded_positions[ordinal])
+
+        dictionary_start = HEADER.size + OFFSET.size * (len(terms) + 1)
+        with open(temp_path, 'wb') as binary_file:
+            binary_file.write(HEADER.pack(MAGIC, VERSION, FLAG_POSITIONS if positional else 0, len(terms)))
+            for offset in entry_offsets:
+                binary_file.write(OFFSET.pack(dictionary_start + offset))
+            binary_file.write(OFFSET.pack(dictionary_start + len(dictionary)))  # Start of the postings
+            binary_file.write(dictionary)
+            for encoded in encoded_postings:
+                binary_file.write(encoded)
+            for encoded in encoded_positions:
+                binary_file.write(encoded)
+        os.replace(temp_path, file_path)
+        logging.info(f"Data written to {file_path}...")
+    except Exception as e:
+        logging.error(f"Error writing binary index to {file_path}: {e}")
+        remove_temp_file(temp_path)
+        raise
+
+
+def remove_temp_file(temp_path):
+    """
+    Removes the temporary file of a failed write, if it was created.
+    """
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+class BinaryIndex:
+    """
+    Read-only inverted index backed by a memory mapped binary index file.
+
+    Terms are found by binary search over the offsets table and postings are only decoded when a term
+    is looked up, so opening an index costs the same whatever its size. Lookups return the same
+    {'documents': [...], 'frequencies': [...]} entries as the JSON inverted indexes; positional lookups
+    add the 'positions' of the term in each document.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as binary_file:
+            self.data = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, self.term_count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{file_path} is not a version {VERSION} binary index")
+        self.postings_start = self.entry_offset(self.term_count)
+
+    @property
+    def has_positions(self):
+        return bool(self.flags & FLAG_POSITIONS)
+
+    def entry_offset(self, ordinal):
+        return OFFSET.unpack_from(self.data, HEADER.size + OFFSET.size * ordinal)[0]
+
+    def term_bytes(self, ordinal):
+        length, position = decode_varint(self.data, self.entry_offset(ordinal))
+        return self.data[position:position + length]
+
+    def term(self, ordinal):
+        """
+        Returns the term with the given position in the sorted term dictionary.
+        """
+        return self.term_bytes(ordinal).decode('utf-8')
+
+    def find(self, term):
+        """
+        Returns the position of a term in the sorted term dictionary, or -1 if it is not indexed.
+        """
+        target = term.encode('utf-8')
+        ordinal = bisect_left(range(self.term_count), target, key=self.term_bytes)
+        if ordinal < self.term_count and self.term_bytes(ordinal) == target:
+            return ordinal
+        return -1
+
+    def postings(self, ordinal, positions=False):
+        """
+        Decodes the postings of the term at the given position of the term dictionary.
+
+        Parameters:
+        - ordinal (int): Position of the term in the term dictionary.
+        - positions (bool): Also decode the positions of the term, if the index stores them.
+        """
+        length, position = decode_varint(self.data, self.entry_offset(ordinal))
+        position += length
+        doc_count, position = decode_varint(self.data, position)
+        start, position = decode_varint(self.data, position)
+        _, entry_position = decode_varint(self.data, position)
+        position = self.postings_start + start
+
+        documents = []
+        frequencies = []
+        doc = 0
+        for _ in range(doc_count):
+            gap, position = decode_varint(self.data, position)
+            frequency, position = decode_varint(self.data, position)
+            doc += gap
+            documents.append(doc)
+            frequencies.append(frequency)
+        entry = {'documents': documents, 'frequencies': frequencies}
+
+        if positions and self.has_positions:
+            start, entry_position = decode_varint(self.data, entry_position)
+            positions_length, _ = decode_varint(self.data, entry_position)
+            position = self.postings_start + start
+            entry['positions'] = []
+            for _ in range(doc_count if positions_length else 0):
+                count, position = decode_varint(self.data, position)
+                doc_positions = []
+                term_position = 0
+                for _ in range(count):
+                    gap, position = decode_varint(self.data, position)
+                    term_position += gap
+                    doc_positions.append(term_position)
+                entry['positions'].append(doc_positions)
+            if not positions_length:  # Term written without positions
+                entry['positions'] = [[] for _ in documents]
+        return entry
+
+    def get(self, term, default=None):
+        ordinal = self.find(term)
+        return self.postings(ordinal) if ordinal >= 0 else default
+
+    def get_positional(self, term, default=None):
+        """
+        Returns the postings of a term with its positions in each document.
+        """
+        ordinal = self.find(term)
+        return self.postings(ordinal, positions=True) if ordinal >= 0 else default
+
+    def document_frequency(self, term):
+        """
+        Returns the number of documents containing a term, read from the dictionary without decoding its postings.
+        """
+        ordinal = self.find(term)
+        if ordinal < 0:
+            return 0
+        length, position = decode_varint(self.data, self.entry_offset(ordinal))
+        return decode_varint(self.data, position + length)[0]
+
+    def __getitem__(self, term):
+        ordinal = self.find(term)
+        if ordinal < 0:
+            raise KeyError(term)
+        return self.postings(ordinal)
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def __len__(self):
+        return self.term_count
+
+    def __iter__(self):
+        return (self.term(ordinal) for ordinal in range(self.term_count))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((self.term(ordinal), self.postings(ordinal, positions=True)) for ordinal in range(self.term_count))
+
+    def close(self):
+        self.data.close()
+
+
+class SegmentedIndex:
+    """
+    Inverted index made of the binary index segments written by successive crawls.
+
+    Each crawl only appends documents with higher IDs than the previous ones, so the postings of a term
+    are the concatenation of its postings in every segment, oldest first.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.term_count = None
+        self.kgram_index = None  # K-gram index of the term dictionary, attached when there is one
+        self.fuzzy_index = None  # Deletion index of the term dictionary, attached when there is one
+
+    @property
+    def has_positions(self):
+        return any(segment.has_positions for segment in self.segments)
+
+    def get(self, term, default=None):
+        documents = []
+        frequencies = []
+        for segment in self.segments:
+            entry = segment.get(term)
+            if entry:
+                documents += entry['documents']
+                frequencies += entry['frequencies']
+        return {'documents': documents, 'frequencies': frequencies} if documents else default
+
+    def get_positional(self, term, default=None):
+        """
+        Returns the postings of a term with its positions; documents of segments without positions have none.
+        """
+        documents = []
+        frequencies = []
+        positions = []
+        for segment in self.segments:
+            entry = segment.get_positional(term)
+            if entry:
+                documents += entry['documents']
+                frequencies += entry['frequencies']
+                positions += entry.get('positions') or [[] for _ in entry['documents']]
+        return {'documents': documents, 'frequencies': frequencies, 'positions': positions} if documents else default
+
+    def document_frequency(self, term):
+        return sum(segment.document_frequency(term) for segment in self.segments)
+
+    def __getitem__(self, term):
+        entry = self.get(term)
+        if entry is None:
+            raise KeyError(term)
+        return entry
+
+    def __contains__(self, term):
+        return any(term in segment for segment in self.segments)
+
+    def __len__(self):
+        if self.term_count is None:
+            self.term_count = sum(1 for _ in self)
+        return self.term_count
+
+    def __iter__(self):
+        previous = None
+        for term in heapq.merge(*self.segments, key=lambda term: term.encode('utf-8')):
+            if term != previous:
+                yield term
+                previous = term
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        if self.has_positions:
+            return ((term, self.get_positional(term)) for term in self)
+        return ((term, self.get(term)) for term in self)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        if self.kgram_index is not None:
+            self.kgram_index.close()
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.close()
+
+
+def binary_read(file_path):
+    """
+        Open a binary index file.
+
+        Parameters:
+        - file_path (str): The path to the binary index file.
+
+        Returns:
+        - BinaryIndex: The memory mapped index.
+        """
+    try:
+        return BinaryIndex(file_path)
+    except FileNotFoundError:
+        logging.warning(f"File not found: {file_path}")
+        return None
+    except Exception as e:
+        logging.error(f"Error reading binary index from {file_path}: {e}")
+        return None
+
+
+def segments_read(file_paths):
+    """
+        Open the binary index segments of a field as one index.
+
+        Parameters:
+        - file_paths (list): Paths of the segment files, oldest first.
+
+        Returns:
+        - SegmentedIndex: The index over the segments.
+
+        Raises:
+        - FileNotFoundError: If a segment is missing, since the index would silently lack its documents.
+        """
+    segments = []
+    try:
+        for file_path in file_paths:
+            segments.append(BinaryIndex(file_path))
+    except Exception as e:
+        logging.error(f"Error reading binary index from {file_path}: {e}")
+        for segment in segments:
+            segment.close()
+        raise
+    return SegmentedIndex(segments)
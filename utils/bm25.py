@@ -0,0 +1,170 @@
+import math
+
+from utils.enums import BM25Config, BM25FConfig
+from utils.metrics import stage
+
+
+def merged_postings(term, inverted_indexes):
+    """
+    Collects the postings of a term over one or more inverted indexes.
+
+    Parameters:
+    - term (str): The query term.
+    - inverted_indexes (list): Inverted indexes to read the term from.
+
+    Returns:
+    - dict: Document ID to term frequency, summed over the given indexes.
+    """
+    postings = {}
+    for inverted_index in inverted_indexes:
+        entry = inverted_index.get(term)
+        if entry:
+            for doc, frequency in zip(entry['documents'], entry['frequencies']):
+                postings[doc] = postings.get(doc, 0) + frequency
+    return postings
+
+
+def bm25_idf(doc_count, document_frequency):
+    """
+    Returns the IDF of a term, never negative so that very common terms never lower a score.
+    """
+    return math.log((doc_count - document_frequency + 0.5) / (document_frequency + 0.5) + 1)
+
+
+def add_bm25_scores(scores, documents, frequencies, idf, doc_lengths, avgdl, first_doc=0, doc_filter=None):
+    """
+    Adds the BM25 score of one query term to the scores of the documents containing it.
+
+    Parameters:
+    - scores (dict): Document ID to its score so far, updated in place.
+    - documents: IDs of the documents containing the term.
+    - frequencies: Frequency of the term in each of them.
+    - idf (float): IDF of the term.
+    - doc_lengths: Length of every document, indexed by document ID minus first_doc.
+    - avgdl (float): Average document length.
+    - first_doc (int): ID of the document whose length comes first.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID;
+      the other documents are skipped before scoring.
+    """
+    k1 = BM25Config.K1.value
+    b = BM25Config.B.value
+    for doc, frequency in zip(documents, frequencies):
+        if doc_filter is not None and not doc_filter[doc]:
+            continue
+        norm = k1 * (1 - b + b * doc_lengths[doc - first_doc] / avgdl)
+        scores[doc] = scores.get(doc, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+
+def bm25_scores(query_terms, inverted_indexes, field_stats, postings_cache=None, doc_filter=None):
+    """
+    Scores documents with BM25, term at a time, touching only the postings of the query terms.
+
+    Parameters:
+    - query_terms (list): Query terms; repeated terms are counted again, like BM25Okapi.
+    - inverted_indexes (list): Inverted indexes holding the postings of the searched field(s).
+    - field_stats (dict): 'doc_count', 'avgdl' and 'doc_lengths' of the searched field(s).
+    - postings_cache (dict): Merged postings by term, filled and reused across calls on the same indexes.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - dict: Document ID to BM25 score, for documents containing at least one query term.
+    """
+    doc_count = field_stats['doc_count']
+    avgdl = field_stats['avgdl'] or 1.0
+    doc_lengths = field_stats['doc_lengths']
+
+    with stage('retrieval'):
+        if postings_cache is None:
+            term_postings = [merged_postings(term, inverted_indexes) for term in query_terms]
+        else:
+            for term in query_terms:
+                if term not in postings_cache:
+                    postings_cache[term] = merged_postings(term, inverted_indexes)
+            term_postings = [postings_cache[term] for term in query_terms]
+
+    scores = {}
+    with stage('scoring'):
+        for postings in term_postings:
+            if not postings:
+                continue
+            # The IDF stays the one of the whole corpus, the filter only removes documents
+            add_bm25_scores(scores, postings.keys(), postings.values(), bm25_idf(doc_count, len(postings)),
+                            doc_lengths, avgdl, doc_filter=doc_filter)
+    return scores
+
+
+def add_bm25f_scores(scores, field_postings, idf, doc_lengths, avgdls, first_doc=0, doc_filter=None):
+    """
+    Adds the BM25F score of one query term to the scores of the documents containing it in any field.
+
+    The frequencies of the term in the fields of a document are normalized by the length of each field
+    and weighted by field, then summed and saturated once, so a term repeated over several fields does
+    not count as several terms and a title occurrence outweighs an abstract one.
+
+    Parameters:
+    - scores (dict): Document ID to its score so far, updated in place.
+    - field_postings (list): (field, documents, frequencies) of the term in every field containing it.
+    - idf (float): IDF of the term, from the documents containing it in any field.
+    - doc_lengths (dict): Field to the length of every document, indexed by document ID minus first_doc.
+    - avgdls (dict): Field to its average document length.
+    - first_doc (int): ID of the document whose length comes first.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+    """
+    k1 = BM25Config.K1.value
+    weighted = {}
+    for field, documents, frequencies in field_postings:
+        weight = BM25FConfig.WEIGHTS.value.get(field, 1.0)
+        b = BM25FConfig.B.value.get(field, BM25Config.B.value)
+        lengths = doc_lengths[field]
+        avgdl = avgdls[field] or 1.0
+        for doc, frequency in zip(documents, frequencies):
+            if doc_filter is not None and not doc_filter[doc]:
+                continue
+            weighted[doc] = weighted.get(doc, 0.0) + \
+                weight * frequency / (1 - b + b * lengths[doc - first_doc] / avgdl)
+    for doc, frequency in weighted.items():
+        scores[doc] = scores.get(doc, 0.0) + idf * frequency * (k1 + 1) / (frequency + k1)
+
+
+def bm25f_scores(query_terms, field_indexes, bm25_index, postings_cache=None, doc_filter=None):
+    """
+    Scores documents with BM25F over the inverted index of every field, term at a time.
+
+    Parameters:
+    - query_terms (list): Query terms; repeated terms are counted again.
+    - field_indexes (dict): Field name to its inverted index.
+    - bm25_index (dict): BM25 statistics of every field and of 'all_fields'.
+    - postings_cache (dict): Postings of every field by term, filled and reused across calls on the same indexes.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - dict: Document ID to BM25F score, for documents containing at least one query term.
+    """
+    doc_count = bm25_index['all_fields']['doc_count']
+    doc_lengths = {field: bm25_index[field]['doc_lengths'] for field in field_indexes}
+    avgdls = {field: bm25_index[field]['avgdl'] for field in field_indexes}
+
+    with stage('retrieval'):
+        term_postings = []
+        for term in query_terms:
+            if postings_cache is None or term not in postings_cache:
+                postings = []
+                for field, inverted_index in field_indexes.items():
+                    entry = inverted_index.get(term)
+                    if entry:
+                        postings.append((field, entry['documents'], entry['frequencies']))
+                if postings_cache is not None:
+                    postings_cache[term] = postings
+            else:
+                postings = postings_cache[term]
+            term_postings.append(postings)
+
+    scores = {}
+    with stage('scoring'):
+        for postings in term_postings:
+            if not postings:
+                continue
+            document_frequency = len(set().union(*(documents for _, documents, _ in postings)))
+            add_bm25f_scores(scores, postings, bm25_idf(doc_count, document_frequency), doc_lengths, avgdls,
+                             doc_filter=doc_filter)
+    return scores
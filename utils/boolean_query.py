@@ -0,0 +1,373 @@
+import re
+from bisect import bisect_left, bisect_right
+
+from crawler.preprocess import analyze_query
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.fuzzy_index import correction, fuzzy_expansions, is_known
+from utils.kgram_index import WILDCARD, wildcard_documents
+from utils.metrics import stage
+from utils.postings import intersect, difference, union
+
+OPERATORS = {'AND', 'OR', 'NOT'}
+TOKEN_PATTERN = re.compile(r'("[^"]*"|\bNEAR/\d+\b|\bAND\b|\bOR\b|\bNOT\b|\(|\))')
+
+
+def tokenize(query):
+    """
+    Splits a Boolean query into operators, parentheses, quoted phrases and terms.
+
+    Words between two operators form one term, lowercased and joined like the indexed author names
+    and dates ('10 January 2024' becomes '10january2024'). A term with '*' is a wildcard pattern.
+    The raw text of a term is kept for when it is an operand of NEAR.
+
+    Parameters:
+    - query (str): The raw Boolean query.
+
+    Returns:
+    - list: Tokens of the query.
+    """
+    tokens = []
+    for part in TOKEN_PATTERN.split(query):
+        part = part.strip()
+        if part in OPERATORS or part in ('(', ')') or part.startswith('NEAR/'):
+            tokens.append(part)
+        elif len(part) > 1 and part[0] == part[-1] == '"':
+            tokens.append(('PHRASE', part[1:-1]))
+        elif '"' in part:
+            raise InvalidQueryException("Missing closing quote in the query.")
+        elif part:
+            term = part.lower().replace(" ", "")
+            tokens.append(('WILDCARD' if WILDCARD in term else 'TERM', term, part))
+    return tokens
+
+
+class BooleanParser:
+    """
+    Recursive descent parser for Boolean queries.
+
+    Precedence from lowest to highest is OR, AND, NOT, NEAR/k. 'a NOT b' is read as 'a AND NOT b' and
+    parentheses group sub-expressions. Quoted phrases match consecutive words and 'a NEAR/k b' matches
+    a and b at most k positions apart, in either order; the operands of NEAR are terms, phrases or
+    other NEAR expressions. The words of terms, phrases and NEAR operands are preprocessed like the
+    indexed titles and abstracts.
+
+    The parse tree is made of tuples: ('TERM', term, raw text, preprocessed words), ('WILDCARD', pattern, raw text),
+    ('PHRASE', words), ('NEAR', k, left, right),
+    ('NOT', node), ('AND', [nodes]) and ('OR', [nodes]). A ('DOCUMENTS', sorted IDs) node, never parsed,
+    restricts a query to given documents.
+    """
+
+    def __init__(self, query, analyzer=analyze_query):
+        self.tokens = tokenize(query or '')
+        self.position = 0
+        self.analyzer = analyzer
+
+    def parse(self):
+        if not self.tokens:
+            raise InvalidQueryException("The query is empty.")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise InvalidQueryException(f"Unexpected '{self.describe(self.peek())}' in the query.")
+        return node
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def advance(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    @staticmethod
+    def describe(token):
+        return token[1] if isinstance(token, tuple) else token
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.advance()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('OR', nodes)
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() in ('AND', 'NOT'):
+            if self.advance() == 'AND':
+                node = ('AND', [node, self.parse_not()])
+            else:
+                node = ('AND', [node, ('NOT', self.parse_not())])
+        return node
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.advance()
+            return ('NOT', self.parse_not())
+        return self.parse_near()
+
+    def parse_near(self):
+        node = self.parse_primary()
+        while isinstance(self.peek(), str) and self.peek().startswith('NEAR/'):
+            distance = int(self.advance()[len('NEAR/'):])
+            if distance < 1:
+                raise InvalidQueryException("The distance of NEAR must be at least 1.")
+            node = ('NEAR', distance, self.proximity_operand(node), self.proximity_operand(self.parse_primary()))
+        return node
+
+    def phrase(self, text):
+        words = tuple(self.analyzer(text))
+        if not words:
+            raise InvalidQueryException(f"'{text}' has no searchable words.")
+        return ('PHRASE', words)
+
+    def proximity_operand(self, node):
+        if node[0] == 'TERM':
+            return self.phrase(node[2])
+        if node[0] in ('PHRASE', 'NEAR'):
+            return node
+        raise InvalidQueryException("NEAR only applies to terms and phrases.")
+
+    def parse_primary(self):
+        token = self.advance()
+        if token == '(':
+            node = self.parse_or()
+            if self.advance() != ')':
+                raise InvalidQueryException("Missing closing parenthesis in the query.")
+            return node
+        if isinstance(token, tuple):
+            if token[0] == 'PHRASE':
+                return self.phrase(token[1])
+            if token[0] == 'TERM':
+                return token + (tuple(self.analyzer(token[2])),)
+            return token
+        if token is None:
+            raise InvalidQueryException("The query ends with an operator.")
+        raise InvalidQueryException(f"Unexpected '{token}' in the query.")
+
+
+def flatten_and(node):
+    """
+    Collects the operands of nested AND nodes so they can be intersected shortest first.
+    """
+    if node[0] == 'AND':
+        return [operand for child in node[1] for operand in flatten_and(child)]
+    return [node]
+
+
+def term_positions(inverted_index, word):
+    """
+    Returns document ID to the positions of a word, for the documents of a positional index containing it.
+    """
+    entry = inverted_index.get_positional(word)
+    return dict(zip(entry['documents'], entry['positions'])) if entry else {}
+
+
+def phrase_spans(words, inverted_index):
+    """
+    Finds the occurrences of a phrase by positional intersection of the postings of its words.
+
+    Documents are first intersected on their IDs, then a start position is kept only if every
+    following word of the phrase occurs right after it.
+
+    Returns:
+    - dict: Document ID to the sorted (first, last) positions of each occurrence.
+    """
+    postings = [term_positions(inverted_index, word) for word in words]
+    if not all(postings):
+        return {}
+    documents = sorted(min(postings, key=len))
+    for word_postings in postings:
+        documents = intersect(documents, sorted(word_postings))
+
+    spans = {}
+    for doc in documents:
+        starts = set(postings[0][doc])
+        for offset, word_postings in enumerate(postings[1:], start=1):
+            starts.intersection_update(position - offset for position in word_postings[doc])
+            if not starts:
+                break
+        if starts:
+            spans[doc] = [(start, start + len(words) - 1) for start in sorted(starts)]
+    return spans
+
+
+def proximity_spans(node, inverted_index):
+    """
+    Finds the occurrences of a phrase or NEAR expression in a positional index.
+
+    Two occurrences are near if they do not overlap and at most 'distance' positions separate the end
+    of the first from the start of the second; their union is an occurrence of the NEAR expression.
+
+    Returns:
+    - dict: Document ID to the sorted (first, last) positions of each occurrence.
+    """
+    if node[0] == 'PHRASE':
+        return phrase_spans(node[1], inverted_index)
+
+    _, distance, left, right = node
+    left_spans = proximity_spans(left, inverted_index)
+    right_spans = proximity_spans(right, inverted_index) if left_spans else {}
+    spans = {}
+    for doc in intersect(sorted(left_spans), sorted(right_spans)):
+        candidates = right_spans[doc]
+        starts = [start for start, _ in candidates]
+        longest = max(end - start for start, end in candidates)
+        matches = set()
+        for start, end in left_spans[doc]:
+            # Only right occurrences starting in this window can be near the left one
+            for other_start, other_end in candidates[bisect_left(starts, start - distance - longest):
+                                                    bisect_right(starts, end + distance)]:
+                gap = max(other_start - end, start - other_end)
+                if 1 <= gap <= distance:
+                    matches.add((min(start, other_start), max(end, other_end)))
+        if matches:
+            spans[doc] = sorted(matches)
+    return spans
+
+
+def positional_documents(node, inverted_index):
+    """
+    Returns the sorted IDs of the documents of one index matching a phrase or NEAR expression.
+
+    Indexes without positions store multi-word values such as author names as one joined term, so a
+    phrase matches that term there, and NEAR does not match.
+    """
+    if getattr(inverted_index, 'has_positions', False):
+        return sorted(proximity_spans(node, inverted_index))
+    if node[0] == 'PHRASE':
+        return inverted_index.get(''.join(node[1]), {}).get('documents', [])
+    return []
+
+
+def term_documents(node, inverted_index):
+    """
+    Returns the sorted IDs of the documents of one index matching a term.
+
+    Indexes without positions hold author names and dates joined into one term, so the term is looked
+    up as typed. Titles and abstracts are indexed preprocessed, so the term is looked up as its
+    preprocessed words, consecutive like a phrase if there are several.
+    """
+    _, term, _, words = node
+    if not getattr(inverted_index, 'has_positions', False):
+        return inverted_index.get(term, {}).get('documents', [])
+    if len(words) == 1:
+        return inverted_index.get(words[0], {}).get('documents', [])
+    return sorted(phrase_spans(words, inverted_index)) if words else []
+
+
+def evaluate(node, inverted_indexes, doc_count):
+    """
+    Evaluates a parsed Boolean query over sorted postings lists.
+
+    Parameters:
+    - node (tuple): The parse tree from BooleanParser.
+    - inverted_indexes (list): Inverted indexes of the searched field(s); a term matches in any of them.
+    - doc_count (int): Number of documents, used to complement a leading NOT.
+
+    Returns:
+    - list: Sorted IDs of the matching documents.
+    """
+    kind = node[0]
+    if kind == 'TERM':
+        return union(*(term_documents(node, inverted_index) for inverted_index in inverted_indexes))
+    if kind == 'DOCUMENTS':
+        return node[1]
+    if kind == 'WILDCARD':
+        return union(*(wildcard_documents(node[1], inverted_index) for inverted_index in inverted_indexes))
+    if kind in ('PHRASE', 'NEAR'):
+        # A phrase or NEAR expression has to match within a single field
+        return union(*(positional_documents(node, inverted_index) for inverted_index in inverted_indexes))
+    if kind == 'OR':
+        return union(*(evaluate(child, inverted_indexes, doc_count) for child in node[1]))
+    if kind == 'AND':
+        operands = flatten_and(node)
+        # Negated operands are subtracted from the intersection of the positive ones
+        positives = [evaluate(operand, inverted_indexes, doc_count) for operand in operands if operand[0] != 'NOT']
+        negatives = [operand[1] for operand in operands if operand[0] == 'NOT']
+        if not positives:
+            positives = [list(range(doc_count))]
+        positives.sort(key=len)
+        matching = positives[0]
+        for postings in positives[1:]:
+            if not matching:
+                break
+            matching = intersect(matching, postings)
+        for negative in negatives:
+            if not matching:
+                break
+            matching = difference(matching, evaluate(negative, inverted_indexes, doc_count))
+        return matching
+    if kind == 'NOT':
+        return difference(list(range(doc_count)), evaluate(node[1], inverted_indexes, doc_count))
+    raise InvalidQueryException(f"Unknown query node '{kind}'.")
+
+
+def expand_fuzzy(node, inverted_indexes):
+    """
+    Rewrites every term missing from the indexes into the OR of its closest indexed terms.
+
+    Wildcards, phrases and NEAR expressions are left as they are.
+    """
+    kind = node[0]
+    if kind == 'TERM':
+        if node[3] and all(is_known(word, inverted_indexes) for word in node[3]):
+            return node
+        expansions = fuzzy_expansions(node[1], inverted_indexes)
+        # The expansions are indexed terms, looked up as they are
+        return node if expansions == [node[1]] else ('OR', [('TERM', term, term, (term,)) for term in expansions])
+    if kind in ('AND', 'OR'):
+        return (kind, [expand_fuzzy(child, inverted_indexes) for child in node[1]])
+    if kind == 'NOT':
+        return ('NOT', expand_fuzzy(node[1], inverted_indexes))
+    return node
+
+
+def suggest_boolean_query(query, inverted_indexes):
+    """
+    Suggests a spelling of a Boolean query, each term missing from the indexes replaced by its most likely spelling.
+
+    Operators, phrases and wildcards are kept as they are.
+
+    Returns:
+    - str: The suggested query, or None if every term is indexed or has no close term.
+    """
+    parts = TOKEN_PATTERN.split(query)
+    changed = False
+    for position, part in enumerate(parts):
+        text = part.strip()
+        if not text or text in OPERATORS or text in ('(', ')') or text.startswith('NEAR/') or '"' in text:
+            continue
+        term = text.lower().replace(" ", "")
+        words = analyze_query(text)
+        if WILDCARD in term or words and all(is_known(word, inverted_indexes) for word in words):
+            continue
+        corrected = correction(term, inverted_indexes)
+        if corrected != term:
+            parts[position] = part.replace(text, corrected)
+            changed = True
+    return ''.join(parts) if changed else None
+
+
+def boolean_query_search(query, inverted_indexes, doc_count, fuzzy=False, doc_filter=None):
+    """
+    Parses and evaluates a Boolean query.
+
+    Parameters:
+    - query (str): The raw Boolean query, e.g. 'python AND (java OR NOT 10 January 2024)' or
+      '"graph neural network" AND molecule NEAR/5 generation'.
+    - inverted_indexes (list): Inverted indexes of the searched field(s).
+    - doc_count (int): Number of documents in the corpus.
+    - fuzzy (bool): Whether terms missing from the indexes match their closest indexed terms.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - list: Sorted IDs of the matching documents.
+    """
+    with stage('parse'):
+        tree = BooleanParser(query).parse()
+        if fuzzy:
+            tree = expand_fuzzy(tree, inverted_indexes)
+        if doc_filter is not None:
+            # Intersected shortest first like any operand, a narrow filter drives the evaluation
+            tree = ('AND', [('DOCUMENTS', doc_filter.nonzero()[0].tolist()), tree])
+    with stage('retrieval'):
+        return evaluate(tree, inverted_indexes, doc_count)
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.enums import CacheConfig
+
+
+def normalize_query(query, algorithm):
+    """
+    Normalizes a query so that equivalent spellings share a cache entry.
+
+    Whitespace is collapsed for every algorithm. Boolean queries keep their case, since the operators
+    are upper case; the other algorithms lowercase the query anyway.
+
+    Parameters:
+    - query (str): User's search query.
+    - algorithm (str): The selected retrieval algorithm.
+
+    Returns:
+    - str: The normalized query.
+    """
+    query = ' '.join((query or '').split())
+    return query if algorithm == 'boolean' else query.lower()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of rankings (document IDs and scores), with a time to live per entry.
+
+    Entries belong to the index version they were computed on. The first lookup with a newer version
+    empties the cache, and requests still running on an older snapshot bypass it.
+    """
+
+    def __init__(self, max_size=CacheConfig.MAX_SIZE.value, ttl=CacheConfig.TTL.value):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def check_version(self, version):
+        """
+        Empties the cache if the version is newer than its entries. Must be called with the lock held.
+
+        Returns:
+        - bool: Whether the cache holds entries of this version.
+        """
+        if self.version is None or version > self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+        return version == self.version
+
+    def get(self, version, key):
+        """
+        Returns the cached ranking of a query, or None.
+
+        Parameters:
+        - version (int): Index version the request is served from.
+        - key (tuple): The normalized query and its search options.
+        """
+        with self.lock:
+            if not self.check_version(version):
+                self.misses += 1
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            ranking, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ranking
+
+    def put(self, version, key, ranking):
+        """
+        Caches the ranking of a query, evicting the least recently used entries beyond the maximum size.
+        """
+        with self.lock:
+            if not self.check_version(version):
+                return
+            self.entries[key] = (ranking, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Returns the counters of the cache, to size it.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
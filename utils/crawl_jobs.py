@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from exceptions.crawl_queue_full_exception import CrawlQueueFullException
+from exceptions.no_paper_exception import NoPapersFoundException
+from utils.enums import CrawlJobConfig
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class CrawlJob:
+    """
+    One crawl submitted to the CrawlJobManager, with its status and progress.
+
+    The status goes from 'queued' to 'running' and ends as 'succeeded' or 'failed'. While running,
+    'stage' tells which part of the crawl is in progress ('fetching', 'indexing' or 'saving').
+    """
+
+    def __init__(self, query, max_results, merge):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.max_results = max_results
+        self.merge = merge
+        self.status = 'queued'
+        self.stage = None
+        self.papers_found = 0
+        self.new_papers = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def key(self):
+        return crawl_key(self.query, self.max_results, self.merge)
+
+    def update(self, stage, papers_found=None, new_papers=None):
+        """
+        Records the progress reported by the crawler.
+        """
+        self.stage = stage
+        if papers_found is not None:
+            self.papers_found = papers_found
+        if new_papers is not None:
+            self.new_papers = new_papers
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'query': self.query,
+            'max_results': self.max_results,
+            'merge': self.merge,
+            'status': self.status,
+            'stage': self.stage,
+            'papers_found': self.papers_found,
+            'new_papers': self.new_papers,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def crawl_key(query, max_results, merge):
+    """
+    Identifies the crawls that would fetch the same papers: queries differing in case or whitespace only
+    are the same arXiv search.
+    """
+    return ' '.join((query or '').lower().split()), max_results, merge
+
+
+class CrawlJobManager:
+    """
+    Runs crawls in a bounded pool of background threads, so that a crawl never holds up a request.
+
+    A crawl submitted while the same crawl is queued or running joins that job instead of starting
+    another. At most max_queued jobs wait for a worker; further submissions are refused. Finished jobs
+    are kept for status lookups, the oldest ones being dropped past max_finished.
+    """
+
+    def __init__(self, run_crawl, workers=CrawlJobConfig.WORKERS.value, max_queued=CrawlJobConfig.MAX_QUEUED.value,
+                 max_finished=CrawlJobConfig.MAX_FINISHED.value):
+        """
+        Parameters:
+        - run_crawl (callable): Runs one crawl, called with the job's query, max_results, merge and a
+          progress callback taking (stage, papers_found, new_papers).
+        - workers (int): Crawls run at the same time.
+        - max_queued (int): Crawls waiting for a worker before submissions are refused.
+        - max_finished (int): Finished jobs kept for status lookups.
+        """
+        self.run_crawl = run_crawl
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawl')
+        self.jobs = OrderedDict()
+        self.active = {}  # Crawl key to its queued or running job
+        self.lock = threading.Lock()
+
+    def submit(self, query, max_results, merge=True):
+        """
+        Queues a crawl, or joins the same crawl if it is already queued or running.
+
+        Returns:
+        - tuple: (the CrawlJob, whether it is a new job).
+
+        Raises:
+        - CrawlQueueFullException: If max_queued crawls are already waiting.
+        """
+        key = crawl_key(query, max_results, merge)
+        with self.lock:
+            job = self.active.get(key)
+            if job is not None:
+                logging.info(f"Crawl {query} joins job {job.id}.")
+                return job, False
+            if sum(job.status == 'queued' for job in self.active.values()) >= self.max_queued:
+                raise CrawlQueueFullException()
+            job = CrawlJob(query, max_results, merge)
+            self.jobs[job.id] = job
+            self.active[key] = job
+        logging.info(f"Queued crawl job {job.id}: {query}, max_results: {max_results}, merge: {merge}")
+        self.executor.submit(self.run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            self.run_crawl(job.query, job.max_results, job.merge, job.update)
+            job.status = 'succeeded'
+        except NoPapersFoundException as e:
+            job.status = 'failed'
+            job.error = e.message
+        except Exception as e:
+            logging.error(f"Crawl job {job.id} failed: {str(e)}")
+            job.status = 'failed'
+            job.error = "An error occurred during crawling. Please try again later."
+        job.finished_at = time.time()
+        logging.info(f"Crawl job {job.id} {job.status}.")
+        with self.lock:
+            del self.active[job.key()]
+            self.drop_finished()
+
+    def drop_finished(self):
+        """
+        Forgets the oldest finished jobs past max_finished. Must be called with the lock held.
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def counts(self):
+        """
+        Returns:
+        - dict: Number of jobs known in each status.
+        """
+        with self.lock:
+            counts = dict.fromkeys(ACTIVE_STATUSES + ('succeeded', 'failed'), 0)
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return counts
@@ -1,20 +1,144 @@
+import os
 from enum import Enum
 
 
 class Paths(Enum):
     # LOG path
     LOGS_APP_PATH = 'logs/app.log'
+    PROFILES_PATH = 'logs/profiles'
 
-    # JSON files path
+    # Data files path
     PAPERS_PATH = 'data/papers.json'
     PAPERS_PREPROCESSED_PATH = 'data/papers_preprocessed.json'
-    INVERTED_INDEX_AUTHORS_PATH = 'data/inverted_index_authors.json'
-    INVERTED_INDEX_ABSTRACT_PATH = 'data/inverted_index_abstract.json'
-    INVERTED_INDEX_DATE_PATH = 'data/inverted_index_date.json'
-    INVERTED_INDEX_TITLE_PATH = 'data/inverted_index_title.json'
+    MANIFEST_PATH = 'data/manifest.json'
+    INVERTED_INDEX_AUTHORS_PATH = 'data/inverted_index_authors.bin'
+    INVERTED_INDEX_ABSTRACT_PATH = 'data/inverted_index_abstract.bin'
+    INVERTED_INDEX_DATE_PATH = 'data/inverted_index_date.bin'
+    INVERTED_INDEX_TITLE_PATH = 'data/inverted_index_title.bin'
+    KGRAM_INDEX_PATH = 'data/kgram_index.bin'  # One file per field, e.g. data/kgram_index.authors.bin
+    FUZZY_INDEX_PATH = 'data/fuzzy_index.bin'  # One file per field, e.g. data/fuzzy_index.authors.bin
+
+    # Model files path
+    VECTOR_INDEX_PATH = 'data/vector_index.joblib'
+    BM25_INDEX_PATH = 'data/bm25_index.json'
+    SORT_COLUMNS_PATH = 'data/sort_columns.npz'
+    SEMANTIC_INDEX_PATH = 'data/semantic_index.npz'
+    SCORE_INDEX_PATH = 'data/score_index.joblib'
+    SHARDS_PATH = 'data/shards'  # One directory per index version and shard, e.g. data/shards/3/0
+    INDEX_LOCK_PATH = 'data/index.lock'  # Held by the process writing a new index version
+
+    # Benchmark results path
+    BENCHMARK_RESULTS_PATH = 'benchmarks/results'
 
 
 class ArxivConfig(Enum):
     BASE_URL = "https://arxiv.org/search/"
     DEFAULT_VALUE = 100
     QUERY = 'python'
+    PAGE_SIZE = 200  # Largest result page the listing serves
+    MAX_CONNECTIONS = 4  # Pages fetched concurrently
+    REQUESTS_PER_SECOND = 1.0
+    RETRIES = 3
+    BACKOFF_FACTOR = 0.5  # Seconds, doubled after every failed attempt
+    TIMEOUT = 30  # Seconds
+
+
+class SearchConfig(Enum):
+    TOP_K = 100
+    PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 100
+    MAX_BATCH_SIZE = 1000  # Queries per /api/search/batch request
+    API_FIELDS = ('ID', 'Title', 'Date')  # Paper fields returned by the JSON API by default
+
+
+class IndexConfig(Enum):
+    MAX_SEGMENTS = 8
+    RELOAD_INTERVAL = 2  # Seconds between checks of the manifest for a new index version
+
+
+class KGramConfig(Enum):
+    K = 3
+    MAX_EXPANSIONS = 1000  # Terms a wildcard may match
+
+
+class FuzzyConfig(Enum):
+    MAX_DISTANCE = 2  # Edits (insertion, deletion, substitution, transposition) a misspelling may contain
+    PREFIX_LENGTH = 7  # Leading characters of a term its deletes are generated from
+    MIN_TERM_LENGTH = 3  # Shorter query terms are never corrected
+    MAX_EXPANSIONS = 10  # Closest terms a misspelled query term is expanded to
+
+
+class SemanticConfig(Enum):
+    DIMENSIONS = 100  # Size of the word embeddings
+    WINDOW = 5  # Context words on each side of a word when training
+    MIN_COUNT = 1  # Occurrences a word needs to get an embedding
+    EPOCHS = 10
+    SEED = 13  # Makes training reproducible, on a single thread; None trains on CrawlerConfig.WORKERS threads
+    SIF_WEIGHT = 1e-3  # Smooth inverse frequency weight of a word: a / (a + p(word))
+    KMEANS_ITERATIONS = 10
+    NPROBE = 16  # Inverted lists scanned per query by default: more means better recall and slower queries
+    MAX_NPROBE = 1024
+    # A crawl adds its papers to the existing embeddings and inverted lists, unless they drifted too far from the
+    # corpus: it grew this many times over since they were trained, or this share of the new words is unknown
+    RETRAIN_GROWTH = 2.0
+    RETRAIN_UNKNOWN_WORDS = 0.05
+
+
+class PruningConfig(Enum):
+    BLOCK_SIZE = 256  # Document IDs per block of the score index, each block storing its maximum score per term
+    MIN_POSTINGS = 50000  # Postings a query reads before block-max pruning is used instead of exhaustive scoring
+
+
+class ShardConfig(Enum):
+    # Document shards written by the crawler, each searched by its own process; 1 keeps a single index
+    SHARDS = int(os.environ.get('SEARCH_ENGINE_SHARDS', '1'))
+
+
+class CrawlerConfig(Enum):
+    WORKERS = os.cpu_count() or 1  # Processes used to preprocess and index large crawls
+    CHUNK_SIZE = 250  # Papers preprocessed and indexed per task
+
+
+class CrawlJobConfig(Enum):
+    WORKERS = 1  # Crawls running at the same time; they write the same index files, so one at a time
+    MAX_QUEUED = 16  # Crawls waiting for a worker before new ones are refused
+    MAX_FINISHED = 100  # Finished crawl jobs kept for status lookups
+    STATUS_REFRESH = 2  # Seconds between reloads of the status page of a queued or running crawl
+
+
+class PreprocessConfig(Enum):
+    LEMMA_CACHE_SIZE = 50000
+
+
+class CacheConfig(Enum):
+    MAX_SIZE = 1024  # Cached rankings
+    TTL = 600  # Seconds
+
+
+class BM25Config(Enum):
+    K1 = 1.5
+    B = 0.75
+
+
+class BM25FConfig(Enum):
+    # 'all_fields' scoring (BM25F): weight of a term occurrence in each field, relative to the abstract,
+    WEIGHTS = {'Title': 3.0, 'Authors': 2.0, 'Abstract': 1.0, 'Date': 1.0}
+    # and length normalization of each field, from 0 (length ignored) to 1 (tf divided by relative length)
+    B = {'Title': 0.5, 'Authors': 0.3, 'Abstract': 0.75, 'Date': 0.0}
+
+
+class BenchmarkConfig(Enum):
+    SIZES = (1000, 10000, 100000)  # Papers per synthetic corpus
+    QUERIES = 200  # Queries timed per algorithm and search option
+    WARMUP_QUERIES = 10
+    VOCABULARY_SIZE = 50000
+    ZIPF_EXPONENT = 1.07  # Close to the word frequencies of English text
+    SEED = 13
+    REGRESSION_THRESHOLD = 0.1  # Relative slowdown reported by the comparison
+    EXTRACTION_PAGES = 10  # Result pages of ArxivConfig.PAGE_SIZE papers parsed by the extraction benchmark
+
+
+class MetricsConfig(Enum):
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+    PROFILING = os.environ.get('SEARCH_ENGINE_PROFILING') == '1'  # Allows ?profile=1 on search requests
+    PROFILE_TOP_CALLS = 25  # Calls logged from every profile
@@ -0,0 +1,217 @@
+import logging
+
+from crawler.preprocess import STOP_WORDS
+from utils.binary_index import binary_write
+from utils.enums import FuzzyConfig
+from utils.kgram_index import VocabularyIndex, build_vocabulary_index
+
+
+def term_deletes(term, max_distance=FuzzyConfig.MAX_DISTANCE.value, prefix_length=FuzzyConfig.PREFIX_LENGTH.value):
+    """
+    Returns the prefix of a term and every non-empty string obtained by deleting up to max_distance of its characters.
+
+    Two terms within max_distance edits of each other share at least one delete, so looking up the
+    deletes of a query term finds every close term (SymSpell). Only a prefix is used, which bounds the
+    number of deletes of long terms; candidates are verified on the whole terms.
+    """
+    prefix = term[:prefix_length]
+    deletes = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        frontier = {word[:position] + word[position + 1:] for word in frontier for position in range(len(word))}
+        deletes |= frontier
+    deletes.discard('')  # The empty key would sort before the vocabulary entries
+    return deletes
+
+
+def edit_distance(source, target, max_distance):
+    """
+    Computes the optimal string alignment distance (Levenshtein with adjacent transpositions) of two terms.
+
+    Returns:
+    - int: The distance, or max_distance + 1 as soon as it is known to exceed max_distance.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    before_previous = None
+    previous = list(range(len(target) + 1))
+    for row in range(1, len(source) + 1):
+        current = [row] + [0] * len(target)
+        for column in range(1, len(target) + 1):
+            cost = source[row - 1] != target[column - 1]
+            value = min(previous[column] + 1, current[column - 1] + 1, previous[column - 1] + cost)
+            if row > 1 and column > 1 and source[row - 1] == target[column - 2] \
+                    and source[row - 2] == target[column - 1]:
+                value = min(value, before_previous[column - 2] + 1)
+            current[column] = value
+        if min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def fuzzy_write(vocabulary, file_path):
+    """
+    Write the deletion index of a vocabulary to a binary index file.
+
+    Parameters:
+    - vocabulary (list): Distinct terms, sorted by their UTF-8 bytes.
+    - file_path (str): The path to the fuzzy index file.
+    """
+    binary_write(build_vocabulary_index(vocabulary, term_deletes), file_path)
+
+
+class FuzzyIndex(VocabularyIndex):
+    """
+    Finds the terms of a field vocabulary close to a possibly misspelled term, backed by a memory mapped
+    deletion index file.
+
+    A lookup lists the deletes of the term and reads their postings, so its cost depends on the term
+    length and not on the vocabulary size, except for terms of at most MAX_DISTANCE characters.
+    """
+
+    def candidates(self, term):
+        """
+        Returns the terms sharing a delete with the term, a superset of the terms within the maximum distance.
+        """
+        ordinals = set()
+        for delete in term_deletes(term):
+            ordinals.update(self.ordinals(delete) or ())
+        max_distance = FuzzyConfig.MAX_DISTANCE.value
+        if len(term) <= max_distance:
+            # Terms this short are close to any short term, even one without a common character, with which
+            # they only share the empty delete that is not indexed
+            ordinals.update(ordinal for ordinal in range(self.vocabulary_size)
+                            if len(self.term(ordinal)) <= max_distance)
+        return [self.term(ordinal) for ordinal in ordinals]
+
+
+def fuzzy_matches(term, inverted_index, max_distance=FuzzyConfig.MAX_DISTANCE.value):
+    """
+    Returns the terms of an inverted index within max_distance edits of a term.
+
+    The fuzzy index attached to the inverted index is used if there is one, otherwise the whole term
+    dictionary is scanned.
+
+    Returns:
+    - dict: Matching term to its distance.
+    """
+    fuzzy_index = getattr(inverted_index, 'fuzzy_index', None)
+    candidates = fuzzy_index.candidates(term) if fuzzy_index is not None else iter(inverted_index)
+    matches = {}
+    for candidate in candidates:
+        distance = edit_distance(term, candidate, max_distance)
+        if distance <= max_distance:
+            matches[candidate] = distance
+    return matches
+
+
+def allowed_distance(term):
+    """
+    Returns the edit distance a misspelling of a term may have: 1 for short terms, up to MAX_DISTANCE for longer ones.
+    """
+    return min(FuzzyConfig.MAX_DISTANCE.value, max(1, len(term) // 3))
+
+
+def is_correctable(term):
+    """
+    Tells whether a query term may be replaced by a close term; stop words and very short terms are kept as they are.
+    """
+    return len(term) >= FuzzyConfig.MIN_TERM_LENGTH.value and term not in STOP_WORDS
+
+
+def document_frequency(term, inverted_indexes):
+    return sum(inverted_index.document_frequency(term) if hasattr(inverted_index, 'document_frequency')
+               else len(inverted_index.get(term, {}).get('documents', [])) for inverted_index in inverted_indexes)
+
+
+def is_known(term, inverted_indexes):
+    return any(term in inverted_index for inverted_index in inverted_indexes)
+
+
+def closest_terms(term, inverted_indexes, limit=FuzzyConfig.MAX_EXPANSIONS.value):
+    """
+    Returns the indexed terms closest to a term: those at the smallest edit distance, most frequent first.
+
+    Short terms only match terms one edit away, so that 'cat' does not stand for every three letter term.
+
+    Parameters:
+    - term (str): The query term.
+    - inverted_indexes (list): Inverted indexes of the searched field(s).
+    - limit (int): Maximum number of terms returned.
+
+    Returns:
+    - list: The closest terms, empty if none is within the maximum distance.
+    """
+    distances = {}
+    for inverted_index in inverted_indexes:
+        for candidate, distance in fuzzy_matches(term, inverted_index, allowed_distance(term)).items():
+            distances[candidate] = min(distance, distances.get(candidate, distance))
+    if not distances:
+        return []
+    best = min(distances.values())
+    terms = sorted((candidate for candidate, distance in distances.items() if distance == best),
+                   key=lambda candidate: (-document_frequency(candidate, inverted_indexes), candidate))
+    return terms[:limit]
+
+
+def fuzzy_expansions(term, inverted_indexes):
+    """
+    Returns the terms a query term stands for: itself if it is indexed, otherwise its closest indexed terms.
+    """
+    if not is_correctable(term) or is_known(term, inverted_indexes):
+        return [term]
+    expansions = closest_terms(term, inverted_indexes)
+    if expansions:
+        logging.debug("Expanded %s to %s", term, expansions)
+    return expansions or [term]
+
+
+def correction(term, inverted_indexes):
+    """
+    Returns the most likely spelling of a query term: itself if it is indexed, otherwise its most frequent closest term.
+    """
+    if not is_correctable(term) or is_known(term, inverted_indexes):
+        return term
+    terms = closest_terms(term, inverted_indexes, limit=1)
+    return terms[0] if terms else term
+
+
+def expand_query_words(query, inverted_indexes):
+    """
+    Replaces every word of a free text query missing from the indexes by its closest indexed terms.
+    """
+    return ' '.join(expansion for word in query.lower().split()
+                    for expansion in fuzzy_expansions(word, inverted_indexes))
+
+
+def suggest_query_words(query, inverted_indexes):
+    """
+    Suggests a spelling of a free text query, each word missing from the indexes replaced by its most likely spelling.
+
+    Returns:
+    - str: The suggested query, or None if every word is indexed or has no close term.
+    """
+    words = query.lower().split()
+    corrected = [correction(word, inverted_indexes) for word in words]
+    return ' '.join(corrected) if corrected != words else None
+
+
+def fuzzy_read(file_path):
+    """
+        Open a fuzzy index file.
+
+        Parameters:
+        - file_path (str): The path to the fuzzy index file.
+
+        Returns:
+        - FuzzyIndex: The memory mapped index, or None if it cannot be opened.
+        """
+    try:
+        return FuzzyIndex(file_path)
+    except FileNotFoundError:
+        logging.warning(f"File not found: {file_path}")
+        return None
+    except Exception as e:
+        logging.error(f"Error reading fuzzy index from {file_path}: {e}")
+        return None
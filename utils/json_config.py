@@ -1,5 +1,13 @@
 import json
 import logging
+import os
+
+import joblib
+import numpy as np
+
+from utils.binary_index import binary_read, remove_temp_file, segments_read
+from utils.fuzzy_index import fuzzy_read
+from utils.kgram_index import kgram_read
 
 
 def json_read(file_path):
@@ -24,21 +32,144 @@ def json_read(file_path):
         return None
 
 
-def json_write(data, file_path):
+def json_write(data, file_path, indent=4):
     """
-        Write data to a JSON file.
+        Write data to a JSON file. A failed write raises, leaving the file as it was.
 
         Parameters:
         - data: The data to be written to the JSON file.
         - file_path (str): The path to the JSON file.
+        - indent (int): Indentation of the JSON, or None to write it compact.
         """
+    # Written aside and renamed, so a reader never sees a half written file
+    temp_path = f"{file_path}.tmp"
     try:
-        with open(file_path, 'w', encoding='utf-8') as json_file:
-            json.dump(data, json_file, ensure_ascii=False, indent=4)
+        with open(temp_path, 'w', encoding='utf-8') as json_file:
+            json.dump(data, json_file, ensure_ascii=False, indent=indent,
+                      separators=None if indent is not None else (',', ':'))
+        os.replace(temp_path, file_path)
         logging.info(f"Data written to {file_path}...")
     except Exception as e:
         logging.error(f"Error writing JSON to {file_path}: {e}")
+        remove_temp_file(temp_path)
+        raise
+
+
+def joblib_read(file_path):
+    """
+        Read a persisted model from a joblib file.
+
+        Parameters:
+        - file_path (str): The path to the joblib file.
+
+        Returns:
+        - data: The object read from the joblib file.
+        """
+    try:
+        return joblib.load(file_path)
+    except FileNotFoundError:
+        logging.warning(f"File not found: {file_path}")
+        return None
+    except Exception as e:
+        logging.error(f"Error reading model from {file_path}: {e}")
+        return None
+
+
+def joblib_write(data, file_path):
+    """
+        Write a model to a joblib file. A failed write raises, leaving the file as it was.
+
+        Parameters:
+        - data: The object to be persisted.
+        - file_path (str): The path to the joblib file.
+        """
+    temp_path = f"{file_path}.tmp"
+    try:
+        joblib.dump(data, temp_path)
+        os.replace(temp_path, file_path)
+        logging.info(f"Data written to {file_path}...")
+    except Exception as e:
+        logging.error(f"Error writing model to {file_path}: {e}")
+        remove_temp_file(temp_path)
+        raise
+
+
+def numpy_read(file_path):
+    """
+        Read named arrays from a NumPy .npz file.
+
+        Parameters:
+        - file_path (str): The path to the .npz file.
+
+        Returns:
+        - dict: Array name to array.
+        """
+    try:
+        with np.load(file_path) as arrays:
+            return dict(arrays)
+    except FileNotFoundError:
+        logging.warning(f"File not found: {file_path}")
+        return None
+    except Exception as e:
+        logging.error(f"Error reading arrays from {file_path}: {e}")
+        return None
+
+
+def numpy_write(arrays, file_path):
+    """
+        Write named arrays to a NumPy .npz file. A failed write raises, leaving the file as it was.
+
+        Parameters:
+        - arrays (dict): Array name to array.
+        - file_path (str): The path to the .npz file.
+        """
+    temp_path = f"{file_path}.tmp"
+    try:
+        with open(temp_path, 'wb') as npz_file:
+            np.savez(npz_file, **arrays)
+        os.replace(temp_path, file_path)
+        logging.info(f"Data written to {file_path}...")
+    except Exception as e:
+        logging.error(f"Error writing arrays to {file_path}: {e}")
+        remove_temp_file(temp_path)
+        raise
 
 
 def load_data(data):
-    return {key: json_read(path.value) for key, path in data.items()}
+    return load_files({key: path.value for key, path in data.items()})
+
+
+def load_files(file_paths):
+    readers = {'.joblib': joblib_read, '.bin': binary_read, '.npz': numpy_read}
+    return {key: readers.get(os.path.splitext(path)[1], json_read)(path) for key, path in file_paths.items()}
+
+
+def manifest_file(manifest, name, default_path):
+    """
+        Returns the path of a data file of the index version a manifest describes, e.g. 'data/bm25_index.v3.json'
+        for 'bm25_index'. Manifests written before data files were versioned do not list them, their files
+        are at the default paths.
+        """
+    return ((manifest or {}).get('files') or {}).get(name, default_path)
+
+
+def load_field_indexes(manifest):
+    """
+        Open the inverted index segments of every field listed in the index manifest, with their k-gram
+        and fuzzy indexes.
+
+        Parameters:
+        - manifest (dict): Index manifest with the 'segments' of each field and optionally their 'kgram_indexes'
+          and 'fuzzy_indexes'.
+
+        Returns:
+        - dict: Field name ('Authors', 'Abstract', 'Date', 'Title') to its segmented inverted index.
+        """
+    field_indexes = {field: segments_read(segments) for field, segments in manifest['segments'].items()}
+    for field, path in manifest.get('kgram_indexes', {}).items():
+        if field in field_indexes:
+            field_indexes[field].kgram_index = kgram_read(path)
+    for field, path in manifest.get('fuzzy_indexes', {}).items():
+        if field in field_indexes:
+            field_indexes[field].fuzzy_index = fuzzy_read(path)
+    return field_indexes
@@ -0,0 +1,218 @@
+import logging
+import re
+from bisect import bisect_left
+
+from exceptions.invalid_query_exception import InvalidQueryException
+from utils.binary_index import BinaryIndex, binary_write
+from utils.enums import KGramConfig
+from utils.postings import intersect
+
+# A vocabulary index is a binary index file holding two kinds of entries:
+#   '\0' + term   one per term of the field vocabulary, without postings; sorting first, the entry of
+#                 the term with vocabulary ordinal i is the i-th entry of the file
+#   key           the sorted vocabulary ordinals of the terms it belongs to, as its 'documents'
+# In a k-gram index the keys are k-grams of the terms padded with BOUNDARY, so prefixes and suffixes
+# have k-grams of their own.
+VOCABULARY_PREFIX = '\0'
+BOUNDARY = '$'
+WILDCARD = '*'
+
+
+def term_kgrams(term, k=KGramConfig.K.value):
+    """
+    Returns the distinct k-grams of a term padded with boundary markers, e.g. 'graph' -> '$gr', 'gra', ..., 'ph$'.
+    """
+    padded = f"{BOUNDARY}{term}{BOUNDARY}"
+    return {padded[start:start + k] for start in range(max(1, len(padded) - k + 1))}
+
+
+def pattern_kgrams(pattern, k=KGramConfig.K.value):
+    """
+    Returns the k-grams every term matching a wildcard pattern contains.
+
+    Only the parts of the padded pattern between wildcards that are at least k characters long have k-grams.
+    """
+    grams = set()
+    for part in f"{BOUNDARY}{pattern}{BOUNDARY}".split(WILDCARD):
+        grams.update(part[start:start + k] for start in range(len(part) - k + 1))
+    return grams
+
+
+def wildcard_regex(pattern):
+    """
+    Compiles a wildcard pattern, where '*' matches any characters, into a regular expression.
+    """
+    return re.compile('.*'.join(re.escape(part) for part in pattern.split(WILDCARD)), re.DOTALL)
+
+
+def build_vocabulary_index(vocabulary, term_keys):
+    """
+    Builds a vocabulary index, mapping keys derived from the terms to the ordinals of those terms.
+
+    Parameters:
+    - vocabulary (list): Distinct terms, sorted by their UTF-8 bytes like the binary index dictionary.
+    - term_keys (function): Returns the distinct keys of a term.
+
+    Returns:
+    - dict: The index entries, ready for binary_write.
+    """
+    vocabulary_index = {f"{VOCABULARY_PREFIX}{term}": {'documents': []} for term in vocabulary}
+    for ordinal, term in enumerate(vocabulary):
+        for key in term_keys(term):
+            vocabulary_index.setdefault(key, {'documents': []})['documents'].append(ordinal)
+    return vocabulary_index
+
+
+def kgram_write(vocabulary, file_path):
+    """
+    Write the k-gram index of a vocabulary to a binary index file.
+
+    Parameters:
+    - vocabulary (list): Distinct terms, sorted by their UTF-8 bytes.
+    - file_path (str): The path to the k-gram index file.
+    """
+    binary_write(build_vocabulary_index(vocabulary, term_kgrams), file_path)
+
+
+class VocabularyIndex:
+    """
+    Memory mapped vocabulary index file: the terms of a field and keys mapping to some of those terms.
+    """
+
+    def __init__(self, file_path):
+        self.index = BinaryIndex(file_path)
+        # The vocabulary entries are the first ones of the file
+        self.vocabulary_size = bisect_left(range(self.index.term_count), True,
+                                           key=lambda ordinal: not self.index.term(ordinal).startswith(
+                                               VOCABULARY_PREFIX))
+
+    def term(self, ordinal):
+        return self.index.term(ordinal)[len(VOCABULARY_PREFIX):]
+
+    def ordinals(self, key):
+        """
+        Returns the sorted vocabulary ordinals of the terms a key maps to, or None if there are none.
+        """
+        entry = self.index.get(key)
+        return entry['documents'] if entry is not None else None
+
+    def close(self):
+        self.index.close()
+
+
+class KGramIndex(VocabularyIndex):
+    """
+    Finds the terms of a field vocabulary matching a wildcard pattern, backed by a memory mapped k-gram index file.
+
+    The candidates are the terms holding every k-gram of the pattern, found by intersecting the k-gram
+    postings; patterns too short to have k-grams use the range of the sorted vocabulary sharing their
+    prefix. Candidates are then verified against the whole pattern.
+    """
+
+    def __init__(self, file_path, k=KGramConfig.K.value):
+        super().__init__(file_path)
+        self.k = k
+
+    def prefix_range(self, prefix):
+        """
+        Yields the vocabulary ordinals of the terms starting with a prefix.
+        """
+        target = f"{VOCABULARY_PREFIX}{prefix}".encode('utf-8')
+        ordinal = bisect_left(range(self.vocabulary_size), target, key=self.index.term_bytes)
+        while ordinal < self.vocabulary_size and self.index.term_bytes(ordinal).startswith(target):
+            yield ordinal
+            ordinal += 1
+
+    def expand(self, pattern, limit=KGramConfig.MAX_EXPANSIONS.value):
+        """
+        Returns the terms matching a wildcard pattern.
+
+        Parameters:
+        - pattern (str): Lowercase pattern where '*' matches any characters, e.g. 'papil*' or '*papillon*'.
+        - limit (int): Maximum number of matching terms.
+
+        Returns:
+        - list: The matching terms, in vocabulary order.
+        """
+        postings = []
+        for gram in pattern_kgrams(pattern, self.k):
+            ordinals = self.ordinals(gram)
+            if ordinals is None:
+                return []
+            postings.append(ordinals)
+        if postings:
+            postings.sort(key=len)
+            candidates = postings[0]
+            for gram_postings in postings[1:]:
+                candidates = intersect(candidates, gram_postings)
+        else:
+            candidates = self.prefix_range(pattern.split(WILDCARD)[0])
+        regex = wildcard_regex(pattern)
+        return verified_terms((self.term(ordinal) for ordinal in candidates), regex, pattern, limit)
+
+
+def verified_terms(candidates, regex, pattern, limit):
+    """
+    Keeps the candidate terms matching the whole pattern, failing if there are more than 'limit' of them.
+    """
+    terms = []
+    for term in candidates:
+        if regex.fullmatch(term):
+            if len(terms) == limit:
+                raise InvalidQueryException(f"'{pattern}' matches too many terms, please make it more specific.")
+            terms.append(term)
+    return terms
+
+
+def expand_wildcard(pattern, inverted_index, limit=KGramConfig.MAX_EXPANSIONS.value):
+    """
+    Returns the terms of an inverted index matching a wildcard pattern.
+
+    The k-gram index attached to the inverted index is used if there is one, otherwise the whole term
+    dictionary is scanned.
+
+    Parameters:
+    - pattern (str): Lowercase pattern where '*' matches any characters.
+    - inverted_index: The inverted index, with an optional 'kgram_index' attribute.
+    - limit (int): Maximum number of matching terms.
+
+    Returns:
+    - list: The matching terms.
+    """
+    if not pattern.replace(WILDCARD, ''):
+        raise InvalidQueryException("A wildcard pattern needs at least one character besides '*'.")
+    kgram_index = getattr(inverted_index, 'kgram_index', None)
+    if kgram_index is not None:
+        return kgram_index.expand(pattern, limit)
+    return verified_terms(iter(inverted_index), wildcard_regex(pattern), pattern, limit)
+
+
+def wildcard_documents(pattern, inverted_index):
+    """
+    Returns the IDs of the documents containing a term matching a wildcard pattern, sorted.
+    """
+    documents = set()
+    for term in expand_wildcard(pattern, inverted_index):
+        documents.update(inverted_index.get(term, {}).get('documents', []))
+    logging.debug("Wildcard %s matched %d documents", pattern, len(documents))
+    return sorted(documents)
+
+
+def kgram_read(file_path):
+    """
+        Open a k-gram index file.
+
+        Parameters:
+        - file_path (str): The path to the k-gram index file.
+
+        Returns:
+        - KGramIndex: The memory mapped index, or None if it cannot be opened.
+        """
+    try:
+        return KGramIndex(file_path)
+    except FileNotFoundError:
+        logging.warning(f"File not found: {file_path}")
+        return None
+    except Exception as e:
+        logging.error(f"Error reading k-gram index from {file_path}: {e}")
+        return None
@@ -0,0 +1,197 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from utils.enums import Paths, MetricsConfig
+
+
+class StageTimer:
+    """
+    Accumulates the time spent in each stage of one search, e.g. 'parse', 'retrieval', 'scoring'.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+# Timer of the search running in the current thread or generator, if it is being measured
+current_timer = ContextVar('current_timer', default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a stage of the current search; does nothing if no search is being measured.
+
+    Parameters:
+    - name (str): The stage name.
+    """
+    timer = current_timer.get()
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+@contextmanager
+def measure_search():
+    """
+    Measures the stages of the search run inside the block.
+
+    Yields:
+    - StageTimer: The timer receiving the stage times.
+    """
+    timer = StageTimer()
+    token = current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        current_timer.reset(token)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms, rendered in the Prometheus text exposition format.
+
+    Every metric is declared once with its type and help text, and is then updated with a dict of labels.
+    """
+
+    def __init__(self, buckets=MetricsConfig.LATENCY_BUCKETS.value):
+        self.buckets = tuple(buckets)
+        self.declarations = {}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def declare(self, name, kind, help_text):
+        """
+        Declares a metric.
+
+        Parameters:
+        - name (str): Metric name, e.g. 'search_requests_total'.
+        - kind (str): 'counter', 'gauge' or 'histogram'.
+        - help_text (str): Description shown on the HELP line.
+        """
+        self.declarations[name] = (kind, help_text)
+        self.values.setdefault(name, {})
+
+    @staticmethod
+    def label_key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    def increment(self, name, labels=None, value=1):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[name][key] = self.values[name].get(key, 0) + value
+
+    def set(self, name, labels=None, value=0):
+        with self.lock:
+            self.values[name][self.label_key(labels)] = value
+
+    def observe(self, name, labels, value):
+        """
+        Records a value in a histogram: the count of the first bucket not below it, the sum and the count.
+        """
+        key = self.label_key(labels)
+        with self.lock:
+            histogram = self.values[name].get(key)
+            if histogram is None:
+                histogram = self.values[name][key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][position] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in self.declarations.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f"{name}{self.format_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, value['buckets']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self.format_labels(labels + (('le', repr(bound)),))} "
+                                     f"{cumulative}")
+                    lines.append(f"{name}_bucket{self.format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{self.format_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{self.format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def record_search(registry, timer, algorithm, search_option, status, seconds):
+    """
+    Records a finished search: its status, its total latency and the latency of each of its stages.
+
+    Parameters:
+    - registry (MetricsRegistry): Registry declaring the search metrics.
+    - timer (StageTimer): Stage times of the search.
+    - algorithm (str): The selected retrieval algorithm.
+    - search_option (str): The searched field or 'all_fields'.
+    - status (str): 'ok' or 'invalid'.
+    - seconds (float): Total time of the search.
+    """
+    labels = {'algorithm': algorithm or 'simple', 'search_option': search_option}
+    registry.increment('search_requests_total', {**labels, 'status': status})
+    registry.observe('search_latency_seconds', labels, seconds)
+    for name, stage_seconds in timer.stages.items():
+        registry.observe('search_stage_seconds', {**labels, 'stage': name}, stage_seconds)
+
+
+def start_profiler():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_profile(profiler, name):
+    """
+    Stops a profiler, saves its statistics for pstats/snakeviz and logs the most expensive calls.
+
+    Parameters:
+    - profiler (cProfile.Profile): The running profiler.
+    - name (str): Name of the profiled request, used in the file name.
+
+    Returns:
+    - str: Path of the saved statistics.
+    """
+    profiler.disable()
+    os.makedirs(Paths.PROFILES_PATH.value, exist_ok=True)
+    path = os.path.join(Paths.PROFILES_PATH.value, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.prof")
+    profiler.dump_stats(path)
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(
+            MetricsConfig.PROFILE_TOP_CALLS.value)
+        logging.info("Profile of %s saved to %s\n%s", name, path, output.getvalue())
+    return path
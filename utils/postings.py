@@ -0,0 +1,73 @@
+import heapq
+from bisect import bisect_left
+
+
+def gallop(postings, target, low):
+    """
+    Finds the first position at or after low whose document ID is >= target, by exponential search.
+
+    Parameters:
+    - postings (list): Sorted document IDs.
+    - target (int): The document ID to look for.
+    - low (int): Position to start searching from.
+
+    Returns:
+    - int: The position of the first document ID >= target, or len(postings).
+    """
+    step = 1
+    high = low
+    while high < len(postings) and postings[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(postings, target, low, min(high + 1, len(postings)))
+
+
+def intersect(left, right):
+    """
+    Intersects two sorted postings lists, galloping through the longer one.
+
+    Returns:
+    - list: Sorted document IDs present in both lists.
+    """
+    if len(left) > len(right):
+        left, right = right, left
+    result = []
+    position = 0
+    for doc in left:
+        position = gallop(right, doc, position)
+        if position == len(right):
+            break
+        if right[position] == doc:
+            result.append(doc)
+    return result
+
+
+def difference(left, right):
+    """
+    Removes the documents of a sorted postings list from another one.
+
+    Returns:
+    - list: Sorted document IDs of left that are not in right.
+    """
+    result = []
+    position = 0
+    for doc in left:
+        position = gallop(right, doc, position)
+        if position == len(right) or right[position] != doc:
+            result.append(doc)
+    return result
+
+
+def union(*postings_lists):
+    """
+    Merges sorted postings lists.
+
+    Returns:
+    - list: Sorted document IDs present in any of the lists, without duplicates.
+    """
+    result = []
+    for doc in heapq.merge(*postings_lists):
+        if not result or result[-1] != doc:
+            result.append(doc)
+    return result
@@ -0,0 +1,190 @@
+import numpy as np
+
+from utils.enums import PruningConfig
+
+# A score index entry, one per algorithm and search option, holds:
+#   impacts                    document by term csc_matrix of the score every posting adds to its document
+#   terms                      sorted terms of the columns (BM25 only, TF-IDF columns follow the vectorizer)
+#   block_size                 document IDs per block
+#   term_max                   best score of every term
+#   block_indptr               start of the blocks of every term in the block arrays, and their end
+#   block_ids, block_max,      per block of block_size document IDs holding postings of a
+#   block_starts               term: its number, best score and first posting in impacts.data
+
+BOUND_SLACK = 1e-9
+
+
+def term_columns(terms, entry):
+    """
+    Looks the query terms up in the sorted terms of a BM25 score entry.
+
+    Returns:
+    - tuple: (columns of the indexed terms, how many times each is in the query).
+    """
+    words, counts = np.unique(np.array(terms, dtype=object), return_counts=True)
+    if not len(words) or not len(entry['terms']):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    columns = np.minimum(np.searchsorted(entry['terms'], words), len(entry['terms']) - 1)
+    found = entry['terms'][columns] == words
+    return columns[found], counts[found].astype(np.float64)
+
+
+def exhaustive_top_k(entry, columns, weights, k, doc_filter=None):
+    """
+    Scores every document in the postings of the query terms.
+
+    With a filter, only the postings of the allowed documents are scored: when the allowed documents are
+    fewer than the postings of a term they are looked up in its sorted postings, otherwise its postings
+    are filtered.
+
+    Returns:
+    - tuple: (IDs of the k best scoring documents, best first, and their scores).
+    """
+    impacts = entry['impacts']
+    allowed = np.flatnonzero(doc_filter) if doc_filter is not None else None
+    scores = np.zeros(impacts.shape[0])
+    for column, weight in zip(columns, weights):
+        start, end = impacts.indptr[column], impacts.indptr[column + 1]
+        documents, term_impacts = impacts.indices[start:end], impacts.data[start:end]
+        if allowed is not None and len(allowed) < end - start:
+            positions = np.minimum(np.searchsorted(documents, allowed), end - start - 1)
+            positions = positions[documents[positions] == allowed]
+            documents, term_impacts = documents[positions], term_impacts[positions]
+        elif allowed is not None:
+            kept = doc_filter[documents]
+            documents, term_impacts = documents[kept], term_impacts[kept]
+        scores[documents] += weight * term_impacts
+    return best_documents(np.flatnonzero(scores > 0), scores[scores > 0], k)
+
+
+def best_documents(documents, scores, k):
+    """
+    Returns the k best scoring documents, best first, ties broken by document ID.
+    """
+    if len(documents) > k:
+        # Every document tied with the k-th best is kept, for the tie break
+        kept = scores >= -np.partition(-scores, k - 1)[k - 1]
+        documents, scores = documents[kept], scores[kept]
+    order = np.lexsort((documents, -scores))[:k]
+    return documents[order].tolist(), scores[order].tolist()
+
+
+def gather_ranges(starts, ends):
+    """
+    Returns the positions covered by consecutive [start, end) ranges, range after range.
+    """
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def block_max_top_k(entry, columns, weights, k, doc_filter=None):
+    """
+    Finds the k best scoring documents for a weighted set of query terms with dynamic pruning.
+
+    The bound of a block of documents is the sum of the block maxima of the query terms. The blocks
+    with the highest bounds are scored first, until they hold k documents, and the k-th best score
+    found becomes a threshold that every document of the results reaches. The blocks whose bound is
+    below it are skipped without reading their postings. In the other blocks, only the terms that
+    could lift a document to the threshold together with the terms of lower bound (MaxScore's
+    essential terms) propose candidates. The results equal exhaustive_top_k, to the last bit.
+
+    Blocks are scored with array operations, a few per query term, rather than one document at a time.
+
+    Parameters:
+    - entry (dict): Score entry of the search option.
+    - columns (np.ndarray): Columns of the query terms in the score entry, each once.
+    - weights (np.ndarray): Weight of each query term, multiplying its scores.
+    - k (int): Maximum number of documents to return.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - tuple: (IDs of the k best scoring documents, best first, and their scores).
+    """
+    impacts = entry['impacts']
+    block_indptr = entry['block_indptr']
+    if not len(columns):
+        return [], []
+    # The blocks of every query term, term after term in query order
+    blocks = gather_ranges(block_indptr[columns], block_indptr[columns + 1])
+    block_terms = np.repeat(np.arange(len(columns)), block_indptr[columns + 1] - block_indptr[columns])
+    block_ids = entry['block_ids'][blocks]
+    block_starts = entry['block_starts'][blocks].astype(np.int64)
+    block_ends = np.append(block_starts[1:], 0)
+    # A block ends where the next block of its term starts, or with the postings of its term
+    last_blocks = np.append(block_terms[1:] != block_terms[:-1], True)
+    block_ends[last_blocks] = impacts.indptr[columns + 1]
+
+    block_count = -(-impacts.shape[0] // entry['block_size'])
+    # Bounds are summed in another order than the scores, so they are loosened against rounding
+    bounds = np.bincount(block_ids, weights[block_terms] * entry['block_max'][blocks], block_count) * (1 + BOUND_SLACK)
+    term_bounds = weights * entry['term_max'][columns] * (1 + BOUND_SLACK)
+    term_order = np.argsort(term_bounds, kind='stable')
+    cumulative_bounds = np.empty(len(columns))
+    cumulative_bounds[term_order] = np.cumsum(term_bounds[term_order])
+
+    def score_blocks(selected, threshold):
+        # Terms whose bounds add up to less than the threshold cannot lift a document to it on their own
+        term_blocks = selected[block_ids]
+        positions = gather_ranges(block_starts[term_blocks], block_ends[term_blocks])
+        posting_terms = np.repeat(block_terms[term_blocks], block_ends[term_blocks] - block_starts[term_blocks])
+        documents = impacts.indices[positions]
+        if doc_filter is not None:  # Only the postings of the allowed documents are scored
+            kept = doc_filter[documents]
+            positions, posting_terms, documents = positions[kept], posting_terms[kept], documents[kept]
+        candidates = np.zeros(impacts.shape[0], dtype=bool)
+        candidates[documents[cumulative_bounds[posting_terms] >= threshold]] = True
+        # Postings are in query term order, so every sum adds the terms in the order exhaustive_top_k does
+        scores = np.bincount(documents, weights[posting_terms] * impacts.data[positions], impacts.shape[0])
+        candidates = np.flatnonzero(candidates)
+        return candidates, scores[candidates]
+
+    # First the best blocks, doubling their number until they hold k candidates
+    order = np.flatnonzero(bounds)[np.argsort(-bounds[np.flatnonzero(bounds)], kind='stable')]
+    block_postings = np.bincount(block_ids, block_ends - block_starts, block_count)[order]
+    count = min(len(order), int(np.searchsorted(np.cumsum(block_postings), k)) + 1)
+    scored = np.zeros(block_count, dtype=bool)
+    documents, scores = [], []
+    found = 0
+    start = 0
+    while start < len(order):
+        selected = np.zeros(block_count, dtype=bool)
+        selected[order[start:count]] = True
+        scored |= selected
+        block_documents, block_scores = score_blocks(selected, 0.0)
+        documents.append(block_documents)
+        scores.append(block_scores)
+        found += len(block_documents)
+        if found >= k:
+            break
+        start, count = count, min(len(order), 2 * count)
+
+    # Then every other block that can hold a document reaching the k-th best score found
+    if found >= k:
+        all_scores = np.concatenate(scores)
+        threshold = -np.partition(-all_scores, k - 1)[k - 1]
+        remaining = (bounds >= threshold) & ~scored
+        if remaining.any():
+            block_documents, block_scores = score_blocks(remaining, threshold)
+            documents.append(block_documents)
+            scores.append(block_scores)
+    documents = np.concatenate(documents)
+    scores = np.concatenate(scores)
+    return best_documents(documents[scores > 0], scores[scores > 0], k)
+
+
+def score_top_k(entry, columns, weights, k, doc_filter=None):
+    """
+    Finds the k best scoring documents for a weighted set of query terms from a score entry.
+
+    Pruning pays for its bounds only when the query reads many postings, so shorter postings lists are
+    scored exhaustively. Both give the same results.
+
+    Returns:
+    - tuple: (IDs of the k best scoring documents, best first, and their scores).
+    """
+    impacts = entry['impacts']
+    postings = (impacts.indptr[columns + 1] - impacts.indptr[columns]).sum()
+    if postings >= PruningConfig.MIN_POSTINGS.value:
+        return block_max_top_k(entry, columns, weights, k, doc_filter)
+    return exhaustive_top_k(entry, columns, weights, k, doc_filter)
@@ -0,0 +1,99 @@
+import numpy as np
+
+from utils.enums import SemanticConfig
+
+# A semantic index is a .npz file holding:
+#   words, word_vectors, word_weights   the sorted vocabulary of the embedding model, the unit vector
+#                                       of each word and its smooth inverse frequency weight
+#   <search option>.vectors             unit embedding of every document, one row per document ID
+#   <search option>.centroids           unit centroid of every inverted list of the IVF index
+#   <search option>.list_offsets        start of every inverted list in list_documents, and its end
+#   <search option>.list_documents      document IDs grouped by inverted list
+
+
+def embed_texts(texts, semantic_index):
+    """
+    Embeds texts as the normalized weighted average of the vectors of their words.
+
+    Words are weighted by their smooth inverse frequency, so frequent words weigh less; words missing
+    from the vocabulary are ignored and a text without known words gets a zero vector.
+
+    Parameters:
+    - texts (list): Texts whose words are separated by spaces.
+    - semantic_index (dict): Arrays of the semantic index, at least 'words', 'word_vectors' and 'word_weights'.
+
+    Returns:
+    - np.ndarray: One float32 unit vector (or zero vector) per text.
+    """
+    words = semantic_index['words']
+    word_vectors = semantic_index['word_vectors']
+    word_weights = semantic_index['word_weights']
+    embeddings = np.zeros((len(texts), word_vectors.shape[1]), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = np.array(text.lower().split(), dtype=words.dtype)
+        if not len(tokens) or not len(words):
+            continue
+        # The vocabulary is sorted, so the words are looked up by binary search
+        positions = np.minimum(np.searchsorted(words, tokens), len(words) - 1)
+        positions = positions[words[positions] == tokens]
+        if len(positions):
+            embeddings[row] = word_weights[positions] @ word_vectors[positions]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1)
+
+
+def probe_lists(query_vector, centroids, nprobe):
+    """
+    Returns the inverted lists whose centroids are the most similar to the query, the nprobe best.
+    """
+    similarities = centroids @ query_vector
+    if nprobe >= len(similarities):
+        return np.arange(len(similarities))
+    return np.argpartition(-similarities, nprobe - 1)[:nprobe]
+
+
+def ivf_candidates(query_vector, semantic_index, search_option, nprobe):
+    """
+    Returns the document IDs of the nprobe inverted lists closest to the query.
+    """
+    offsets = semantic_index[f'{search_option}.list_offsets']
+    documents = semantic_index[f'{search_option}.list_documents']
+    lists = probe_lists(query_vector, semantic_index[f'{search_option}.centroids'], nprobe)
+    return np.concatenate([documents[offsets[index]:offsets[index + 1]] for index in lists])
+
+
+def semantic_scores(query_vector, semantic_index, search_option, nprobe=SemanticConfig.NPROBE.value, exact=False,
+                    doc_filter=None):
+    """
+    Scores documents by the cosine similarity of their embedding with the query embedding.
+
+    Only the documents of the nprobe inverted lists closest to the query are scored, so a query reads
+    about nprobe / list count of the documents; more lists probed means better recall and slower
+    queries. The exact mode scores every document, to measure the recall of the approximate one.
+
+    With a filter, only the allowed documents are scored. When they are fewer than the probed lists
+    would hold on average they are all scored, which is both exact and cheaper.
+
+    Parameters:
+    - query_vector (np.ndarray): Unit embedding of the query.
+    - semantic_index (dict): Arrays of the semantic index.
+    - search_option (str): 'all_fields' or a specific field like 'Authors', 'Date', 'Abstract', 'Title'.
+    - nprobe (int): Inverted lists scanned.
+    - exact (bool): Score every document instead of probing lists.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - tuple: (similarities, document IDs they belong to, or None when every document is scored).
+    """
+    vectors = semantic_index[f'{search_option}.vectors']
+    if doc_filter is not None:
+        allowed = np.flatnonzero(doc_filter)
+        list_count = max(1, len(semantic_index[f'{search_option}.centroids']))
+        if exact or len(allowed) <= nprobe * len(vectors) / list_count:
+            return vectors[allowed] @ query_vector, allowed
+    if exact:
+        return vectors @ query_vector, None
+    candidates = ivf_candidates(query_vector, semantic_index, search_option, nprobe)
+    if doc_filter is not None:
+        candidates = candidates[doc_filter[candidates]]
+    return vectors[candidates] @ query_vector, candidates
@@ -0,0 +1,189 @@
+import heapq
+import logging
+import os
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+
+from crawler.vector_index import SEARCH_OPTIONS
+from utils.binary_index import binary_read
+from utils.bm25 import add_bm25_scores, add_bm25f_scores
+from utils.json_config import joblib_read, json_read, numpy_read
+from utils.utils import top_k
+
+# The shard loaded by a shard worker process
+worker_shard = None
+
+
+def index_file(path, search_option):
+    return os.path.join(path, f"inverted_index_{search_option.lower()}.bin")
+
+
+def open_shard(shard):
+    """
+    Loads a shard in a worker process: its inverted indexes are memory mapped, its papers, BM25 document
+    lengths and TF-IDF rows are read in memory.
+
+    Parameters:
+    - shard (dict): 'path', 'start' and 'end' of the shard, from the index manifest.
+    """
+    global worker_shard
+    doc_lengths = numpy_read(os.path.join(shard['path'], 'doc_lengths.npz')) or {}
+    worker_shard = {
+        'start': shard['start'],
+        'papers': json_read(os.path.join(shard['path'], 'papers.json')) or [],
+        'indexes': {},
+        'doc_lengths': {search_option: lengths.tolist() for search_option, lengths in doc_lengths.items()},
+        'tfidf': joblib_read(os.path.join(shard['path'], 'tfidf.joblib')) or {},
+    }
+    for search_option in doc_lengths:
+        worker_shard['indexes'][search_option] = binary_read(index_file(shard['path'], search_option))
+
+
+def shard_bm25_search(search_option, weighted_terms, avgdl, k, doc_filter=None):
+    """
+    Scores the documents of the worker's shard with BM25, using the global IDF of every term.
+
+    Parameters:
+    - search_option (str): 'all_fields' or a specific field.
+    - weighted_terms (list): (term, global IDF) of every query term.
+    - avgdl (float): Global average document length of the search option.
+    - k (int): Maximum number of documents to return.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
+
+    Returns:
+    - tuple: (IDs of the k best scoring documents of the shard, best first, and their scores).
+    """
+    inverted_index = worker_shard['indexes'].get(search_option)
+    if inverted_index is None:
+        return [], []
+    scores = {}
+    for term, idf in weighted_terms:
+        entry = inverted_index.get(term)
+        if entry:
+            add_bm25_scores(scores, entry['documents'], entry['frequencies'], idf,
+                            worker_shard['doc_lengths'][search_option], avgdl, worker_shard['start'], doc_filter)
+    return top_k(scores, k)
+
+
+def shard_bm25f_search(weighted_terms, avgdls, k, doc_filter=None):
+    """
+    Scores the documents of the worker's shard with BM25F over its field indexes, using the global IDF
+    of every term and the global average length of every field.
+
+    Returns:
+    - tuple: (IDs of the k best scoring documents of the shard, best first, and their scores).
+    """
+    scores = {}
+    for term, idf in weighted_terms:
+        field_postings = []
+        for field in avgdls:
+            entry = worker_shard['indexes'][field].get(term)
+            if entry:
+                field_postings.append((field, entry['documents'], entry['frequencies']))
+        add_bm25f_scores(scores, field_postings, idf, worker_shard['doc_lengths'], avgdls, worker_shard['start'],
+                         doc_filter)
+    return top_k(scores, k)
+
+
+def shard_vector_space_search(search_option, query_matrix, k, doc_filter=None):
+    """
+    Scores the documents of the worker's shard by cosine similarity with an already vectorized query,
+    only the documents allowed by doc_filter if it is given.
+
+    Returns:
+    - tuple: (IDs of the k most similar documents of the shard, best first, and their similarities).
+    """
+    tfidf_matrix = worker_shard['tfidf'].get(search_option)
+    if tfidf_matrix is None:
+        return [], []
+    ids = np.arange(tfidf_matrix.shape[0])
+    if doc_filter is not None:
+        ids = np.flatnonzero(doc_filter[worker_shard['start']:worker_shard['start'] + tfidf_matrix.shape[0]])
+        tfidf_matrix = tfidf_matrix[ids]
+    similarities = (query_matrix @ tfidf_matrix.T).tocsr()
+    ranking, scores = top_k(similarities.data, k, ids[similarities.indices])
+    return [doc + worker_shard['start'] for doc in ranking], scores
+
+
+def shard_papers(ids):
+    """
+    Returns the papers of the worker's shard with the given document IDs, in the same order.
+    """
+    return [worker_shard['papers'][doc - worker_shard['start']] for doc in ids]
+
+
+def merge_top_k(results, k):
+    """
+    Merges the rankings of several shards into the k best documents overall.
+
+    Parameters:
+    - results (list): (ranking, scores) of every shard, best first.
+    - k (int): Maximum number of documents to return.
+
+    Returns:
+    - tuple: (IDs of the k best documents, best first, and their scores).
+    """
+    best = heapq.nlargest(k, chain.from_iterable(zip(scores, ranking) for ranking, scores in results),
+                          key=lambda pair: pair[0])
+    return [doc for _, doc in best], [score for score, _ in best]
+
+
+class ShardPool:
+    """
+    One worker process per document shard, each holding the data of its shard only.
+
+    A query is sent to every worker at once and their top k lists are merged, so scoring runs on as many
+    cores as there are shards. The pool only reads the term dictionaries of the shards itself, to compute
+    the global document frequencies sent with the queries; the papers of the results are fetched from
+    the workers holding them.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.executors = [ProcessPoolExecutor(max_workers=1, initializer=open_shard, initargs=(shard,))
+                          for shard in shards]
+        self.dictionaries = [{search_option: binary_read(index_file(shard['path'], search_option))
+                              for search_option in SEARCH_OPTIONS} for shard in shards]
+        # Start the workers now rather than on the first query
+        for future in [executor.submit(len, ()) for executor in self.executors]:
+            future.result()
+        logging.info(f"Started {len(shards)} shard workers.")
+
+    def document_frequency(self, term, search_option):
+        """
+        Returns the number of documents of the whole corpus matching a term in a search option.
+        """
+        return sum(dictionaries[search_option].document_frequency(term) for dictionaries in self.dictionaries
+                   if dictionaries.get(search_option) is not None)
+
+    def scatter(self, function, *args):
+        """
+        Runs a search function in every shard worker and returns the results of the shards, in shard order.
+        """
+        futures = [executor.submit(function, *args) for executor in self.executors]
+        return [future.result() for future in futures]
+
+    def papers(self, ids):
+        """
+        Returns the papers with the given document IDs, in the same order, from the workers of their shards.
+        """
+        starts = [shard['start'] for shard in self.shards]
+        shard_ids = {}
+        for doc in ids:
+            shard_ids.setdefault(bisect_right(starts, doc) - 1, []).append(doc)
+        futures = {shard: self.executors[shard].submit(shard_papers, docs) for shard, docs in shard_ids.items()}
+        papers = {}
+        for shard, future in futures.items():
+            papers.update(zip(shard_ids[shard], future.result()))
+        return [papers[doc] for doc in ids]
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+        for dictionaries in self.dictionaries:
+            for dictionary in dictionaries.values():
+                if dictionary is not None:
+                    dictionary.close()
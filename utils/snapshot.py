@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+from utils.enums import Paths, IndexConfig
+from utils.json_config import load_files, load_field_indexes, json_read, manifest_file
+from utils.shards import ShardPool
+
+
+class IndexSnapshot:
+    """
+    One version of the papers and indexes, never modified after it is loaded.
+
+    A request reads the current snapshot once and uses it until it finishes, so a reload that happens
+    meanwhile does not change the data under it. The shard workers of a sharded index are stopped when
+    the last request using the snapshot is done with it.
+
+    The papers of a sharded index are held by the shard workers, so they are read through papers().
+    """
+
+    def __init__(self, data_sets, field_indexes):
+        self.data_sets = data_sets
+        self.field_indexes = field_indexes
+        self.version = data_sets['manifest'].get('version', 0)
+        self.shards = None
+        if data_sets['manifest'].get('shards'):
+            self.shards = ShardPool(data_sets['manifest']['shards'])
+            weakref.finalize(self, self.shards.close)
+            self.doc_count = data_sets['manifest']['doc_count']
+        else:
+            self.doc_count = len(data_sets['paper_data'] or [])
+
+    def papers(self, ids):
+        """
+        Returns the papers with the given document IDs, in the same order.
+        """
+        if self.shards is not None:
+            return self.shards.papers(ids)
+        return [self.data_sets['paper_data'][idx] for idx in ids]
+
+
+def snapshot_files(manifest, data_paths):
+    """
+    Returns the path of every data set to load for an index version, None for those it does not load.
+
+    A sharded index lists in 'coordinator_files' what the searching process loads instead of the whole
+    data sets, whose documents are held by the shard workers.
+    """
+    coordinator_files = (manifest or {}).get('coordinator_files') or {}
+    return {name: coordinator_files[name] if name in coordinator_files else manifest_file(manifest, name, path.value)
+            for name, path in data_paths.items() if name != 'manifest'}
+
+
+def load_snapshot(data_paths):
+    """
+    Loads a consistent snapshot of the data files.
+
+    The manifest lists the files of its index version, which the crawler writes under new paths and
+    never modifies afterwards, and it is replaced last, in one rename. The files listed by the manifest
+    read first all belong to its version, unless a newer version was published meanwhile and removed
+    some of them: the load is then retried. With shards, only the files the searching process needs are
+    loaded (see snapshot_files).
+
+    Parameters:
+    - data_paths (dict): Data set name to its Paths member, the path of unversioned manifests; must
+      include 'manifest'.
+
+    Returns:
+    - IndexSnapshot: The loaded snapshot.
+    """
+    manifest_path = data_paths['manifest'].value
+    while True:
+        manifest = json_read(manifest_path)
+        files = snapshot_files(manifest, data_paths)
+        data_sets = load_files({name: path for name, path in files.items() if path is not None})
+        data_sets.update({name: None for name, path in files.items() if path is None})
+        data_sets['manifest'] = manifest
+        try:
+            field_indexes = load_field_indexes(manifest)
+        except FileNotFoundError:
+            if (json_read(manifest_path) or {}).get('version') == manifest.get('version'):
+                raise
+            field_indexes = None  # Segments of a replaced version
+        current = json_read(manifest_path)
+        if field_indexes is not None and (current is None or current.get('version') == manifest.get('version')):
+            return IndexSnapshot(data_sets, field_indexes)
+        logging.info("Index files changed while loading, reloading them.")
+
+
+class SnapshotManager:
+    """
+    Holds the snapshot served to requests and swaps in a new one when the crawler publishes a new version.
+
+    Readers only read the 'current' attribute, which is replaced in a single assignment, so the read path
+    takes no lock. The lock only keeps two requests from loading the same new version at once.
+    """
+
+    def __init__(self, data_paths):
+        self.data_paths = data_paths
+        self.current = load_snapshot(data_paths)
+        self.reload_lock = threading.Lock()
+        self.manifest_mtime = self.manifest_modified()
+        self.checked_at = time.monotonic()
+
+    @staticmethod
+    def manifest_modified():
+        try:
+            return os.stat(Paths.MANIFEST_PATH.value).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self, blocking=True):
+        """
+        Loads the data files and swaps them in if they hold a newer version than the current snapshot.
+
+        Parameters:
+        - blocking (bool): Wait for a reload already in progress instead of skipping this one.
+
+        Returns:
+        - bool: Whether a new snapshot was swapped in.
+        """
+        if not self.reload_lock.acquire(blocking=blocking):
+            return False
+        try:
+            self.manifest_mtime = self.manifest_modified()
+            # Loading starts the shard workers of the snapshot, so an unchanged version is not loaded at all
+            manifest = json_read(self.data_paths['manifest'].value)
+            if (manifest or {}).get('version', 0) == self.current.version:
+                return False
+            snapshot = load_snapshot(self.data_paths)
+            if snapshot.version == self.current.version:
+                return False
+            self.current = snapshot
+        finally:
+            self.reload_lock.release()
+        logging.info(f"Serving index version {snapshot.version}.")
+        return True
+
+    def refresh(self):
+        """
+        Reloads the snapshot if the manifest changed on disk, checking at most every reload interval.
+        Requests arriving during a reload keep being served from the current snapshot.
+        """
+        now = time.monotonic()
+        if now - self.checked_at < IndexConfig.RELOAD_INTERVAL.value:
+            return
+        self.checked_at = now
+        if self.manifest_modified() != self.manifest_mtime:
+            self.reload(blocking=False)
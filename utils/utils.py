@@ -1,46 +1,141 @@
+import heapq
 import logging
+import math
 from datetime import datetime
 
+import numpy as np
 
-def inverted_index_search(query, inverted_index):
+from utils.fuzzy_index import fuzzy_expansions
+from utils.kgram_index import WILDCARD, wildcard_documents
+from utils.postings import union
+
+
+def inverted_index_search(query, inverted_index, fuzzy=False, doc_filter=None):
     """
     Search for a query in the inverted index.
 
     Parameters:
-    - query (str): The search query.
+    - query (str): The search query; '*' matches any characters, e.g. '*papillon' or 'topolog*'.
     - inverted_index (dict): The inverted index to search in.
+    - fuzzy (bool): Whether a query missing from the index matches its closest indexed terms.
+    - doc_filter (np.ndarray): Boolean mask of the documents allowed to match, indexed by document ID.
 
     Returns:
     - list: List of document IDs that match the query.
     """
     query = query.lower().replace(" ", "")
-    matching_documents = inverted_index.get(query, {}).get('documents', [])
-    logging.debug(f"Inverted Index Search - Query: {query}, Matching Documents: {matching_documents}")
+    if WILDCARD in query:
+        matching_documents = wildcard_documents(query, inverted_index)
+    elif fuzzy:
+        matching_documents = union(*(inverted_index.get(term, {}).get('documents', [])
+                                     for term in fuzzy_expansions(query, [inverted_index])))
+    else:
+        matching_documents = inverted_index.get(query, {}).get('documents', [])
+    if doc_filter is not None:
+        matching_documents = [doc for doc in matching_documents if doc_filter[doc]]
+    logging.debug("Inverted Index Search - Query: %s, Matching Documents: %s", query, matching_documents)
     return matching_documents
 
 
-def sort_results(papers_to_display, sort_by):
+def top_k(scores, k, ids=None):
+    """
+    Selects the k best scoring documents without sorting the whole score list.
+
+    Parameters:
+    - scores: A dict of document ID to score, or a NumPy array of scores indexed by document ID,
+      or by position in ids when given.
+    - k (int): Maximum number of documents to select.
+    - ids: NumPy array of the document IDs scored by the scores array, if it does not cover every document.
+
+    Returns:
+    - tuple: (IDs of the selected documents with a positive score, best first, and their scores).
+    """
+    if isinstance(scores, dict):
+        ranking = heapq.nlargest(k, (doc for doc, score in scores.items() if score > 0), key=scores.get)
+        return ranking, [scores[doc] for doc in ranking]
+
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        # Partial selection, only the k survivors get sorted
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    ranking = ids[candidates] if ids is not None else candidates
+    return ranking.tolist(), scores[candidates].tolist()
+
+
+def paginate(total, page, page_size):
     """
-    Sorts the papers based on the specified sorting option.
+    Locates one page of the results.
 
     Parameters:
-    - papers_to_display: List of dictionaries representing papers.
-    - sort_by: Sorting option ('date', 'author', 'title').
+    - total (int): Number of results.
+    - page (int): The 1-based page number; clamped to the available pages.
+    - page_size (int): Number of results per page.
 
     Returns:
-    - Sorted list of papers.
+    - tuple: (the clamped page number, number of pages, start and end positions of the page's results).
     """
-    if sort_by == 'date':
-        logging.info("Sorting results by date.")
-        return sorted(papers_to_display, key=lambda x: parse_date(x.get('Date', '')), reverse=True)
-    elif sort_by == 'author':
-        logging.info("Sorting results by author.")
-        return sorted(papers_to_display, key=lambda x: x.get('Authors', ''))
-    elif sort_by == 'title':
-        logging.info("Sorting results by title.")
-        return sorted(papers_to_display, key=lambda x: x.get('Title', ''))
+    page_count = max(1, math.ceil(total / page_size))
+    page = min(max(1, page), page_count)
+    start = (page - 1) * page_size
+    return page, page_count, start, min(start + page_size, total)
+
+
+def sort_ranking(ranking, sort_by, sort_columns, limit):
+    """
+    Returns the first results of a ranking sorted on a precomputed sort column.
+
+    Only the first limit results are selected, with a partial selection, and sorted.
+
+    Parameters:
+    - ranking: Document IDs, best first.
+    - sort_by: Sorting option ('date', 'author', 'title'); any other value keeps the ranking order.
+    - sort_columns (dict): The 'date', 'author' and 'title' sort columns, indexed by document ID.
+    - limit (int): Number of results to return, e.g. up to the end of the displayed page.
+
+    Returns:
+    - list: The first limit document IDs in sorted order, ties kept in ranking order.
+    """
+    if sort_by not in ('date', 'author', 'title') or not len(ranking):
+        return list(ranking[:limit])
+    logging.info("Sorting results by %s.", sort_by)
+
+    ids = np.asarray(ranking)
+    keys = sort_columns[sort_by][ids].astype(np.int64)
+    if sort_by == 'date':  # Newest first
+        keys = -keys
+    # Unique keys, ties broken by ranking position, keep the partial selection deterministic
+    keys = (keys - keys.min()) * len(ids) + np.arange(len(ids))
+    if limit < len(ids):
+        selected = np.argpartition(keys, limit - 1)[:limit]
     else:
-        return papers_to_display  # No sorting, return as is
+        selected = np.arange(len(ids))
+    return ids[selected[np.argsort(keys[selected])]].tolist()
+
+
+def date_range_filter(sort_columns, date_from=None, date_to=None):
+    """
+    Selects the documents submitted within a date range.
+
+    The range is located in the date ordered document IDs by binary search, so its cost depends on the
+    number of documents in the range only. Documents whose date could not be parsed never match.
+
+    Parameters:
+    - sort_columns (dict): The sort columns, with the 'date_order' and 'sorted_dates' arrays.
+    - date_from (int): Proleptic Gregorian ordinal of the first day of the range, or None.
+    - date_to (int): Proleptic Gregorian ordinal of the last day of the range, or None.
+
+    Returns:
+    - np.ndarray: Boolean mask indexed by document ID, or None if the range is not bounded.
+    """
+    if date_from is None and date_to is None:
+        return None
+    sorted_dates = sort_columns['sorted_dates']
+    start = np.searchsorted(sorted_dates, max(date_from or 1, 1), side='left')
+    end = np.searchsorted(sorted_dates, date_to, side='right') if date_to is not None else len(sorted_dates)
+    doc_filter = np.zeros(len(sorted_dates), dtype=bool)
+    doc_filter[sort_columns['date_order'][start:end]] = True
+    return doc_filter
 
 
 def parse_date(date_string):